@@ -1,8 +1,23 @@
 from enum import Enum
-import copy
+import os
+import time
+from typing import Callable
 
 from fmclient import Agent, Market, Holding, Order, OrderSide, OrderType, Session
 
+from arbitrage_legs import ArbLeg, LegBook, LegState
+from bot_logging import BotLogger, Lazy
+from holdings_ledger import HoldingsLedger
+from latency_stats import LatencyRecorder
+from leg_journal import JournalEntry, LegJournal
+from margin_controller import MarginController
+from market_maker import MarketMaker
+from order_gateway import ORDER_BURST, ORDER_RATE_PER_SECOND, OrderGateway, Priority
+from order_book import OrderBook, Quote
+from order_validation import OrderValidator
+from pnl_analytics import PnLAnalytics
+from session_scheduler import SessionScheduler
+
 
 # Trading account details
 FM_ACCOUNT = "fain-premium"
@@ -26,54 +41,180 @@ class BotType(Enum):
     REACTIVE = 1
 
 
+# Enum for how the bot executes an arbitrage opportunity
+class ExecutionMode(Enum):
+    SINGLE = 0  # one unit, one leg in flight at a time
+    MULTI_LEG = 1  # walk public price levels, several sized legs in flight
+
+
 PROFIT_MARGIN = 10
+# move the required margin between these bounds from the fill rate, rejects and latency of public orders
+ADAPTIVE_MARGIN = True
+MIN_PROFIT_MARGIN = PROFIT_MARGIN
+MAX_PROFIT_MARGIN = 30
 MARKET_PERFORMANCE_BOT_TYPE = BotType.REACTIVE
+EXECUTION_MODE = ExecutionMode.SINGLE
+MAX_LEGS_IN_FLIGHT = 4
+# MULTI_LEG only: hedge orders are priced this far through the best PUBLIC quote so they still trade
+# when that quote is gone, and sent this many times for one leg before what is unhedged is left to the trader
+HEDGE_PRICE_BAND = 20
+MAX_HEDGE_ATTEMPTS = 3
+# MULTI_LEG only: send the private order straight after the public one instead of waiting for the public trade
+PIPELINED_LEGS = False
+
+# ACTIVE only: units per public quote, how far the quote may sit from the target price before it is
+# replaced, the minimum time between quote changes and how often quotes are re-checked without new orders
+QUOTE_UNITS = 1
+REQUOTE_BAND = 5
+MIN_QUOTE_INTERVAL_SECONDS = 0.25
+QUOTE_REFRESH_SECONDS = 1
+
+# outbound orders: how often a backlog held back by the rate limit is retried, see order_gateway for the rate
+ORDER_FLUSH_SECONDS = 0.1
+
+# record everything the robot receives to this file for replay, None to switch off
+FLOW_LOG_PATH = None
+
+# per-event messages are DEBUG, decisions are INFO; None follows the level of the 'agent' logger
+# set a JSON lines file to also log off-thread
+LOG_LEVEL: int | None = None
+LOG_JSON_PATH = None
+
+# latency histograms are logged every LATENCY_REPORT_SECONDS and written to LATENCY_DUMP_PATH at shutdown
+LATENCY_REPORT_SECONDS = 60
+LATENCY_DUMP_PATH = None
+
+# journal leg transitions to this file so a restarted robot can resume or unwind them, None to switch off;
+# the journal is memory mapped and pushed to disk every JOURNAL_FLUSH_SECONDS
+LEG_JOURNAL_PATH = None
+JOURNAL_FLUSH_SECONDS = 1
+
+# round trips with realised P&L and slippage are written here when the session closes and at shutdown,
+# CSV unless the path ends in .parquet; None to switch off
+PNL_EXPORT_PATH = None
+
+# run the decision logic on its own thread so fmclient callbacks only enqueue events
+USE_STRATEGY_RUNTIME = False
 
 
 class IDSBot(Agent):
+    _public_market_id: int
+    _private_market_id: int
+    _nature_trader_id: str
     _public_market: Market | None
     _private_market: Market | None
 
     _role: Role | None
     _bot_type: BotType | None
+    _execution_mode: ExecutionMode
+    _pipelined: bool
 
     _holdings: Holding | None
-
-    _my_private_order: Order | None
-    _my_public_order: Order | None
-
+    _ledger: HoldingsLedger
+    _validator: OrderValidator
+    _book: OrderBook
+    _log: BotLogger
+    _latency: LatencyRecorder
+    _pnl: PnLAnalytics
+    _margin: MarginController
+    _pnl_export_path: str | None
+    _order_count: int
+    _run_id: str
+
+    _my_private_order: Quote | None
+    _my_public_order: Quote | None
+
+    _decision_key: tuple | None
     _waiting_for_server: bool
     _waiting_for_public_trade: bool
     _pending_private_order: tuple[OrderSide, int] | None
-
-    def __init__(self, account: str, email: str, password: str, marketplace_id: int, bot_type: BotType, bot_name: str = "FMBot"):
+    _legs: LegBook
+    _journal: LegJournal | None
+    _journal_leg: str | None
+    _journal_private_ref: str | None
+    _recovered: list[JournalEntry]
+    _session_orders: list[Order] | None
+    _gateway: OrderGateway
+    _scheduler: SessionScheduler
+    _maker: MarketMaker | None
+
+    def __init__(self, account: str, email: str, password: str, marketplace_id: int, bot_type: BotType, bot_name: str = "FMBot",
+                 log_level: int | None = LOG_LEVEL, log_json_path: str | None = LOG_JSON_PATH,
+                 execution_mode: ExecutionMode = EXECUTION_MODE, max_legs_in_flight: int = MAX_LEGS_IN_FLIGHT,
+                 pipelined: bool = PIPELINED_LEGS, public_market_id: int = PUBLIC_MARKET_ID,
+                 private_market_id: int = PRIVATE_MARKET_ID, nature_trader_id: str = NATURE_TRADER_ID,
+                 journal_path: str | None = LEG_JOURNAL_PATH, pnl_export_path: str | None = PNL_EXPORT_PATH):
         super().__init__(account, email, password, marketplace_id, name=bot_name)
+        self._public_market_id = public_market_id  # market the robot takes quotes in
+        self._private_market_id = private_market_id  # market the private signal arrives in
+        self._nature_trader_id = nature_trader_id  # owner of the private signal orders
         self._public_market = None
         self._private_market = None
 
         self._role = None  # store seller or buyer the robot should act
         self._bot_type = bot_type  # store bot type
+        self._execution_mode = execution_mode  # store single or multi-leg execution
+        self._pipelined = pipelined  # send both legs back-to-back in MULTI_LEG mode
 
         self._holdings = None  # store holding information for checking
+        self._ledger = HoldingsLedger()  # cash/units net of orders sent since the last holdings update
+        self._book = OrderBook()  # incremental best bid/ask for every market
+        self._validator = OrderValidator(self._book, self._ledger)  # drops orders the exchange would reject
+        self._log = BotLogger(f"agent.{bot_name}", log_level, log_json_path)  # only formats enabled messages
+        self._latency = LatencyRecorder()  # callback, round-trip and pending leg histograms
+        self._latency.attach(self)
+        self._pnl = PnLAnalytics()  # round trips, realised/unrealised P&L and slippage against the expected margin
+        self._pnl_export_path = pnl_export_path
+        # required margin, starting from PROFIT_MARGIN
+        self._margin = MarginController(PROFIT_MARGIN, MIN_PROFIT_MARGIN, MAX_PROFIT_MARGIN, enabled=ADAPTIVE_MARGIN)
+        self._order_count = 0  # makes every order ref unique for round-trip matching
+        self._run_id = os.urandom(3).hex()  # and this across restarts, so journaled refs of a past run never repeat
 
         self._my_private_order = None  # track my private market standing order
         self._my_public_order = None  # track my public market standing order
 
+        self._decision_key = None  # signal and top of book at the last decision, None forces the next one
         self._waiting_for_server = False  # check to avoid double order sending
         self._waiting_for_public_trade = False  # check to avoid public market not traded but private has traded
         self._pending_private_order = tuple | None  # store parameters that private market order requires
+        self._journal = LegJournal(journal_path) if journal_path is not None else None  # leg transitions, survives a crash
+        self._journal_leg = None  # public ref of the journaled SINGLE leg
+        self._journal_private_ref = None  # its private order, the leg closes when that is answered
+        self._recovered = []  # legs left open by the last run, resolved once holdings arrive
+        self._session_orders = None  # standing orders the StrategyRuntime copied with the last session update
+        self._legs = LegBook(max_legs_in_flight, self._journal)  # legs in flight in MULTI_LEG mode
+        self._gateway = OrderGateway(self.send_order, ORDER_RATE_PER_SECOND, ORDER_BURST)  # rate limited, cancels de-duplicated
+        self._scheduler = SessionScheduler(self)  # no orders or order jobs while the session is not open
+        self._scheduler.on_open(self._warm_up)
+        self._scheduler.on_close(self._purge_orders)
+        self._maker = None  # resting public quote of an ACTIVE robot
+        if bot_type is BotType.ACTIVE:
+            self._maker = MarketMaker(
+                lambda side, price, units: self._placing_order(side, self._public_market, price, units),
+                lambda side, price, units: self._placing_order(side, self._private_market, price, units, Priority.HEDGE),
+                self._cancel_order,
+                lambda order, side, price, units: self._placing_order(side, self._public_market, price, units, replacing=order),
+                REQUOTE_BAND, MIN_QUOTE_INTERVAL_SECONDS, time.monotonic,
+            )
 
     def initialised(self):
-        self._public_market = self.markets[PUBLIC_MARKET_ID]
-        self._private_market = self.markets[PRIVATE_MARKET_ID]
+        self._public_market = self.markets[self._public_market_id]
+        self._private_market = self.markets[self._private_market_id]
 
         if self._public_market is None or self._private_market is None:
             self.error(
                 f"Could not find required markets."
-                f"public = {PUBLIC_MARKET_ID} found = {self._public_market is not None}, "
-                f"private = {PRIVATE_MARKET_ID} found = {self._private_market is not None}"
+                f"public = {self._public_market_id} found = {self._public_market is not None}, "
+                f"private = {self._private_market_id} found = {self._private_market is not None}"
             )
-        
+
+        self._book.rebuild(Order.current().values())
+
+        if self._journal is not None:
+            self._recovered = self._journal.open_legs()
+            if self._recovered:
+                self.warning(f"{len(self._recovered)} leg(s) were open when the robot last stopped: {self._recovered}")
+
         self.inform(
             f"Markets loaded: "
             f"PUBLIC = {self._public_market.name} ({self._public_market.fm_id}), "
@@ -81,19 +222,101 @@ class IDSBot(Agent):
         )
 
     def pre_start_tasks(self) -> None:
-        pass
-
-    def received_session_info(self, session: Session):
+        self.execute_periodically(self._report_latency, sleep_time=LATENCY_REPORT_SECONDS)
+        self._scheduler.every(self._gateway.flush, sleep_time=ORDER_FLUSH_SECONDS, condition=self._gateway.pending)
+        if self._journal is not None:
+            self.execute_periodically(self._journal.flush, sleep_time=JOURNAL_FLUSH_SECONDS)
+        if self._maker is not None:
+            # a throttled quote change is retried even if no new orders arrive
+            self._scheduler.every(self._requote, sleep_time=QUOTE_REFRESH_SECONDS)
+
+    def _report_latency(self) -> None:
+        snapshot = self._latency.snapshot()
+        self._log.info("Latency snapshot: %s", snapshot, latency=snapshot)
+
+    def report(self) -> dict:
+        """
+        Holdings, callback counts and latency summary, collected by supervisor.py
+        """
+        holdings = None
+        if self._holdings is not None:
+            holdings = {
+                "cash": self._holdings.cash,
+                "cash_available": self._holdings.cash_available,
+                "units": {market.fm_id: asset.units for market, asset in self._holdings.assets.items()},
+            }
+        return {
+            "holdings": holdings,
+            "counters": dict(self._log.counters),
+            "validation": dict(self._validator.counters),
+            "quoting": None if self._maker is None else dict(self._maker.counters),
+            "gateway": dict(self._gateway.counters),
+            "session": dict(self._scheduler.counters),
+            "latency": self._latency.snapshot(),
+            "pnl": self._pnl.summary(self._marks()),
+            "margin": self._margin.snapshot(),
+        }
+
+    def _marks(self) -> dict[int, float]:
+        # mid prices of my two markets for unrealised P&L, markets without both sides fall back to the last fill
+        marks = {}
+        for market_id in (self._public_market_id, self._private_market_id):
+            bid, ask = self._book.best_bid(market_id), self._book.best_ask(market_id)
+            if bid is not None and ask is not None:
+                marks[market_id] = (bid.price + ask.price) / 2
+        return marks
+
+    def export_pnl(self) -> None:
+        if self._pnl_export_path is not None:
+            self._pnl.export(self._pnl_export_path)
+            self._log.info("P&L of %s round trip(s) written to %s", len(self._pnl.round_trips), self._pnl_export_path)
+
+    def received_session_info(self, session: Session, orders: list[Order] | None = None):
+        # without the StrategyRuntime this runs on the fmclient thread and Order.current() is read directly
+        self._session_orders = orders
+        self._validator.session(session)
+        # on open the book and ledger are rebuilt here, before the first order of the session
+        self._scheduler.update(session)
         if session.is_open:
             self.inform(f"Marketplace is now open for trading. The new session is {session.fm_id}")
         elif session.is_paused:
             self.inform("Marketplace is now paused. You can not trade.")
         elif session.is_closed:
             self.inform("Marketplace is now closed. You can not trade.")
+            self.export_pnl()
 
-    def received_holdings(self, holdings: Holding):
+    def _warm_up(self) -> None:
+        """
+        Rebuild the order book and reset the ledger to the last holdings when a session opens
+        """
+        self._book.rebuild(Order.current().values() if self._session_orders is None else self._session_orders)
+        if self._holdings is not None:
+            self._ledger.reconcile(self._holdings)
+        self._decision_key = None
+        self._log.info("Session %s open, book rebuilt with %s standing orders", self._scheduler.session_id, len(self._book))
+
+    def _purge_orders(self) -> None:
+        # orders held back by the rate limit would go out into the next session, built on this one's book
+        for order in self._gateway.purge():
+            self.order_rejected({"error": "Session closed before the order was sent"}, order)
+
+    def received_holdings(self, holdings: Holding, orders: list[Order] | None = None):
+        self._log.count("received_holdings")
         self._holdings = holdings
-
+        drift = self._ledger.reconcile(holdings)
+        if drift:
+            self._log.info("Local holdings drifted from the server by %s", drift, drift=drift)
+        # fresh holdings include the trades of finished legs, so their reservations can go
+        self._legs.settle()
+        self._decision_key = None
+        if self._recovered:
+            self._recover_legs(holdings, list(Order.current().values()) if orders is None else orders)
+
+        # the table is only built if the message is actually logged
+        self._log.info("%s", Lazy(self._holdings_table, holdings))
+
+    @staticmethod
+    def _holdings_table(holdings: Holding) -> str:
         lines = [f"Current holdings in my account:"]
         lines.append(f"{'Account':<20} {'Total':>12} {'Available':>12}")
         lines.append("-" * 46)
@@ -102,7 +325,7 @@ class IDSBot(Agent):
         for market, asset in holdings.assets.items():
             lines.append(f"{market.name:<20} {asset.units:>12} {asset.units_available:>12}")
 
-        self.inform("\n".join(lines))
+        return "\n".join(lines)
 
     def received_orders(self, orders: list[Order]) -> None:
         """
@@ -112,76 +335,78 @@ class IDSBot(Agent):
             3. Calculate margin using standing order price
             4. Use margin to decide order sending or wait
         """
+        self._log.count("received_orders")
+
+        # ----- 1) track market order information -----
+
+        # only the changed orders are applied, the book keeps best prices per market and side
+        self._book.apply(orders)
+        self._ledger.apply(orders)
+        self._pnl.apply(orders)
+        if self._legs.in_flight():
+            self._follow_legs(orders)
+        if self._maker is not None:
+            # fills of the quote are followed even while the session cannot trade, their hedges wait for it
+            self._maker.on_orders(orders, hedge=self._scheduler.can_trade)
+
+        # most updates touch other markets or deeper levels, the decision below would come out the same
+        if self._maker is None and self._unchanged(orders):
+            self._log.count("decision.skipped")
+            return
+        self._log.count("decision.evaluated")
 
-        best_private_buy: Order | None = None
-        best_private_sell: Order | None = None
-        best_public_buy: Order | None = None
-        best_public_sell: Order | None = None
+        best_private_buy: Quote | None = self._book.best_bid(self._private_market_id)
+        best_private_sell: Quote | None = self._book.best_ask(self._private_market_id)
+        best_public_buy: Quote | None = self._book.best_bid(self._public_market_id)
+        best_public_sell: Quote | None = self._book.best_ask(self._public_market_id)
 
         # reset my order tracking
         self._my_private_order = None
         self._my_public_order = None
 
-        # ----- 1) track market order information -----
+        # check my order
+        for quote in self._book.my_orders(self._public_market_id):
+            self._my_public_order = quote
+            self._log.debug("I have a standing order in PUBLIC market: %s", quote)
+        for quote in self._book.my_orders(self._private_market_id):
+            self._my_private_order = quote
+            self._log.debug("I have a standing order in PRIVATE market: %s", quote)
+
+        self._log.debug(
+            "The best standing order in PUBLIC market: BUY order price is [%s], SELL order price is [%s]",
+            best_public_buy.price if best_public_buy else None,
+            best_public_sell.price if best_public_sell else None,
+        )
 
-        for order in Order.current().values():
-            # solve limit order only
-            if order.order_type is not OrderType.LIMIT:
-                continue
-            
-            # check my order
-            if order.mine:
-                if order.market.fm_id == PUBLIC_MARKET_ID:
-                    self._my_public_order = order
-                    self.inform(f"I have a standing order in PUBLIC market: {order}")
-                elif order.market.fm_id == PRIVATE_MARKET_ID:
-                    self._my_private_order = order
-                    self.inform(f"I have a standing order in PRIVATE market: {order}")
-                continue
-            
-            # judge market type
-            is_private = order.market.fm_id == PRIVATE_MARKET_ID
-            is_public = order.market.fm_id == PUBLIC_MARKET_ID
-            
-            # update best standing buy price (the higher the better)
-            if order.order_side is OrderSide.BUY:
-                if is_private and (best_private_buy is None or order.price > best_private_buy.price):
-                    best_private_buy = order
-                elif is_public and (best_public_buy is None or order.price > best_public_buy.price):
-                    best_public_buy = order
-            
-            # update best standing sell price (the lower the better)
-            elif order.order_side is OrderSide.SELL:
-                if is_private and (best_private_sell is None or order.price < best_private_sell.price):
-                    best_private_sell = order
-                elif is_public and (best_public_sell is None or order.price < best_public_sell.price):
-                    best_public_sell = order
+        # the book stays current, but no decisions are made while the session cannot trade
+        if not self._scheduler.can_trade:
+            self._log.debug("Session is not open, skip trading")
+            return
 
-        self.inform(
-            f"The best standing order in PUBLIC market: "
-            f"BUY order price is [{best_public_buy.price if best_public_buy else None}], "
-            f"SELL order price is [{best_public_sell.price if best_public_sell else None}]"
-        )
+        # an ACTIVE robot rests a quote around the private signal instead of taking public orders
+        if self._maker is not None:
+            self._requote()
+            return
         
         # ----- 2) update robot role using private signal -----
         
         # identify private market signal
-        private_signal: Order | None = best_private_buy if best_private_buy is not None else best_private_sell
+        private_signal: Quote | None = best_private_buy if best_private_buy is not None else best_private_sell
         margin = None
 
         if private_signal is None:
             self._role = None
             margin = None
-            self.inform(f"No order in PRIVATE market")
+            self._log.debug("No order in PRIVATE market")
             return
         else:
-            self.inform(f"Order signal in PRIVATE market is [{private_signal.order_side}] at price [{private_signal.price}]")
+            self._log.debug("Order signal in PRIVATE market is [%s] at price [%s]", private_signal.side.name, private_signal.price)
 
             # update robot role if signal in private has changed
-            new_role = Role.BUYER if private_signal.order_side == OrderSide.BUY else Role.SELLER
+            new_role = Role.BUYER if private_signal.side is OrderSide.BUY else Role.SELLER
             if self._role != new_role:
                 self._role = new_role
-                self.inform(f"Robot role updated to [{self._role.name}]")
+                self._log.info("Robot role updated to [%s]", self._role.name)
 
             # ----- 3) calculate profit margin -----
 
@@ -190,107 +415,183 @@ class IDSBot(Agent):
                     margin = private_signal.price - best_public_sell.price
                 else:
                     margin = None
-                    self.inform("no standing SELL order in PUBLIC market")
+                    self._log.debug("no standing SELL order in PUBLIC market")
             elif new_role == Role.SELLER:
                 if best_public_buy is not None:
                     margin = best_public_buy.price - private_signal.price
                 else:
                     margin = None
-                    self.inform("no standing BUY order in PUBLIC market")
+                    self._log.debug("no standing BUY order in PUBLIC market")
             else:
                 margin = None
-                self.inform("cannot calculate margin due to missing best standing order price")
+                self._log.debug("cannot calculate margin due to missing best standing order price")
 
         # ----- 4) placing profitable order -----
             
-        if margin is not None and margin >= PROFIT_MARGIN:
+        if margin is not None and margin >= self._margin.margin:
+            if self._execution_mode is ExecutionMode.MULTI_LEG:
+                self._open_legs(private_signal)
+                return
+
             if self._waiting_for_server:
-                self.inform("Waiting for server response, skip trading")
+                self._log.debug("Waiting for server response, skip trading")
                 return
             
             if self._waiting_for_public_trade:
-                self.inform("Waiting for PUBLIC order to trade, skip trading")
+                self._log.debug("Waiting for PUBLIC order to trade, skip trading")
                 return
             
             if self._my_private_order is not None:
-                self.inform(F"Already have PRIVATE ORDER (fm_id={self._my_private_order.fm_id}), skip trading")
+                self._log.debug("Already have PRIVATE ORDER (fm_id=%s), skip trading", self._my_private_order.fm_id)
                 return
             
             if self._my_public_order is not None:
-                self.inform(f"Already have PUBLIC order (fm_id={self._my_public_order.fm_id}), skip trading")
+                self._log.debug("Already have PUBLIC order (fm_id=%s), skip trading", self._my_public_order.fm_id)
                 return
             
-            self.inform(f"margin ({margin}) is bigger than target, take buying action to make profits")
+            self._log.info("margin (%s) is bigger than target, take buying action to make profits", margin, margin=margin)
                 
             if self._role == Role.BUYER:
-                if self._holdings.cash_available >= best_public_sell.price:
+                if self._ledger.cash_available >= best_public_sell.price:
                     # ----- best ask -----
 
                     # sending order to public market
-                    self._placing_order(OrderSide.BUY, self._public_market, best_public_sell.price)
+                    # journaled before it is sent
+                    ref = self._placing_order(
+                        OrderSide.BUY, self._public_market, best_public_sell.price,
+                        before_send=lambda ref: self._journal_opened(ref, OrderSide.BUY, best_public_sell.price, OrderSide.SELL, private_signal.price),
+                    )
+                    if ref is None:
+                        return
                     # if order in public market is immediately traded, sending order to private market
                     self._waiting_for_public_trade = True
+                    self._latency.leg_opened()
                     self._pending_private_order = (OrderSide.SELL, private_signal.price)
+                    self._pnl.opened(ref, OrderSide.BUY, margin, 1)
                 else:
-                    self.inform(f"Insufficient cash for PUBLIC BUY order (need {best_public_sell.price}, have {self._holdings.cash_available})")
+                    self._log.info("Insufficient cash for PUBLIC BUY order (need %s, have %s)", best_public_sell.price, self._ledger.cash_available)
             
             elif self._role == Role.SELLER:
-                if self._holdings.assets[self._public_market].units_available >= 1:
+                if self._ledger.units_available(self._public_market_id) >= 1:
                     # ----- best bid -----
 
                     # sending order to public market
-                    self._placing_order(OrderSide.SELL, self._public_market, best_public_buy.price)
+                    # journaled before it is sent
+                    ref = self._placing_order(
+                        OrderSide.SELL, self._public_market, best_public_buy.price,
+                        before_send=lambda ref: self._journal_opened(ref, OrderSide.SELL, best_public_buy.price, OrderSide.BUY, private_signal.price),
+                    )
+                    if ref is None:
+                        return
                     # if order in public market is immediately traded, sending order to private market
                     self._waiting_for_public_trade = True
+                    self._latency.leg_opened()
                     self._pending_private_order = (OrderSide.BUY, private_signal.price)
+                    self._pnl.opened(ref, OrderSide.SELL, margin, 1)
                 else:
-                    self.inform(f"Insufficient asset for PUBLIC SELL order (now {self._holdings.assets[self._public_market].units_available} unit)")
+                    self._log.info("Insufficient asset for PUBLIC SELL order (now %s unit)", self._ledger.units_available(self._public_market_id))
         
-        elif margin is not None and margin < PROFIT_MARGIN:
-            self.inform(f"Margin ({margin}) is not bigger than target, no action and wait")
+        elif margin is not None and margin < self._margin.margin:
+            self._log.debug("Margin (%s) is not bigger than target, no action and wait", margin)
         
         else:
-            self.inform("Margin is None, no action and wait")
+            self._log.debug("Margin is None, no action and wait")
+
 
 
+    def _unchanged(self, orders: list[Order]) -> bool:
+        """
+        True if the private signal, the PUBLIC best bid/ask and my orders are as they were at the last decision.
+        Order answers, holdings and a session open clear the key, since the guards read them too.
+        """
+        for order in orders:
+            if order.mine:
+                self._decision_key = None
+                return False
+        book = self._book
+        versions = (book.market_version(self._public_market_id), book.market_version(self._private_market_id))
+        if self._decision_key is not None and versions == self._decision_key[0]:
+            # an update of another market, two dict reads
+            return True
+        # the book makes a new Quote for every change of an order, so the same objects mean the same tops
+        tops = (
+            book.best_bid(self._private_market_id), book.best_ask(self._private_market_id),
+            book.best_bid(self._public_market_id), book.best_ask(self._public_market_id),
+        )
+        unchanged = self._decision_key is not None and tops == self._decision_key[1]
+        self._decision_key = (versions, tops)
+        return unchanged
 
     def order_accepted(self, order: Order) -> None:
+        self._log.count("order_accepted")
         self._waiting_for_server = False
+        self._decision_key = None
+        round_trip = self._latency.order_answered(order.ref, accepted=True)
+        self._ledger.accepted(order)
+        self._pnl.accepted(order)
+        self._gateway.answered(order)
+        if self._maker is not None and self._maker.accepted(order):
+            self._log.info("Quote order accepted: %s", order)
+            return
+        if order.ref is not None and order.ref == self._journal_private_ref:
+            self._journal_closed()
 
-        self.inform(f"Order accepted in [{order.market.name}]: fm_id={order.fm_id}, side={order.order_side.name}, price={order.price}, traded={order.has_traded}")
+        self._log.info(
+            "Order accepted in [%s]: fm_id=%s, side=%s, price=%s, traded=%s",
+            order.market.name, order.fm_id, order.order_side.name, order.price, order.has_traded,
+            fm_id=order.fm_id, price=order.price, traded=order.has_traded,
+        )
         
+        # public orders that come back standing or slowly make the required margin wider
+        leg = self._legs.by_ref(order.ref) if order.order_type is OrderType.LIMIT else None
+        if self._arbitrage_public(order, leg):
+            self._margin.answered(order.has_traded, round_trip_ns=round_trip)
+
         # ----- 1) track public market order -----
 
+        # in MULTI_LEG mode every leg tracks its own orders
+        if leg is not None:
+            self._advance_leg(leg, order)
+            return
+
         # if public market order is traded, sending private market order; else, cancelling
-        if self._waiting_for_public_trade and order.market.fm_id == PUBLIC_MARKET_ID:
+        if self._waiting_for_public_trade and order.market.fm_id == self._public_market_id:
+            private_ref = None
             if order.has_traded:
-                self.inform("PUBLIC market order traded immediately, now sending PRIVATE market order")
+                self._log.info("PUBLIC market order traded immediately, now sending PRIVATE market order")
                 # send private market order
                 if self._pending_private_order is not None:
                     side, price = self._pending_private_order
                     # check whether cash is enough
                     if side == OrderSide.BUY:
-                        if self._holdings.cash_available >= price:
-                            self._placing_order(side, self._private_market, price)
+                        if self._ledger.cash_available >= price:
+                            private_ref = self._placing_order(side, self._private_market, price, priority=Priority.HEDGE,
+                                                              before_send=self._journal_private_sent)
                         else:
-                            self.inform(f"Insufficient cash for PRIVATE BUY order (need {price}, have {self._holdings.cash_available})")
+                            self._log.info("Insufficient cash for PRIVATE BUY order (need %s, have %s)", price, self._ledger.cash_available)
                     # check whether asset is enough
                     elif side == OrderSide.SELL:
-                        if self._holdings.assets[self._private_market].units_available >= 1:
-                            self._placing_order(side, self._private_market, price)
+                        if self._ledger.units_available(self._private_market_id) >= 1:
+                            private_ref = self._placing_order(side, self._private_market, price, priority=Priority.HEDGE,
+                                                              before_send=self._journal_private_sent)
                         else:
-                            self.inform(f"Insufficient asset for PRIVATE SELL order (now {self._holdings.assets[self._private_market].units_available} unit)")
+                            self._log.info("Insufficient asset for PRIVATE SELL order (now %s unit)", self._ledger.units_available(self._private_market_id))
             else:
-                self.inform("PUBLIC market order became standing order, cancelling public market order and private market order plan")
+                self._log.info("PUBLIC market order became standing order, cancelling public market order and private market order plan")
                 # cancel public market order
-                cancel_order = copy.copy(order)
-                cancel_order.order_type = OrderType.CANCEL
-                self.send_order(cancel_order)
-                self.inform(f"Sent cancel for PUBLIC order: {order.fm_id}")        
+                self._cancel_order(order)
+
+            if private_ref is not None:
+                self._pnl.private_sent(order.ref, private_ref)
+            # the journaled leg stays open until its private order is answered
+            if private_ref is None:
+                self._pnl.finished(order.ref)
+                self._journal_closed()
             
             # reset private market sending signal
             self._pending_private_order = None
             self._waiting_for_public_trade = False
+            self._latency.leg_closed()
             
             return
 
@@ -298,10 +599,10 @@ class IDSBot(Agent):
 
         # if order is not traded and not cancelled, this order is now a standing order
         if order.order_type == OrderType.LIMIT and (not order.has_traded) and (not order.is_cancelled):
-            if order.market.fm_id == PUBLIC_MARKET_ID:
-                self._my_public_order = order    
-            elif order.market.fm_id == PRIVATE_MARKET_ID:
-                self._my_private_order = order
+            if order.market.fm_id == self._public_market_id:
+                self._my_public_order = Quote.from_order(order)
+            elif order.market.fm_id == self._private_market_id:
+                self._my_private_order = Quote.from_order(order)
         # if order is traded or cancelled, this order is now not a standing order
         else:
             if self._my_public_order is not None and order.fm_id == self._my_public_order.fm_id:
@@ -312,54 +613,470 @@ class IDSBot(Agent):
 
 
     def order_rejected(self, info: dict[str, str], order: Order) -> None:
+        self._log.count("order_rejected")
         self._waiting_for_server = False
+        self._decision_key = None
+        round_trip = self._latency.order_answered(order.ref, accepted=False)
+        self._ledger.rejected(order)
+        self._pnl.rejected(order)
+        self._gateway.answered(order)
+        if self._maker is not None and self._maker.rejected(order):
+            self._log.info("Quote order rejected: %s %s", order, info)
+            return
+        if order.ref is not None and order.ref == self._journal_private_ref:
+            self._journal_closed()
 
         self.warning(f"Order rejected in [{order.market.name}]: order={order} info={info}")
+        # rejects while the session cannot trade say nothing about the market
+        leg = self._legs.by_ref(order.ref) if order.order_type is OrderType.LIMIT else None
+        if self._scheduler.can_trade and self._arbitrage_public(order, leg):
+            self._margin.answered(False, rejected=True, round_trip_ns=round_trip)
 
         # ----- 1) track public market order -----
 
+        if leg is not None:
+            if leg.hedge_refs and order.ref == leg.hedge_refs[-1]:
+                leg.hedge_answered = True
+            elif order.ref == leg.public_ref:
+                self._log.info("PUBLIC leg %s rejected", order.ref)
+                leg.public_answered = True
+                self._latency.leg_closed(leg.public_ref)
+            else:
+                leg.private_answered = True
+            self._settle_leg(leg)
+
         # if public market order is rejected, cancelling private market order
-        if self._waiting_for_public_trade and order.market.fm_id == PUBLIC_MARKET_ID:
-            self.inform("PUBLIC market order rejected, cancelling private market order plan")
+        if self._waiting_for_public_trade and order.market.fm_id == self._public_market_id:
+            self._log.info("PUBLIC market order rejected, cancelling private market order plan")
             self._pending_private_order = None
             self._waiting_for_public_trade = False
+            self._latency.leg_closed()
+            self._journal_closed()
         
         # ----- 2) update standing order -----
 
         # if a LIMIT order rejected, it was never actually standing, so remove my standing order tracking
-        if self._my_public_order is not None and order.ref == self._my_public_order.ref:
-            self._my_public_order = None
-        if self._my_private_order is not None and order.ref == self._my_private_order.ref:
-            self._my_private_order = None
+        if order.fm_id is not None:
+            if self._my_public_order is not None and order.fm_id == self._my_public_order.fm_id:
+                self._my_public_order = None
+            if self._my_private_order is not None and order.fm_id == self._my_private_order.fm_id:
+                self._my_private_order = None
 
 
 
-    def _placing_order(self, side: OrderSide, market: Market, price: int) -> None:
+    def _arbitrage_public(self, order: Order, leg: ArbLeg | None) -> bool:
+        # the public order of a SINGLE trade or of a leg; hedges, private orders and quotes say nothing about the margin
+        if leg is not None:
+            return order.ref == leg.public_ref
+        return self._waiting_for_public_trade and order.order_type is OrderType.LIMIT and order.market.fm_id == self._public_market_id
+
+    def _requote(self) -> None:
+        """
+        ACTIVE execution: quote the required margin inside the private signal in the public market,
+        BUY below a private BUY signal or SELL above a private SELL signal, sized so the fill can be hedged
+        """
+        signal = self._book.best_bid(self._private_market_id) or self._book.best_ask(self._private_market_id)
+        if signal is None or self._holdings is None or self._public_market is None:
+            self._maker.update(None, None, None, 0)
+            return
+
+        buyer = signal.side is OrderSide.BUY
+        self._role = Role.BUYER if buyer else Role.SELLER
+        tick = getattr(self._public_market, "price_tick", 1) or 1
+        if buyer:
+            # round away from the signal so the margin is never less than required
+            price = (signal.price - self._margin.margin) // tick * tick
+            hedge_units = self._ledger.units_available(self._private_market_id)
+        else:
+            price = -(-(signal.price + self._margin.margin) // tick) * tick
+            hedge_units = self._ledger.cash_available // signal.price
+        units = min(QUOTE_UNITS, signal.units, hedge_units)
+        self._maker.update(OrderSide.BUY if buyer else OrderSide.SELL, price, signal.price, units)
+
+    def _open_legs(self, private_signal: Quote) -> None:
         """
-        Send a 1-unit limit order into market at the given price.
+        MULTI_LEG execution: take public price levels while they clear the required margin, sizing each leg
+        to the level, the private signal units left and the cash/units not reserved by other legs.
+        """
+        if self._holdings is None:
+            # no leg can be sized before the first holdings arrive
+            return
+
+        buyer = self._role == Role.BUYER
+        public_side, private_side = (OrderSide.BUY, OrderSide.SELL) if buyer else (OrderSide.SELL, OrderSide.BUY)
+        quote_side = OrderSide.SELL if buyer else OrderSide.BUY
+
+        remaining = private_signal.units - self._legs.committed_units(private_signal.fm_id)
+        targeted = self._legs.targeted()
+        cash = self._holdings.cash_available - self._legs.reserved_cash()
+        # legs reserve for both of their orders up front, so start from the server's holdings rather than the ledger
+        public_units = self._holdings.assets[self._public_market].units_available - self._legs.reserved_units(self._public_market_id)
+        private_units = self._holdings.assets[self._private_market].units_available - self._legs.reserved_units(self._private_market_id)
+
+        for quote in self._book.depth(self._public_market_id, quote_side, self._legs.max_in_flight + len(targeted)):
+            if remaining <= 0 or not self._legs.has_room():
+                break
+            if quote.fm_id in targeted:
+                continue
+
+            level_margin = private_signal.price - quote.price if buyer else quote.price - private_signal.price
+            if level_margin < self._margin.margin:
+                break
+
+            if buyer:
+                units = min(quote.units, remaining, cash // quote.price, private_units)
+            else:
+                units = min(quote.units, remaining, public_units, cash // private_signal.price)
+            if units <= 0:
+                self._log.info("Insufficient holdings for another leg (cash %s, PUBLIC units %s, PRIVATE units %s)", cash, public_units, private_units)
+                break
+
+            leg = ArbLeg(private_signal.fm_id, quote.fm_id, public_side, quote.price, private_side, private_signal.price,
+                         units, self._public_market_id, self._private_market_id, pipelined=self._pipelined,
+                         units_before=(self._ledger.units(self._public_market_id), self._ledger.units(self._private_market_id)))
+            # the LegBook journals the leg before its order is sent
+            ref = self._placing_order(public_side, self._public_market, quote.price, units,
+                                      before_send=lambda ref: self._legs.opened(leg, ref))
+            if ref is None:
+                break
+            self._latency.leg_opened(ref)
+            self._pnl.opened(ref, public_side, level_margin, units, hedged=True)
+
+            if self._pipelined:
+                # do not wait a round trip for the public trade, the private signal may be gone by then
+                private_ref = self._placing_order(private_side, self._private_market, private_signal.price, units, Priority.HEDGE,
+                                                  before_send=lambda private_ref: self._legs.private_sent(leg, private_ref, units))
+                if private_ref is not None:
+                    self._pnl.private_sent(ref, private_ref, units)
+            self._log.info("Opened leg %s: %s %s unit(s) at %s, margin %s", ref, public_side.name, units, quote.price, level_margin, margin=level_margin)
+
+            remaining -= units
+            cash -= leg.cash_reserved
+            if buyer:
+                private_units -= units
+            else:
+                public_units -= units
+
+    def _advance_leg(self, leg: ArbLeg, order: Order) -> None:
+        """
+        Move a MULTI_LEG leg on when one of its orders is accepted. Unless the leg is pipelined, a public
+        trade is hedged with a private order for the units that traded. Whatever of either order comes
+        back standing is cancelled, and the leg stays open until that is answered.
+        """
+        if leg.hedge_refs and order.ref == leg.hedge_refs[-1]:
+            leg.hedge_answered = True
+            self._leg_order_answered(leg, order, leg.hedge_units)
+        elif order.ref == leg.public_ref:
+            self._latency.leg_closed(leg.public_ref)
+            leg.public_answered = True
+            traded = self._leg_order_answered(leg, order, leg.units)
+            if not traded:
+                self._log.info("PUBLIC leg %s became a standing order, cancelling it", leg.public_ref)
+            elif not leg.pipelined:
+                # hedge only what actually traded
+                ref = self._placing_order(leg.private_side, self._private_market, leg.private_price, traded, Priority.HEDGE,
+                                          before_send=lambda ref: self._legs.private_sent(leg, ref, traded))
+                if ref is None:
+                    self.warning(f"Could not send PRIVATE leg for {leg.public_ref}")
+                else:
+                    self._pnl.private_sent(leg.public_ref, ref, traded)
+        else:
+            leg.private_answered = True
+            if not self._leg_order_answered(leg, order, leg.private_units):
+                self._log.info("PRIVATE leg %s became a standing order, cancelling it", leg.private_ref)
+        self._settle_leg(leg)
+
+    def _leg_order_answered(self, leg: ArbLeg, order: Order, units: int) -> int:
+        """
+        Count what a leg order of `units` traded on arrival and return it. What is left of it rests:
+        a standing order is cancelled now, the rest of a partly traded one as soon as a delta shows it.
+        """
+        traded = order.units if order.has_traded else 0
+        self._count_leg_fill(leg, order, traded)
+        if not order.has_traded:
+            leg.resting[order.fm_id] = order.units
+            self._cancel_order(order)
+        else:
+            leg.counted.add(order.fm_id)
+            if traded < units:
+                leg.remainders.add(order.ref)
+        return traded
+
+    def _follow_legs(self, orders: list[Order]) -> None:
+        """
+        Follow the resting parts of leg orders in a received_orders delta: cancel them, count what they trade
+        """
+        for order in orders:
+            if not order.mine or order.order_type is not OrderType.LIMIT:
+                continue
+            leg = self._legs.by_ref(order.ref)
+            if leg is None or order.fm_id in leg.counted:
+                continue
+            if order.fm_id not in leg.resting:
+                if order.ref not in leg.remainders:
+                    continue
+                # first sight of the rest of a partly traded order
+                leg.remainders.discard(order.ref)
+                leg.resting[order.fm_id] = order.units
+
+            resting = leg.resting[order.fm_id]
+            if order.has_traded:
+                traded = min(order.units, resting)
+                del leg.resting[order.fm_id]
+            elif order.is_cancelled:
+                traded = 0
+                del leg.resting[order.fm_id]
+            else:
+                traded = resting - order.units
+                leg.resting[order.fm_id] = order.units
+                self._cancel_order(order)
+            self._count_leg_fill(leg, order, traded)
+            self._settle_leg(leg)
+
+        for leg in self._legs.blocked():
+            self._settle_leg(leg)
+
+    @staticmethod
+    def _count_leg_fill(leg: ArbLeg, order: Order, traded: int) -> None:
+        if order.ref == leg.public_ref:
+            leg.public_filled += traded
+        elif order.ref == leg.private_ref:
+            leg.private_filled += traded
+        else:
+            leg.hedged += traded if order.order_side is leg.public_side else -traded
+
+    def _settle_leg(self, leg: ArbLeg) -> None:
+        """
+        Finish a leg once its orders are answered and nothing of them rests. Whatever one order traded
+        beyond the other is first traded back in the PUBLIC market:
+            public traded,     private traded     -> done
+            public traded,     private did not    -> sell (buy) the public units back
+            public did not,    private traded     -> take the public side in the PUBLIC market
+            neither traded                        -> reservation released
+        A hedge that comes back standing is cancelled like any leg order and sent again at the new best
+        price, MAX_HEDGE_ATTEMPTS times at most.
+        """
+        if not leg.public_answered or (leg.private_ref is not None and not leg.private_answered):
+            return
+        if (leg.hedge_refs and not leg.hedge_answered) or leg.resting or leg.remainders or leg.state is LegState.DONE:
+            return
+
+        # units on the public side still open, negative if the private order traded more
+        unhedged = leg.public_filled + leg.hedged - leg.private_filled
+        leg.hedge_blocked = False
+        if unhedged and len(leg.hedge_refs) < MAX_HEDGE_ATTEMPTS:
+            side = leg.public_side if unhedged < 0 else OrderSide.SELL if leg.public_side is OrderSide.BUY else OrderSide.BUY
+            quote_side = OrderSide.SELL if side is OrderSide.BUY else OrderSide.BUY
+            if self._book.best(self._public_market_id, quote_side) is None or self._crosses_mine(side):
+                # no quote to take, or an order of mine (e.g. another leg's being cancelled) is in the way;
+                # try again on the next update
+                leg.hedge_blocked = True
+                return
+            if unhedged > 0:
+                self._log.info("Leg %s: %s PUBLIC unit(s) not hedged privately, trading them back", leg.public_ref, unhedged)
+            ref = self._hedge_in_public(leg, side, abs(unhedged), HEDGE_PRICE_BAND)
+            if ref is not None:
+                self._legs.hedge_sent(leg, ref, abs(unhedged))
+                self._pnl.hedge_sent(leg.public_ref, ref, abs(unhedged))
+                return
+        if unhedged:
+            self.warning(f"Leg {leg.public_ref} finished with {unhedged} unit(s) unhedged on the PUBLIC side")
+        self._pnl.finished(leg.public_ref)
+        self._legs.finish(leg, release=not leg.public_filled and not leg.private_filled)
+
+    def _crosses_mine(self, side: OrderSide) -> bool:
+        # True if taking the best PUBLIC quote on `side` would cross one of my own standing orders
+        quote = self._book.best(self._public_market_id, OrderSide.SELL if side is OrderSide.BUY else OrderSide.BUY)
+        if quote is None:
+            return False
+        for mine in self._book.my_orders(self._public_market_id):
+            if mine.side is not side and (mine.price <= quote.price if side is OrderSide.BUY else mine.price >= quote.price):
+                return True
+        return False
+
+    def _hedge_in_public(self, leg: ArbLeg, side: OrderSide, units: int, band: int = 0) -> str | None:
+        """
+        Flatten what a leg left unhedged by taking the best PUBLIC quote against `side`, up to `band` through it
+        without crossing my own orders; returns the order ref
+        """
+        quote = self._book.best(self._public_market_id, OrderSide.SELL if side is OrderSide.BUY else OrderSide.BUY)
+        if quote is None:
+            self.warning(f"No PUBLIC quote to hedge leg {leg.public_ref}, {units} unit(s) left unhedged")
+            return None
+        tick = getattr(self._public_market, "price_tick", 1) or 1
+        mine = [own.price for own in self._book.my_orders(self._public_market_id) if own.side is not side]
+        if side is OrderSide.BUY:
+            price = quote.price + band
+            if mine:
+                price = max(quote.price, min(price, min(mine) - tick))
+        else:
+            price = quote.price - band
+            if mine:
+                price = min(quote.price, max(price, max(mine) + tick))
+        self._log.info("Hedging leg %s: %s %s unit(s) in PUBLIC market at %s", leg.public_ref, side.name, units, price)
+        return self._placing_order(side, self._public_market, price, units, Priority.HEDGE)
+
+    def _journal_opened(self, public_ref: str, public_side: OrderSide, public_price: int, private_side: OrderSide,
+                        private_price: int) -> None:
+        # SINGLE execution journals its one leg here, MULTI_LEG legs are journaled by the LegBook
+        if self._journal is None:
+            return
+        self._journal_leg = public_ref
+        self._journal.opened(public_ref, self._public_market_id, public_side.name, public_price, self._private_market_id,
+                             private_side.name, private_price, 1, self._ledger.units(self._public_market_id),
+                             self._ledger.units(self._private_market_id))
+
+    def _journal_private_sent(self, private_ref: str) -> None:
+        if self._journal_leg is not None:
+            self._journal.private_sent(self._journal_leg, private_ref)
+            self._journal_private_ref = private_ref
+
+    def _journal_closed(self) -> None:
+        if self._journal_leg is not None:
+            self._journal.closed(self._journal_leg)
+        self._journal_leg = None
+        self._journal_private_ref = None
+
+    @staticmethod
+    def _units_moved(units_now: dict[int, int], market_id: int, units_before: int, side: str) -> int:
+        # units an order on `side` would have to have traded for my units to move as they did
+        moved = units_now.get(market_id, 0) - units_before
+        return max(0, moved if side == OrderSide.BUY.name else -moved)
+
+    def _recover_legs(self, holdings: Holding, orders: list[Order]) -> None:
+        """
+        Resume or unwind the legs the journal still had open when the robot last stopped.
+        Orders are looked up by ref among my standing orders; one that is no longer standing either
+        traded or never did, which my units in its market tell apart:
+            public traded,     private standing   -> leave the private order to trade
+            public traded,     private not traded -> send the private order again
+            public not traded, private standing   -> cancel the private order
+            public not traded, private traded     -> hedge the private trade in the PUBLIC market
+        A public order still standing is cancelled first. With several legs open at once the units
+        are only a best guess, so every decision is logged.
+        """
+        recovered, self._recovered = self._recovered, []
+        standing = {order.ref: order for order in orders if order.mine and order.ref is not None}
+        units_now = {market.fm_id: asset.units for market, asset in holdings.assets.items()}
+
+        for entry in recovered:
+            public_order = standing.get(entry.public_ref)
+            private_order = standing.get(entry.private_ref) if entry.private_ref is not None else None
+            if public_order is not None:
+                self._cancel_order(public_order)
+                public_units = entry.units - public_order.units
+            else:
+                public_units = min(entry.units, self._units_moved(units_now, entry.public_market_id,
+                                                                  entry.public_units_before, entry.public_side))
+            private_units = 0
+            if private_order is None and entry.private_ref is not None:
+                private_units = min(entry.units, self._units_moved(units_now, entry.private_market_id,
+                                                                   entry.private_units_before, entry.private_side))
+            self._log.info("Recovering leg %s: %s PUBLIC unit(s) traded, %s PRIVATE unit(s) traded, PRIVATE order standing %s",
+                           entry.public_ref, public_units, private_units, private_order is not None)
+
+            leg = ArbLeg(0, 0, OrderSide[entry.public_side], entry.public_price, OrderSide[entry.private_side],
+                         entry.private_price, entry.units, entry.public_market_id, entry.private_market_id)
+            leg.public_ref = entry.public_ref
+            if private_order is not None and not public_units:
+                self._cancel_order(private_order)
+            elif private_order is None and public_units > private_units:
+                leg.units = public_units - private_units
+                if self._placing_order(leg.private_side, self._private_market, leg.private_price, leg.units, Priority.HEDGE) is None:
+                    self.warning(f"Could not resend PRIVATE leg for {entry.public_ref}, {leg.units} unit(s) left unhedged")
+            elif private_units > public_units:
+                self._hedge_in_public(leg, leg.public_side, private_units - public_units)
+            self._journal.closed(entry.public_ref)
+
+    def _cancel_order(self, order: Order) -> None:
+        # the gateway drops repeats while a cancel for this fm_id is outstanding
+        self._gateway.cancel(order)
+        self._log.info("Sent cancel for order: %s", order.fm_id)
+
+    def _placing_order(self, side: OrderSide, market: Market, price: int, units: int = 1,
+                       priority: Priority = Priority.NORMAL, replacing: Order | None = None,
+                       before_send: Callable[[str], None] | None = None) -> str | None:
+        """
+        Send a limit order into market at the given price, 1 unit unless told otherwise.
+        Hedges jump the gateway's queue when the order rate limit is hit. With `replacing`, that
+        standing order is cancelled and the new one sent straight after the cancel. `before_send` gets
+        the ref once the order passed validation and before it is sent, e.g. to journal it first.
+        Returns the order ref, or None if nothing was sent.
         """
         if market is None:
             self.warning("Cannot send order: PUBLIC or PRIVATE market not initialised.")
-            return
+            return None
+        if not self._scheduler.can_trade:
+            self._log.info("Session is not open, not sending %s order in %s", side.name, market.name)
+            return None
 
         new_order = Order.create_new(market)
         new_order.market = market
         new_order.order_type = OrderType.LIMIT
         new_order.order_side = side
         new_order.price = price
-        new_order.units = 1
+        new_order.units = units
         new_order.mine = True
-        new_order.ref = f"REACTIVE_TAKE_{side.name}_{price}"
+        self._order_count += 1
+        prefix = "ACTIVE_QUOTE" if self._bot_type is BotType.ACTIVE else "REACTIVE_TAKE"
+        new_order.ref = f"{prefix}_{side.name}_{price}_{self._run_id}_{self._order_count}"
+
+        new_order.owner_or_target = self._nature_trader_id if market.fm_id == self._private_market_id else None
 
-        new_order.owner_or_target = NATURE_TRADER_ID if market.fm_id == PRIVATE_MARKET_ID else None
+        # an order the exchange would reject costs a round trip, do not send it
+        reason = self._validator.check(new_order)
+        if reason is not None:
+            self._log.info("Not sending order %s: %s", new_order.ref, reason, reason=reason)
+            return None
 
+        if replacing is not None and OrderGateway.same_order(replacing, new_order):
+            self._log.info("Not replacing order %s by the same order", replacing.fm_id)
+            return None
+
+        if before_send is not None:
+            before_send(new_order.ref)
         self._waiting_for_server = True
 
-        self.send_order(new_order)
-        self.inform(f"Sent order in {market.name}: {new_order}")
+        self._latency.order_sent(new_order.ref)
+        self._ledger.reserve(new_order)
+        if replacing is None:
+            self._gateway.submit(new_order, priority)
+        else:
+            swapped = self._gateway.replace(replacing, new_order)
+            if swapped is not None:
+                # a replacement still queued behind its cancel will never be sent now
+                self.order_rejected({"error": "Replaced again before it was sent"}, swapped)
+                self._waiting_for_server = True
+        self._log.info("Sent order in %s: %s", market.name, new_order)
+        return new_order.ref
 
 
 
 if __name__ == "__main__":
     ids_bot = IDSBot(FM_ACCOUNT, FM_EMAIL, FM_PASSWORD, FM_MARKETPLACE_ID, bot_type=MARKET_PERFORMANCE_BOT_TYPE)
-    ids_bot.run()
+
+    recorder = None
+    if FLOW_LOG_PATH is not None:
+        from order_flow_log import FlowRecorder
+        recorder = FlowRecorder(FLOW_LOG_PATH)
+        recorder.attach(ids_bot)
+
+    runtime = None
+    if USE_STRATEGY_RUNTIME:
+        from strategy_runtime import StrategyRuntime
+        runtime = StrategyRuntime(ids_bot, snapshot_orders=True)
+        runtime.attach()
+
+    try:
+        ids_bot.run()
+    finally:
+        if runtime is not None:
+            runtime.stop()
+        if recorder is not None:
+            recorder.close()
+        if ids_bot._journal is not None:
+            ids_bot._journal.close()
+        ids_bot.export_pnl()
+        if LATENCY_DUMP_PATH is not None:
+            ids_bot._latency.dump(LATENCY_DUMP_PATH)
+        ids_bot._log.close()
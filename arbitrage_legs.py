@@ -0,0 +1,174 @@
+from enum import Enum
+
+from fmclient import OrderSide
+
+from leg_journal import LegJournal
+
+
+# Enum for the progress of one arbitrage leg
+class LegState(Enum):
+    PUBLIC_SENT = 0  # public order sent, waiting for it to be accepted
+    PRIVATE_SENT = 1  # private order sent, after the public order traded or together with it when pipelined
+    HEDGING = 2  # trading what the two orders left unhedged back in the public market
+    DONE = 3  # finished, reservation kept until the next holdings update
+
+
+class ArbLeg:
+    """
+    One public/private round trip for a number of units
+
+    Attributes:
+        signal_fm_id (int): fm_id of the private signal the leg trades against
+        quote_fm_id (int): fm_id of the public order the public leg takes
+        public_side, public_price: The public order
+        private_side, private_price: The private order sent once the public order trades
+        units (int): Units of the round trip
+        cash_reserved (int): Cash held back for the BUY order of the leg
+        units_reserved (tuple): (market fm_id, units) held back for the SELL order of the leg
+        pipelined (bool): Whether the private order is sent together with the public order
+        private_units (int): Units of the private order once it is sent
+        public_filled, private_filled (int): Units each order has traded so far
+        public_answered, private_answered (bool): Whether each order has been accepted or rejected
+        resting (dict): fm_id -> units not traded yet of a leg order resting in a market, cancelled on sight
+        remainders (set[str]): Refs of partly traded leg orders whose resting rest has not been seen yet
+        counted (set[int]): fm_ids of leg orders whose trade was already counted when they were accepted
+        hedged (int): Units hedge orders traded in the public market, positive on the public side
+        hedge_refs (list[str]): Refs of the hedge orders, the last one is the current hedge
+        hedge_units (int): Units of the current hedge order
+        hedge_answered (bool): Whether the current hedge order has been accepted or rejected
+        hedge_blocked (bool): Whether the hedge waits for one of my own orders it would cross to go
+        public_market_id, private_market_id (int): Markets of the two orders
+        units_before (tuple): My (public, private) units when the leg was opened, journaled for crash recovery
+    """
+
+    def __init__(self, signal_fm_id: int, quote_fm_id: int, public_side: OrderSide, public_price: int,
+                 private_side: OrderSide, private_price: int, units: int, public_market_id: int, private_market_id: int,
+                 pipelined: bool = False, units_before: tuple[int, int] = (0, 0)):
+        self.signal_fm_id = signal_fm_id
+        self.quote_fm_id = quote_fm_id
+        self.public_side = public_side
+        self.public_price = public_price
+        self.private_side = private_side
+        self.private_price = private_price
+        self.units = units
+        self.public_market_id = public_market_id
+        self.private_market_id = private_market_id
+        self.units_before = units_before
+
+        self.state = LegState.PUBLIC_SENT
+        self.public_ref: str | None = None
+        self.private_ref: str | None = None
+        self.private_units = 0
+
+        self.pipelined = pipelined
+
+        # the leg only finishes once nothing of its orders rests any more
+        self.public_filled = 0
+        self.private_filled = 0
+        self.public_answered = False
+        self.private_answered = False
+        self.resting: dict[int, int] = {}
+        self.remainders: set[str] = set()
+        self.counted: set[int] = set()
+        self.hedged = 0
+        self.hedge_refs: list[str] = []
+        self.hedge_units = 0
+        self.hedge_answered = False
+        self.hedge_blocked = False
+
+        # a BUYER leg buys public and sells private, a SELLER leg sells public and buys private
+        if public_side is OrderSide.BUY:
+            self.cash_reserved = public_price * units
+            self.units_reserved = (private_market_id, units)
+        else:
+            self.cash_reserved = private_price * units
+            self.units_reserved = (public_market_id, units)
+
+
+class LegBook:
+    """
+    Arbitrage legs in flight and the cash/units they hold back
+
+    A leg stays active until nothing of its orders rests and what it left unhedged was traded back.
+    Reservations are kept after a leg finishes until the next received_holdings, because the
+    server's available cash and units only include the trade once that update arrives.
+    With a LegJournal every open, private send and finish is also written to it.
+    """
+
+    def __init__(self, max_in_flight: int, journal: LegJournal | None = None):
+        self.max_in_flight = max_in_flight
+        self._journal = journal
+        self._by_ref: dict[str, ArbLeg] = {}
+        self._active: list[ArbLeg] = []
+        self._settling: list[ArbLeg] = []
+
+    def in_flight(self) -> int:
+        return len(self._active)
+
+    def has_room(self) -> bool:
+        return len(self._active) < self.max_in_flight
+
+    def by_ref(self, ref: str | None) -> ArbLeg | None:
+        return self._by_ref.get(ref)
+
+    def committed_units(self, signal_fm_id: int) -> int:
+        return sum(leg.units for leg in self._active if leg.signal_fm_id == signal_fm_id)
+
+    def blocked(self) -> list[ArbLeg]:
+        return [leg for leg in self._active if leg.hedge_blocked]
+
+    def targeted(self) -> set[int]:
+        return {leg.quote_fm_id for leg in self._active if not leg.public_answered}
+
+    def reserved_cash(self) -> int:
+        return sum(leg.cash_reserved for leg in self._active) + sum(leg.cash_reserved for leg in self._settling)
+
+    def reserved_units(self, market_id: int) -> int:
+        return sum(leg.units_reserved[1] for leg in self._active + self._settling if leg.units_reserved[0] == market_id)
+
+    def opened(self, leg: ArbLeg, public_ref: str) -> None:
+        leg.public_ref = public_ref
+        self._by_ref[public_ref] = leg
+        self._active.append(leg)
+        if self._journal is not None:
+            self._journal.opened(public_ref, leg.public_market_id, leg.public_side.name, leg.public_price,
+                                 leg.private_market_id, leg.private_side.name, leg.private_price, leg.units,
+                                 leg.units_before[0], leg.units_before[1], leg.pipelined)
+
+    def private_sent(self, leg: ArbLeg, private_ref: str, units: int) -> None:
+        # the public ref stays, the rest of a partly traded public order is found by it
+        leg.private_ref = private_ref
+        leg.private_units = units
+        leg.state = LegState.PRIVATE_SENT
+        self._by_ref[private_ref] = leg
+        if self._journal is not None:
+            self._journal.private_sent(leg.public_ref, private_ref)
+
+    def hedge_sent(self, leg: ArbLeg, hedge_ref: str, units: int) -> None:
+        leg.hedge_refs.append(hedge_ref)
+        leg.hedge_units = units
+        leg.hedge_answered = False
+        leg.state = LegState.HEDGING
+        self._by_ref[hedge_ref] = leg
+
+    def finish(self, leg: ArbLeg, release: bool = False) -> None:
+        """
+        Close a leg; release straight away only if nothing traded
+        """
+        self._by_ref.pop(leg.public_ref, None)
+        self._by_ref.pop(leg.private_ref, None)
+        for hedge_ref in leg.hedge_refs:
+            self._by_ref.pop(hedge_ref, None)
+        if leg in self._active:
+            self._active.remove(leg)
+        leg.state = LegState.DONE
+        if self._journal is not None:
+            self._journal.closed(leg.public_ref)
+        if not release:
+            self._settling.append(leg)
+
+    def settle(self) -> None:
+        """
+        Drop reservations of finished legs once fresh holdings have arrived
+        """
+        self._settling = []
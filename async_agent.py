@@ -0,0 +1,105 @@
+import asyncio
+import itertools
+
+from fmclient import Agent, Order
+
+
+# seconds to wait for order_accepted / order_rejected before submit() gives up
+SUBMIT_TIMEOUT_SECONDS = 5.0
+
+
+class OrderResult:
+    """
+    Answer of the exchange to one submitted order
+
+    Attributes:
+        accepted (bool): True if the order was accepted
+        order (Order): The order as returned by order_accepted / order_rejected
+        info (dict | None): Rejection details, None when accepted
+    """
+
+    __slots__ = ("accepted", "order", "info")
+
+    def __init__(self, accepted: bool, order: Order, info: dict[str, str] | None = None):
+        self.accepted = accepted
+        self.order = order
+        self.info = info
+
+    def __repr__(self) -> str:
+        return f"OrderResult({'accepted' if self.accepted else 'rejected'}, {self.order}{'' if self.info is None else f', {self.info}'})"
+
+
+class AsyncAgent:
+    """
+    Awaitable order submission for an fmclient Agent or the local_exchange stand-in
+
+    attach() wraps order_accepted / order_rejected so each answer resolves the future of the order
+    with the same ref before the robot's own callback runs. Answers may arrive on any thread, they
+    are handed to the event loop with call_soon_threadsafe.
+
+    Usage:
+        adapter = AsyncAgent(bot)
+        adapter.attach()
+        results = await asyncio.gather(adapter.submit(public_order), adapter.submit(private_order))
+
+    Attributes:
+        agent (Agent): The wrapped robot
+    """
+
+    def __init__(self, agent: Agent, loop: asyncio.AbstractEventLoop | None = None):
+        self.agent = agent
+        self._loop = loop
+        self._pending: dict[str, asyncio.Future] = {}
+        self._refs = itertools.count(1)
+
+    def attach(self) -> None:
+        order_accepted = self.agent.order_accepted
+        order_rejected = self.agent.order_rejected
+
+        def accepted(order: Order) -> None:
+            self._resolve(order.ref, OrderResult(True, order))
+            order_accepted(order)
+
+        def rejected(info: dict[str, str], order: Order) -> None:
+            self._resolve(order.ref, OrderResult(False, order, info))
+            order_rejected(info, order)
+
+        self.agent.order_accepted = accepted
+        self.agent.order_rejected = rejected
+
+    def _resolve(self, ref: str | None, result: OrderResult) -> None:
+        future = self._pending.pop(ref, None)
+        if future is not None:
+            future.get_loop().call_soon_threadsafe(self._set_result, future, result)
+
+    @staticmethod
+    def _set_result(future: asyncio.Future, result: OrderResult) -> None:
+        if not future.done():
+            future.set_result(result)
+
+    async def submit(self, order: Order, timeout: float | None = SUBMIT_TIMEOUT_SECONDS) -> OrderResult:
+        """
+        Send an order and wait for the exchange's answer.
+        Refs are how answers are matched, so an order without one gets a unique ref.
+        Raises TimeoutError if no answer arrives in time.
+        """
+        if order.ref is None:
+            order.ref = f"{self.agent.name}_ASYNC_{next(self._refs)}"
+        if order.ref in self._pending:
+            raise ValueError(f"An order with ref {order.ref!r} is already waiting for an answer")
+
+        loop = self._loop or asyncio.get_running_loop()
+        future = loop.create_future()
+        # register first, the stand-in may answer inside send_order
+        self._pending[order.ref] = future
+        try:
+            self.agent.send_order(order)
+            return await asyncio.wait_for(future, timeout)
+        finally:
+            self._pending.pop(order.ref, None)
+
+    async def run(self) -> None:
+        """
+        Run the robot's blocking run() on a worker thread
+        """
+        await asyncio.get_running_loop().run_in_executor(None, self.agent.run)
@@ -0,0 +1,178 @@
+import numpy as np
+
+import local_exchange
+
+# the backtester is offline only, robots and the order book are loaded against the stand-in
+local_exchange.install()
+
+from order_book import OrderBook
+from order_flow_log import ORDERS, FlowReplayer
+from Project_Task_1_Robot import BotType, PROFIT_MARGIN, PUBLIC_MARKET_ID, PRIVATE_MARKET_ID
+
+
+class BookSnapshots:
+    """
+    Top of book after every order update, for one or many sessions
+
+    All arrays have shape (sessions, events). Sessions shorter than the longest are padded with
+    signal_side = 0, which never trades. Prices are float so a missing quote can be NaN.
+
+    Attributes:
+        signal_side (np.ndarray): +1 private BUY signal (robot buys public), -1 private SELL signal, 0 none
+        signal_price (np.ndarray): Price of the private signal
+        public_bid (np.ndarray): Best public BUY price not mine
+        public_ask (np.ndarray): Best public SELL price not mine
+    """
+
+    def __init__(self, signal_side, signal_price, public_bid, public_ask):
+        self.signal_side = np.atleast_2d(np.asarray(signal_side, dtype=np.int8))
+        self.signal_price = np.atleast_2d(np.asarray(signal_price, dtype=np.float64))
+        self.public_bid = np.atleast_2d(np.asarray(public_bid, dtype=np.float64))
+        self.public_ask = np.atleast_2d(np.asarray(public_ask, dtype=np.float64))
+
+    @property
+    def shape(self) -> tuple[int, int]:
+        return self.signal_side.shape
+
+    @classmethod
+    def stack(cls, sessions: list["BookSnapshots"]) -> "BookSnapshots":
+        """
+        Stack single sessions into one batch, padding to the longest session
+        """
+        length = max(session.shape[1] for session in sessions)
+
+        def pad(arrays, fill):
+            out = np.full((len(arrays), length), fill, dtype=arrays[0].dtype)
+            for row, array in enumerate(arrays):
+                out[row, :array.shape[1]] = array[0]
+            return out
+
+        return cls(
+            pad([s.signal_side for s in sessions], 0),
+            pad([s.signal_price for s in sessions], np.nan),
+            pad([s.public_bid for s in sessions], np.nan),
+            pad([s.public_ask for s in sessions], np.nan),
+        )
+
+    @classmethod
+    def from_flow_log(cls, path: str, public_market_id: int = PUBLIC_MARKET_ID, private_market_id: int = PRIVATE_MARKET_ID) -> "BookSnapshots":
+        """
+        Build one session of snapshots from a FlowRecorder log, one row entry per received_orders call
+        """
+        book = OrderBook()
+        rows = []
+        for kind, _, payload in FlowReplayer(path).records():
+            if kind != ORDERS:
+                continue
+            book.apply(payload)
+            private_buy = book.best_bid(private_market_id)
+            private_sell = book.best_ask(private_market_id)
+            # the robot follows the private BUY signal first, as in IDSBot.received_orders
+            signal = private_buy if private_buy is not None else private_sell
+            public_bid = book.best_bid(public_market_id)
+            public_ask = book.best_ask(public_market_id)
+            rows.append((
+                0 if signal is None else (1 if signal is private_buy else -1),
+                np.nan if signal is None else signal.price,
+                np.nan if public_bid is None else public_bid.price,
+                np.nan if public_ask is None else public_ask.price,
+            ))
+        columns = list(zip(*rows)) if rows else [[], [], [], []]
+        return cls(*columns)
+
+
+def margins(snapshots: BookSnapshots) -> np.ndarray:
+    """
+    Margin of the private signal against the best opposite public quote, NaN when it cannot be computed
+    """
+    side = snapshots.signal_side
+    buyer_margin = snapshots.signal_price - snapshots.public_ask
+    seller_margin = snapshots.public_bid - snapshots.signal_price
+    return np.where(side == 1, buyer_margin, np.where(side == -1, seller_margin, np.nan))
+
+
+def _triggers(snapshots: BookSnapshots, margin: np.ndarray, thresholds: np.ndarray) -> np.ndarray:
+    """
+    Events where the robot trades, shape (thresholds, sessions, events)
+
+    A trade happens when the margin clears the threshold on an event where the signal or the opposite
+    quote has changed, or where the previous event did not clear it. The same opportunity seen on
+    consecutive updates is only taken once, like the one-in-flight rule of the event loop.
+    """
+    quote = np.where(snapshots.signal_side == 1, snapshots.public_ask, snapshots.public_bid)
+    key = np.stack((snapshots.signal_side.astype(np.float64), snapshots.signal_price, quote))
+    same = np.ones(snapshots.shape, dtype=bool)
+    same[:, 0] = False
+    same[:, 1:] = np.all((key[:, :, 1:] == key[:, :, :-1]) | (np.isnan(key[:, :, 1:]) & np.isnan(key[:, :, :-1])), axis=0)
+
+    qualifies = np.nan_to_num(margin, nan=-np.inf)[None, :, :] >= thresholds[:, None, None]
+    previous = np.zeros_like(qualifies)
+    previous[:, :, 1:] = qualifies[:, :, :-1]
+    return qualifies & ~(same[None, :, :] & previous)
+
+
+def sweep(snapshots: BookSnapshots, profit_margins, bot_types=(BotType.REACTIVE,), chunk_size: int = 256) -> dict[str, np.ndarray]:
+    """
+    Evaluate every (bot type, PROFIT_MARGIN) pair over every session in one vectorised pass
+
+    REACTIVE takes the opposite public quote, so each fill earns the observed margin. ACTIVE rests
+    a quote at the signal price minus or plus the margin, so each fill earns exactly the margin.
+    Sessions are processed in chunks of chunk_size to bound memory.
+
+    Returns arrays of shape (bot types, profit margins, sessions):
+        fills: number of round trips
+        pnl: realised profit in cents
+        mean_margin: average margin captured per fill, NaN without fills
+    """
+    thresholds = np.atleast_1d(np.asarray(profit_margins, dtype=np.float64))
+    sessions = snapshots.shape[0]
+    fills = np.zeros((len(bot_types), len(thresholds), sessions), dtype=np.int64)
+    pnl = np.zeros((len(bot_types), len(thresholds), sessions), dtype=np.float64)
+
+    for start in range(0, sessions, chunk_size):
+        chunk = BookSnapshots(
+            snapshots.signal_side[start:start + chunk_size],
+            snapshots.signal_price[start:start + chunk_size],
+            snapshots.public_bid[start:start + chunk_size],
+            snapshots.public_ask[start:start + chunk_size],
+        )
+        margin = margins(chunk)
+        triggers = _triggers(chunk, margin, thresholds)
+        count = triggers.sum(axis=2)
+
+        for index, bot_type in enumerate(bot_types):
+            fills[index, :, start:start + chunk_size] = count
+            if bot_type is BotType.ACTIVE:
+                pnl[index, :, start:start + chunk_size] = count * thresholds[:, None]
+            else:
+                pnl[index, :, start:start + chunk_size] = np.where(triggers, np.nan_to_num(margin)[None, :, :], 0.0).sum(axis=2)
+
+    with np.errstate(invalid="ignore", divide="ignore"):
+        mean_margin = np.where(fills > 0, pnl / fills, np.nan)
+    return {"fills": fills, "pnl": pnl, "mean_margin": mean_margin}
+
+
+def evaluate(snapshots: BookSnapshots, profit_margin: float = PROFIT_MARGIN, bot_type: BotType = BotType.REACTIVE) -> dict[str, np.ndarray]:
+    """
+    Fills, P&L and mean margin per session for a single setting
+    """
+    result = sweep(snapshots, [profit_margin], (bot_type,))
+    return {name: values[0, 0] for name, values in result.items()}
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Sweep PROFIT_MARGIN over recorded sessions")
+    parser.add_argument("logs", nargs="+", help="FlowRecorder logs, one per session")
+    parser.add_argument("--margins", type=int, nargs="+", default=list(range(0, 51, 5)))
+    args = parser.parse_args()
+
+    batch = BookSnapshots.stack([BookSnapshots.from_flow_log(path) for path in args.logs])
+    bot_types = (BotType.REACTIVE, BotType.ACTIVE)
+    result = sweep(batch, args.margins, bot_types)
+
+    print(f"{'bot type':<10} {'margin':>8} {'fills':>10} {'pnl':>12}")
+    for i, bot_type in enumerate(bot_types):
+        for j, threshold in enumerate(args.margins):
+            print(f"{bot_type.name:<10} {threshold:>8} {result['fills'][i, j].sum():>10} {result['pnl'][i, j].sum():>12.0f}")
@@ -0,0 +1,277 @@
+import argparse
+import io
+import json
+import logging
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import local_exchange
+
+# the robots import fmclient, so the stand-in has to be in place first
+local_exchange.install()
+
+from local_exchange import Asset, Holding, Market, Order, OrderSide, Session, SessionState
+
+import Project_Task_1_Robot as robot
+import periotic_methods_bot
+from bot_logging import BotLogger, Lazy
+from order_book import OrderBook
+from pair_scanner import PairScanner
+
+
+BOOK_SIZES = (10, 100, 1_000, 10_000, 100_000)
+# market pairs scanned by the pair scanner benchmark
+PAIR_COUNTS = (1, 10, 50)
+BASELINE_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), "baseline.json")
+# a benchmark fails when it is this many times slower than its baseline
+TOLERANCE = 1.5
+# runs of the whole suite; every result, saved or compared, is the median of its runs
+RUNS = 3
+
+MID = 500
+
+
+class _Sink:
+    # stands in for the exchange: orders the robot sends go nowhere
+    def submit(self, order: Order) -> None:
+        pass
+
+
+def _order(fm_id: int, market: Market, side: OrderSide, price: int, mine: bool = False) -> Order:
+    order = Order(market)
+    order.fm_id = fm_id
+    order.order_side = side
+    order.price = price
+    order.mine = mine
+    return order
+
+
+def synthetic_book(size: int, public: Market, private: Market, seed: int = 0) -> list[Order]:
+    """
+    `size` standing orders: bids below and asks above MID in the public market, one private BUY signal
+    priced so no margin clears, which keeps the robot deciding rather than trading
+    """
+    rng = random.Random(seed)
+    orders = [_order(1, private, OrderSide.BUY, MID - 50)]
+    for fm_id in range(2, size + 1):
+        if fm_id % 2:
+            orders.append(_order(fm_id, public, OrderSide.BUY, MID - rng.randint(1, 200)))
+        else:
+            orders.append(_order(fm_id, public, OrderSide.SELL, MID + rng.randint(1, 200)))
+    return orders
+
+
+def order_stream(first_fm_id: int, public: Market, count: int = 2000, window: int = 50, seed: int = 1) -> list[list[Order]]:
+    """
+    received_orders deltas: new public orders, each cancelled `window` events later, so replaying the
+    stream leaves the book as it found it
+    """
+    rng = random.Random(seed)
+    added = []
+    events = []
+    for index in range(count):
+        side = OrderSide.BUY if rng.random() < 0.5 else OrderSide.SELL
+        price = MID - rng.randint(1, 200) if side is OrderSide.BUY else MID + rng.randint(1, 200)
+        order = _order(first_fm_id + index, public, side, price)
+        added.append(order)
+        events.append([order])
+        if index >= window:
+            events.append([_cancelled(added[index - window])])
+    for order in added[count - window:]:
+        events.append([_cancelled(order)])
+    return events
+
+
+def _cancelled(order: Order) -> Order:
+    cancelled = _order(order.fm_id, order.market, order.order_side, order.price)
+    cancelled.is_cancelled = True
+    return cancelled
+
+
+def measure(fn, events: list, repeat: int = 7) -> float:
+    """
+    Fastest of `repeat` passes in nanoseconds per call of fn(*event); the minimum is the least noisy estimate
+    """
+    timings = []
+    for _ in range(repeat):
+        started = time.perf_counter_ns()
+        for event in events:
+            fn(*event)
+        timings.append((time.perf_counter_ns() - started) / len(events))
+    return min(timings)
+
+
+def _markets() -> tuple[Market, Market]:
+    return Market(robot.PUBLIC_MARKET_ID, "Public"), Market(robot.PRIVATE_MARKET_ID, "Private", private_market=True)
+
+
+def _ids_bot(size: int) -> robot.IDSBot:
+    public, private = _markets()
+    bot = robot.IDSBot("bench", "bench", "bench", 0, bot_type=robot.BotType.REACTIVE, bot_name="bench")
+    bot._exchange = _Sink()
+    bot.markets = {public.fm_id: public, private.fm_id: private}
+    Order._current = {order.fm_id: order for order in synthetic_book(size, public, private)}
+    bot.initialised()
+    bot.received_session_info(Session(1, SessionState.OPEN))
+    bot.received_holdings(Holding(10_000_000, 10_000_000, {public: Asset(100, 100), private: Asset(100, 100)}))
+    return bot
+
+
+def bench_received_orders(size: int) -> float:
+    bot = _ids_bot(size)
+    public = bot.markets[robot.PUBLIC_MARKET_ID]
+    return measure(bot.received_orders, [(event,) for event in order_stream(size + 1, public)])
+
+
+def bench_order_accepted(size: int) -> float:
+    bot = _ids_bot(size)
+    public = bot.markets[robot.PUBLIC_MARKET_ID]
+    events = []
+    for index in range(2000):
+        order = _order(size + 1 + index, public, OrderSide.BUY, MID - 100, mine=True)
+        order.ref = f"BENCH_{index}"
+        events.append((order,))
+    return measure(bot.order_accepted, events)
+
+
+def bench_best_standing_sell(size: int) -> float:
+    _, private = _markets()
+    market = Market(periotic_methods_bot.MARKET_ID_ASSET_A, "Asset A")
+    bot = periotic_methods_bot.FMRobot("bench", "bench", "bench", 0)
+    Order._current = {order.fm_id: order for order in synthetic_book(size, market, private)}
+    bot.initialised()
+    return measure(bot._get_best_standing_sell_order, [()] * 2000)
+
+
+def bench_workshop_3_received_orders(size: int) -> float:
+    import workshop_3_bot
+
+    _, private = _markets()
+    market = Market(workshop_3_bot.MARKET_ID_ASSET_A, "Asset A")
+    bot = workshop_3_bot.FMRobot("bench", "bench", "bench", 0)
+    bot._exchange = _Sink()
+    bot.marketplace = local_exchange.LocalExchange([market])
+    bot.markets = {market.fm_id: market}
+    Order._current = {order.fm_id: order for order in synthetic_book(size, market, private)}
+    bot._book.rebuild(Order.current().values())
+    return measure(bot.received_orders, [(event,) for event in order_stream(size + 1, market)])
+
+
+def bench_pair_scanner(pairs: int, orders_per_market: int = 100) -> float:
+    """
+    OrderBook.apply + PairScanner.apply + scan per received_orders delta, with the deltas spread over all pairs
+    """
+    markets = {}
+    book_orders = []
+    for index in range(pairs):
+        public = Market(10_000 + 2 * index, f"Item {index}")
+        private = Market(10_001 + 2 * index, f"Item {index} (private)", private_market=True)
+        markets[public.fm_id] = public
+        markets[private.fm_id] = private
+        book_orders += synthetic_book(orders_per_market, public, private, seed=index)
+    for fm_id, order in enumerate(book_orders, 1):
+        order.fm_id = fm_id
+
+    book = OrderBook()
+    book.rebuild(book_orders)
+    scanner = PairScanner.for_markets(book, markets)
+    public_markets = [market for market in markets.values() if not market.private_market]
+    # every stream uses its own fm_id range so the streams do not collide
+    streams = [order_stream(len(book_orders) + 1 + index * 10_000, market, count=2000 // pairs + 50, seed=index)
+               for index, market in enumerate(public_markets)]
+    events = [(stream[step],) for step in range(min(len(stream) for stream in streams)) for stream in streams]
+
+    def on_orders(orders: list[Order]) -> None:
+        book.apply(orders)
+        scanner.apply(orders)
+        scanner.scan(robot.PROFIT_MARGIN)
+
+    return measure(on_orders, events)
+
+
+def bench_logging() -> dict[str, float]:
+    stream = io.StringIO()
+    handler = logging.StreamHandler(stream)
+    logger = logging.getLogger("agent.bench_logging")
+    logger.propagate = False
+    logger.addHandler(handler)
+
+    log = BotLogger("agent.bench_logging", logging.INFO)
+    events = [(index,) for index in range(20_000)]
+    results = {
+        "debug_disabled": measure(lambda value: log.debug("value %s", value), events),
+        "debug_disabled_lazy": measure(lambda value: log.debug("%s", Lazy(str, value)), events),
+        "info_enabled": measure(lambda value: log.info("value %s", value), events),
+    }
+    logger.removeHandler(handler)
+    return results
+
+
+def run(sizes: tuple[int, ...]) -> dict[str, dict[str, float]]:
+    results: dict[str, dict[str, float]] = {}
+    for name, bench in (
+        ("ids_bot.received_orders", bench_received_orders),
+        ("ids_bot.order_accepted", bench_order_accepted),
+        ("periotic.best_standing_sell", bench_best_standing_sell),
+        ("workshop_3.received_orders", bench_workshop_3_received_orders),
+    ):
+        for size in sizes:
+            results.setdefault(name, {})[str(size)] = bench(size)
+    for pairs in PAIR_COUNTS:
+        results.setdefault("pair_scanner.received_orders", {})[str(pairs)] = bench_pair_scanner(pairs)
+    for name, value in bench_logging().items():
+        results[f"logging.{name}"] = {"0": value}
+    return results
+
+
+def median_of(runs: list[dict[str, dict[str, float]]]) -> dict[str, dict[str, float]]:
+    """
+    Median of every result over several run() results
+    """
+    return {name: {size: statistics.median(run[name][size] for run in runs) for size in by_size}
+            for name, by_size in runs[0].items()}
+
+
+def compare(results: dict, baseline: dict, tolerance: float) -> list[str]:
+    """
+    Names of the benchmarks slower than tolerance times their baseline, or in the baseline but not run
+    """
+    regressions = [f"{name}: in the baseline but not measured" for name in baseline if name not in results]
+    for name, by_size in results.items():
+        for size, value in by_size.items():
+            base = baseline.get(name, {}).get(size)
+            if base is not None and value > base * tolerance:
+                regressions.append(f"{name}[{size}]: {value:,.0f}ns vs baseline {base:,.0f}ns ({value / base:.2f}x)")
+    return regressions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time the robots' decision paths on synthetic books with the local fmclient stand-in")
+    parser.add_argument("--sizes", type=int, nargs="+", default=list(BOOK_SIZES))
+    parser.add_argument("--baseline", default=BASELINE_PATH)
+    parser.add_argument("--save", action="store_true", help="write the results as the new baseline")
+    parser.add_argument("--tolerance", type=float, default=TOLERANCE)
+    parser.add_argument("--runs", type=int, default=RUNS, help="runs of the suite to take the median of")
+    args = parser.parse_args()
+
+    logging.getLogger("agent").setLevel(logging.WARNING)
+    results = median_of([run(tuple(args.sizes)) for _ in range(args.runs)])
+
+    for name, by_size in results.items():
+        print(f"{name:<32} " + "  ".join(f"{size:>7}: {value:>10,.0f}ns" for size, value in by_size.items()))
+
+    if args.save:
+        with open(args.baseline, "w") as baseline_file:
+            json.dump(results, baseline_file, indent=2, sort_keys=True)
+        print(f"baseline saved to {args.baseline}")
+    elif os.path.exists(args.baseline):
+        with open(args.baseline) as baseline_file:
+            regressions = compare(results, json.load(baseline_file), args.tolerance)
+        for regression in regressions:
+            print(f"REGRESSION {regression}")
+        sys.exit(1 if regressions else 0)
@@ -0,0 +1,102 @@
+import json
+import logging
+import logging.handlers
+import queue
+from collections import Counter
+from typing import Callable
+
+
+class Lazy:
+    """
+    Defers building a log message until a handler actually formats it
+
+    Usage:
+        log.info("%s", Lazy(self._holdings_table, holdings))
+    """
+
+    __slots__ = ("_fn", "_args")
+
+    def __init__(self, fn: Callable[..., str], *args):
+        self._fn = fn
+        self._args = args
+
+    def __str__(self) -> str:
+        return self._fn(*self._args)
+
+
+class JsonLinesFormatter(logging.Formatter):
+    """
+    One JSON object per record, with any `fields` passed to BotLogger merged in
+    """
+
+    def format(self, record: logging.LogRecord) -> str:
+        entry = {
+            "ts": record.created,
+            "level": record.levelname,
+            "logger": record.name,
+            "msg": record.getMessage(),
+        }
+        entry.update(getattr(record, "fields", {}))
+        return json.dumps(entry, default=str)
+
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    # the stock QueueHandler formats in the calling thread, keep the record as-is so the listener does it
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        return record
+
+
+class BotLogger:
+    """
+    Level-gated logging for robot callbacks
+
+    Messages use %-style arguments and are only formatted when the level is enabled, so disabled
+    DEBUG lines in a hot callback cost one level check. When json_path is given, records are also
+    written as JSON lines by a background thread; arguments are formatted on that thread, so pass
+    values rather than objects that will change. count() keeps per-callback event counters.
+
+    Attributes:
+        counters (Counter): callback name -> number of calls
+    """
+
+    def __init__(self, name: str, level: int | None = None, json_path: str | None = None):
+        self._logger = logging.getLogger(name)
+        if level is not None:
+            self._logger.setLevel(level)
+        self.counters = Counter()
+        self._listener = None
+
+        if json_path is not None:
+            records = queue.SimpleQueue()
+            file_handler = logging.FileHandler(json_path)
+            file_handler.setFormatter(JsonLinesFormatter())
+            self._listener = logging.handlers.QueueListener(records, file_handler, respect_handler_level=True)
+            self._logger.addHandler(_DeferredQueueHandler(records))
+            self._listener.start()
+
+    def enabled(self, level: int) -> bool:
+        return self._logger.isEnabledFor(level)
+
+    def count(self, callback: str) -> None:
+        self.counters[callback] += 1
+
+    def debug(self, msg: str, *args, **fields) -> None:
+        if self._logger.isEnabledFor(logging.DEBUG):
+            self._logger.debug(msg, *args, extra={"fields": fields})
+
+    def info(self, msg: str, *args, **fields) -> None:
+        if self._logger.isEnabledFor(logging.INFO):
+            self._logger.info(msg, *args, extra={"fields": fields})
+
+    def warning(self, msg: str, *args, **fields) -> None:
+        if self._logger.isEnabledFor(logging.WARNING):
+            self._logger.warning(msg, *args, extra={"fields": fields})
+
+    def close(self) -> None:
+        """
+        Log the callback counters and stop the background writer
+        """
+        self.info("Callback counts: %s", dict(self.counters), counters=dict(self.counters))
+        if self._listener is not None:
+            self._listener.stop()
+            self._listener = None
@@ -0,0 +1,171 @@
+from collections import Counter
+
+from fmclient import Holding, Order, OrderSide, OrderType
+
+
+class _Reservation:
+    # cash or units held back for the units of one of my orders that have not traded yet
+    __slots__ = ("side", "market_id", "price", "units", "fm_id")
+
+    def __init__(self, side: OrderSide, market_id: int, price: int, units: int):
+        self.side = side
+        self.market_id = market_id
+        self.price = price
+        self.units = units
+        self.fm_id: int | None = None  # of the accepted order
+
+
+class HoldingsLedger:
+    """
+    Local view of my cash and units that moves as soon as orders are sent, not when holdings arrive
+
+    reserve() takes an order's cash (BUY) or units (SELL) out of the available amounts when it is sent.
+    The reservation is given back on reject or cancel and stays while the order is standing. Fills turn
+    it into a trade unit by unit: a partly traded order books what traded and keeps the rest reserved,
+    under its new fm_id (same ref) once that shows up in a received_orders delta. reconcile() resets the
+    view to the server's holdings, minus the orders the server has not answered yet, and records how far
+    the local view had drifted.
+
+    Attributes:
+        cash, cash_available (int): Local view of my cash in cents
+        counters (Counter): "reserved", "released", "filled", "dropped" (standing orders that ended without a
+            delta saying how), "reconciled" and "drifted" counts
+        last_drift (dict): Server minus local view at the last reconcile: {"cash": ..., market fm_id: units}
+    """
+
+    def __init__(self):
+        self.cash = 0
+        self.cash_available = 0
+        self._units: dict[int, int] = {}
+        self._units_available: dict[int, int] = {}
+        self._in_flight: dict[str, _Reservation] = {}  # by ref, sent but not answered
+        self._standing: dict[int, _Reservation] = {}  # by fm_id, accepted and not traded yet
+        self._remainders: dict[str, _Reservation] = {}  # by ref, rest of a partly traded order not yet seen standing
+        self.counters = Counter()
+        self.last_drift: dict = {}
+
+    def units(self, market_id: int) -> int:
+        return self._units.get(market_id, 0)
+
+    def units_available(self, market_id: int) -> int:
+        return self._units_available.get(market_id, 0)
+
+    # ----- order life cycle -----
+
+    def reserve(self, order: Order) -> None:
+        reservation = _Reservation(order.order_side, order.market.fm_id, order.price, order.units)
+        self._in_flight[order.ref] = reservation
+        self._hold(reservation, -1)
+        self.counters["reserved"] += 1
+
+    def _hold(self, reservation: _Reservation, sign: int) -> None:
+        # sign -1 takes the reservation out of the available amounts, +1 gives it back
+        if reservation.side is OrderSide.BUY:
+            self.cash_available += sign * reservation.price * reservation.units
+        else:
+            self._units_available[reservation.market_id] = self.units_available(reservation.market_id) + sign * reservation.units
+
+    def _release(self, reservation: _Reservation | None) -> None:
+        if reservation is not None:
+            self._hold(reservation, +1)
+            self.counters["released"] += 1
+
+    def _fill(self, reservation: _Reservation, units: int) -> None:
+        # these units already left the available amounts, move the totals and credit the other side
+        amount = reservation.price * units
+        if reservation.side is OrderSide.BUY:
+            self.cash -= amount
+            self._units[reservation.market_id] = self.units(reservation.market_id) + units
+            self._units_available[reservation.market_id] = self.units_available(reservation.market_id) + units
+        else:
+            self._units[reservation.market_id] = self.units(reservation.market_id) - units
+            self.cash += amount
+            self.cash_available += amount
+        reservation.units -= units
+        self.counters["filled"] += 1
+
+    def accepted(self, order: Order) -> None:
+        if order.order_type is OrderType.CANCEL:
+            # the cancelled order's own delta may never say so, e.g. when it is coalesced away
+            self._release(self._standing.pop(order.fm_id, None))
+            return
+        reservation = self._in_flight.pop(order.ref, None)
+        if reservation is None:
+            return
+        reservation.fm_id = order.fm_id
+        if not order.has_traded:
+            self._standing[order.fm_id] = reservation
+            return
+        self._fill(reservation, min(order.units, reservation.units))
+        if reservation.units:
+            self._remainders[order.ref] = reservation
+
+    def rejected(self, order: Order) -> None:
+        if order.order_type is OrderType.CANCEL:
+            # no longer standing: it traded or was cancelled already
+            if self._standing.pop(order.fm_id, None) is not None:
+                self.counters["dropped"] += 1
+            return
+        self._release(self._in_flight.pop(order.ref, None))
+
+    def apply(self, orders: list[Order]) -> None:
+        """
+        Follow my standing orders in the deltas passed to received_orders
+        """
+        for order in orders:
+            if not order.mine:
+                continue
+            reservation = self._standing.get(order.fm_id)
+            if reservation is None:
+                # the rest of a partly traded order stands under a new fm_id
+                reservation = self._remainders.get(order.ref) if self._remainders else None
+                if reservation is None or order.fm_id == reservation.fm_id:
+                    continue
+                del self._remainders[order.ref]
+                reservation.fm_id = order.fm_id
+                self._standing[order.fm_id] = reservation
+
+            if order.has_traded:
+                # traded completely: whatever was still reserved
+                del self._standing[order.fm_id]
+                self._fill(reservation, reservation.units)
+                continue
+            if order.units < reservation.units:
+                # traded partly, the rest stands or was cancelled
+                self._fill(reservation, reservation.units - order.units)
+            if order.order_type is OrderType.CANCEL or order.is_cancelled:
+                del self._standing[order.fm_id]
+                self._release(reservation)
+
+    # ----- server holdings -----
+
+    def reconcile(self, holdings: Holding) -> dict:
+        """
+        Reset to the server's holdings, keeping the orders still in flight reserved.
+        Returns the drift, server minus local view, with only the non-zero entries.
+        """
+        in_flight_cash = sum(r.price * r.units for r in self._in_flight.values() if r.side is OrderSide.BUY)
+        in_flight_units = Counter()
+        for reservation in self._in_flight.values():
+            if reservation.side is OrderSide.SELL:
+                in_flight_units[reservation.market_id] += reservation.units
+
+        drift = {}
+        cash_available = holdings.cash_available - in_flight_cash
+        if self.counters["reconciled"] and cash_available != self.cash_available:
+            drift["cash"] = cash_available - self.cash_available
+        self.cash = holdings.cash
+        self.cash_available = cash_available
+
+        for market, asset in holdings.assets.items():
+            units_available = asset.units_available - in_flight_units[market.fm_id]
+            if self.counters["reconciled"] and units_available != self.units_available(market.fm_id):
+                drift[market.fm_id] = units_available - self.units_available(market.fm_id)
+            self._units[market.fm_id] = asset.units
+            self._units_available[market.fm_id] = units_available
+
+        self.counters["reconciled"] += 1
+        if drift:
+            self.counters["drifted"] += 1
+        self.last_drift = drift
+        return drift
@@ -0,0 +1,142 @@
+import json
+import time
+
+
+class LatencyHistogram:
+    """
+    HDR-style histogram of nanosecond values
+
+    Values are bucketed log-linearly: each power of two is split into 2 ** (SUB_BITS - 1) buckets, so
+    recording is O(1), memory stays small whatever the range and percentiles are within ~1.6%.
+    """
+
+    SUB_BITS = 7
+
+    def __init__(self):
+        self._counts: dict[int, int] = {}
+        self.count = 0
+        self.total = 0
+        self.min = None
+        self.max = None
+
+    def record(self, value: int) -> None:
+        value = max(0, int(value))
+        shift = value.bit_length() - self.SUB_BITS
+        index = value if shift <= 0 else (shift << self.SUB_BITS) + (value >> shift)
+        self._counts[index] = self._counts.get(index, 0) + 1
+        self.count += 1
+        self.total += value
+        if self.min is None or value < self.min:
+            self.min = value
+        if self.max is None or value > self.max:
+            self.max = value
+
+    def _bucket_value(self, index: int) -> int:
+        shift = index >> self.SUB_BITS
+        if shift == 0:
+            return index
+        return (index & ((1 << self.SUB_BITS) - 1)) << shift
+
+    def percentile(self, q: float) -> int | None:
+        """
+        Value at percentile q (0-100), reported as the lower bound of its bucket
+        """
+        if self.count == 0:
+            return None
+        rank = max(1, round(q / 100 * self.count))
+        seen = 0
+        for index in sorted(self._counts):
+            seen += self._counts[index]
+            if seen >= rank:
+                return min(max(self._bucket_value(index), self.min), self.max)
+        return self.max
+
+    def summary(self) -> dict[str, float | int | None]:
+        """
+        Count, mean, p50, p99, p999 and max in microseconds
+        """
+        def us(value):
+            return None if value is None else value / 1000
+
+        return {
+            "count": self.count,
+            "mean_us": us(self.total / self.count) if self.count else None,
+            "p50_us": us(self.percentile(50)),
+            "p99_us": us(self.percentile(99)),
+            "p999_us": us(self.percentile(99.9)),
+            "max_us": us(self.max),
+        }
+
+
+class LatencyRecorder:
+    """
+    Callback wall time, order round-trip and pending-leg histograms for a robot
+
+    attach() wraps the Agent callbacks on the instance. Round trips are matched by order ref, so
+    refs must be unique per order. Histograms are named "callback.<name>", "round_trip.accepted",
+    "round_trip.rejected" and "public_leg_open".
+
+    Attributes:
+        histograms (dict): name -> LatencyHistogram
+    """
+
+    CALLBACKS = ("received_orders", "received_holdings", "received_session_info", "order_accepted", "order_rejected")
+
+    def __init__(self):
+        self.histograms: dict[str, LatencyHistogram] = {}
+        self._accepted = self.histogram("round_trip.accepted")
+        self._rejected = self.histogram("round_trip.rejected")
+        self._sent: dict[str, int] = {}
+        self._legs_opened: dict[str | None, int] = {}
+
+    def histogram(self, name: str) -> LatencyHistogram:
+        histogram = self.histograms.get(name)
+        if histogram is None:
+            histogram = self.histograms[name] = LatencyHistogram()
+        return histogram
+
+    def attach(self, agent) -> None:
+        for name in self.CALLBACKS:
+            setattr(agent, name, self._timed(name, getattr(agent, name)))
+
+    def _timed(self, name: str, callback):
+        histogram = self.histogram(f"callback.{name}")
+        clock = time.perf_counter_ns
+
+        def timed(*args):
+            started = clock()
+            try:
+                return callback(*args)
+            finally:
+                histogram.record(clock() - started)
+
+        return timed
+
+    def order_sent(self, ref: str) -> None:
+        self._sent[ref] = time.perf_counter_ns()
+
+    def order_answered(self, ref: str, accepted: bool) -> int | None:
+        """
+        Record the round trip of an answered order and return it in nanoseconds, None if the ref was not sent
+        """
+        sent = self._sent.pop(ref, None)
+        if sent is None:
+            return None
+        round_trip = time.perf_counter_ns() - sent
+        (self._accepted if accepted else self._rejected).record(round_trip)
+        return round_trip
+
+    def leg_opened(self, key: str | None = None) -> None:
+        self._legs_opened[key] = time.perf_counter_ns()
+
+    def leg_closed(self, key: str | None = None) -> None:
+        opened = self._legs_opened.pop(key, None)
+        if opened is not None:
+            self.histogram("public_leg_open").record(time.perf_counter_ns() - opened)
+
+    def snapshot(self) -> dict[str, dict]:
+        return {name: histogram.summary() for name, histogram in sorted(self.histograms.items())}
+
+    def dump(self, path: str) -> None:
+        with open(path, "w") as dump_file:
+            json.dump(self.snapshot(), dump_file, indent=2)
@@ -0,0 +1,187 @@
+import mmap
+import os
+import struct
+
+
+# journal file size; when it fills up it is rewritten with only the open legs
+JOURNAL_BYTES = 1 << 20
+
+_RECORD = struct.Struct("<IB")  # payload length, kind
+_SEPARATOR = "\x1f"
+
+# Record kinds
+_OPENED = 1
+_PRIVATE_SENT = 2
+_CLOSED = 3
+# fields of each record kind; a record with a different count was torn by a crash
+_FIELDS = {_OPENED: 11, _PRIVATE_SENT: 2, _CLOSED: 1}
+
+
+class JournalEntry:
+    """
+    An arbitrage leg that was open when the journal was last written
+
+    Attributes:
+        public_ref (str): Ref of the public order, the key of the leg
+        public_market_id, private_market_id (int): Markets of the two orders
+        public_side, private_side (str): OrderSide names
+        public_price, private_price (int): Order prices
+        units (int): Units of the round trip
+        public_units_before, private_units_before (int): My units in each market when the leg was opened
+        pipelined (bool): Whether both orders were sent together
+        private_ref (str | None): Ref of the private order once it was sent
+    """
+
+    __slots__ = ("public_ref", "public_market_id", "public_side", "public_price", "private_market_id", "private_side",
+                 "private_price", "units", "public_units_before", "private_units_before", "pipelined", "private_ref")
+
+    def __init__(self, fields: list[str]):
+        self.public_ref = fields[0]
+        self.public_market_id = int(fields[1])
+        self.public_side = fields[2]
+        self.public_price = int(fields[3])
+        self.private_market_id = int(fields[4])
+        self.private_side = fields[5]
+        self.private_price = int(fields[6])
+        self.units = int(fields[7])
+        self.public_units_before = int(fields[8])
+        self.private_units_before = int(fields[9])
+        self.pipelined = fields[10] == "1"
+        self.private_ref = None
+
+    def __repr__(self) -> str:
+        return (f"JournalEntry({self.public_ref}: {self.public_side} {self.units}@{self.public_price} public, "
+                f"{self.private_side} @{self.private_price} private, private_ref={self.private_ref})")
+
+
+class LegJournal:
+    """
+    Write-ahead journal of arbitrage leg transitions in a memory-mapped file
+
+    Each transition is one small record written straight into the mapping, so it survives the
+    process dying without an fsync on the hot path; flush() / close() push it to disk. Records are
+    a 4-byte payload length, a kind byte and the fields joined by \\x1f; a zero length marks the end,
+    and replay also stops at a record whose payload was cut short.
+    Opening an existing file replays it, open_legs() returns the legs that were never closed.
+    Compaction writes the open legs to a new file and swaps it in with os.replace, so a crash
+    at any point leaves either the old journal or the new one.
+    """
+
+    def __init__(self, path: str, size: int = JOURNAL_BYTES):
+        self._path = path
+        self._open: dict[str, list[str]] = {}  # public ref -> fields of the open record
+        self._private: dict[str, str] = {}  # public ref -> private ref
+
+        self._size = max(size, os.path.getsize(path) if os.path.exists(path) else 0)
+        if os.path.exists(path) and os.path.getsize(path) > 0:
+            self._map_file()
+            self._replay()
+        else:
+            self._map = None
+        # start the file over with only what is still open
+        self._compact()
+
+    def _map_file(self) -> None:
+        self._file = open(self._path, "r+b")
+        if os.path.getsize(self._path) < self._size:
+            self._file.truncate(self._size)
+        self._map = mmap.mmap(self._file.fileno(), 0)
+
+    def _replay(self) -> None:
+        position = 0
+        while position + _RECORD.size <= self._size:
+            length, kind = _RECORD.unpack_from(self._map, position)
+            if length == 0 or position + _RECORD.size + length > self._size:
+                break
+            payload = self._map[position + _RECORD.size:position + _RECORD.size + length]
+            fields = payload.decode(errors="replace").split(_SEPARATOR)
+            if b"\x00" in payload or len(fields) != _FIELDS.get(kind):
+                # the file was cut inside this record (mmap pages can reach the disk out of order), nothing after it is whole
+                break
+            if kind == _OPENED:
+                self._open[fields[0]] = fields
+            elif kind == _PRIVATE_SENT and fields[0] in self._open:
+                self._private[fields[0]] = fields[1]
+            elif kind == _CLOSED:
+                self._open.pop(fields[0], None)
+                self._private.pop(fields[0], None)
+            position += _RECORD.size + length
+
+    def _write(self, kind: int, fields: list[str]) -> None:
+        payload = _SEPARATOR.join(fields).encode()
+        needed = _RECORD.size + len(payload)
+        if self._position + needed + _RECORD.size > self._size:
+            self._compact()
+            if self._position + needed + _RECORD.size > self._size:
+                raise RuntimeError(f"Leg journal {self._path} is too small for the open legs")
+        start = self._position + _RECORD.size
+        self._map[start:start + len(payload)] = payload
+        # the length goes in last, a record cut short by a crash is never read back
+        _RECORD.pack_into(self._map, self._position, len(payload), kind)
+        self._position += needed
+
+    @staticmethod
+    def _record(kind: int, fields: list[str]) -> bytes:
+        payload = _SEPARATOR.join(fields).encode()
+        return _RECORD.pack(len(payload), kind) + payload
+
+    def _compact(self) -> None:
+        records = bytearray()
+        for public_ref, fields in self._open.items():
+            records += self._record(_OPENED, fields)
+            if public_ref in self._private:
+                records += self._record(_PRIVATE_SENT, [public_ref, self._private[public_ref]])
+        if len(records) + _RECORD.size > self._size:
+            raise RuntimeError(f"Leg journal {self._path} is too small for the open legs")
+
+        # the old journal stays whole until the new one is on disk
+        temporary = self._path + ".tmp"
+        with open(temporary, "wb") as new_file:
+            new_file.write(records)
+            new_file.truncate(self._size)
+            new_file.flush()
+            os.fsync(new_file.fileno())
+        if self._map is not None:
+            self._map.close()
+            self._file.close()
+        os.replace(temporary, self._path)
+        self._map_file()
+        self._position = len(records)
+
+    # ----- transitions -----
+
+    def opened(self, public_ref: str, public_market_id: int, public_side: str, public_price: int, private_market_id: int,
+               private_side: str, private_price: int, units: int, public_units_before: int, private_units_before: int,
+               pipelined: bool = False) -> None:
+        fields = [public_ref, str(public_market_id), public_side, str(public_price), str(private_market_id), private_side,
+                  str(private_price), str(units), str(public_units_before), str(private_units_before), "1" if pipelined else "0"]
+        self._open[public_ref] = fields
+        self._write(_OPENED, fields)
+
+    def private_sent(self, public_ref: str, private_ref: str) -> None:
+        if public_ref in self._open:
+            self._private[public_ref] = private_ref
+            self._write(_PRIVATE_SENT, [public_ref, private_ref])
+
+    def closed(self, public_ref: str) -> None:
+        if self._open.pop(public_ref, None) is not None:
+            self._private.pop(public_ref, None)
+            self._write(_CLOSED, [public_ref])
+
+    # ----- recovery -----
+
+    def open_legs(self) -> list[JournalEntry]:
+        entries = []
+        for public_ref, fields in self._open.items():
+            entry = JournalEntry(fields)
+            entry.private_ref = self._private.get(public_ref)
+            entries.append(entry)
+        return entries
+
+    def flush(self) -> None:
+        self._map.flush()
+
+    def close(self) -> None:
+        self._map.flush()
+        self._map.close()
+        self._file.close()
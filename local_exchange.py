@@ -0,0 +1,690 @@
+import argparse
+import copy
+import heapq
+import itertools
+import logging
+import random
+import sys
+import time
+from enum import Enum
+from typing import Callable
+
+
+# The fmclient stand-in
+# These mirror the parts of fmclient the robots use, so a robot script runs unchanged once install() is called
+
+class OrderSide(Enum):
+    BUY = 0
+    SELL = 1
+
+
+class OrderType(Enum):
+    LIMIT = 0
+    CANCEL = 1
+
+
+class SessionState(Enum):
+    OPEN = 0
+    PAUSED = 1
+    CLOSED = 2
+
+
+class Market:
+    """
+    A market in the local marketplace
+
+    Attributes:
+        fm_id (int): Market id, the same ids as the live marketplace can be used
+        private_market (bool): Whether orders in the market must target a single trader
+        min_price, max_price, price_tick (int): Valid price range and tick, in cents
+    """
+
+    _markets: dict[int, "Market"] = {}
+
+    def __init__(self, fm_id: int, name: str, private_market: bool = False, min_price: int = 1, max_price: int = 100000, price_tick: int = 1, description: str = ""):
+        self.fm_id = fm_id
+        self.name = name
+        self.private_market = private_market
+        self.min_price = min_price
+        self.max_price = max_price
+        self.price_tick = price_tick
+        self.description = description
+        Market._markets[fm_id] = self
+
+    @classmethod
+    def get_by_id(cls, fm_id: int) -> "Market | None":
+        return cls._markets.get(fm_id)
+
+    def __repr__(self) -> str:
+        return f"Market({self.name}, {self.fm_id})"
+
+
+class Asset:
+    def __init__(self, units: int, units_available: int):
+        self.units = units
+        self.units_available = units_available
+
+
+class Holding:
+    def __init__(self, cash: int, cash_available: int, assets: dict[Market, Asset]):
+        self.cash = cash
+        self.cash_available = cash_available
+        self.assets = assets
+
+
+class Session:
+    def __init__(self, fm_id: int, state: SessionState):
+        self.fm_id = fm_id
+        self.state = state
+
+    @property
+    def is_open(self) -> bool:
+        return self.state is SessionState.OPEN
+
+    @property
+    def is_paused(self) -> bool:
+        return self.state is SessionState.PAUSED
+
+    @property
+    def is_closed(self) -> bool:
+        return self.state is SessionState.CLOSED
+
+
+class Order:
+    """
+    An order in the local marketplace. Order.current() holds the standing orders the attached robot can see.
+    """
+
+    _current: dict[int, "Order"] = {}
+
+    def __init__(self, market: Market | None = None):
+        self.fm_id = None
+        self.market = market
+        self.order_type = OrderType.LIMIT
+        self.order_side = OrderSide.BUY
+        self.price = 0
+        self.units = 1
+        self.mine = False
+        self.ref = None
+        self.owner_or_target = None
+        self.has_traded = False
+        self.is_cancelled = False
+        self.owner = None  # trader id of the order owner, set by the exchange
+
+    @classmethod
+    def create_new(cls, market: Market | None = None) -> "Order":
+        return cls(market)
+
+    @classmethod
+    def current(cls) -> dict[int, "Order"]:
+        return cls._current
+
+    def __str__(self) -> str:
+        market_name = self.market.name if self.market is not None else None
+        return (
+            f"[{self.order_type.name} {self.order_side.name} {self.units}@{self.price} in {market_name}, "
+            f"fm_id={self.fm_id}, ref={self.ref}, traded={self.has_traded}, cancelled={self.is_cancelled}]"
+        )
+
+
+class Agent:
+    """
+    Local version of fmclient.Agent. Callbacks are driven by the LocalExchange the agent is attached to.
+    """
+
+    def __init__(self, account: str, email: str, password: str, marketplace_id: int, name: str = "FMBot"):
+        self.account = account
+        self.email = email
+        self.marketplace_id = marketplace_id
+        self.name = name
+        self.description = ""
+        self.marketplace = None
+        self.markets: dict[int, Market] = {}
+        self._exchange: "LocalExchange | None" = None
+        self._logger = logging.getLogger("agent")
+
+    def inform(self, message) -> None:
+        self._logger.info(message)
+
+    def warning(self, message) -> None:
+        self._logger.warning(message)
+
+    def error(self, message) -> None:
+        self._logger.error(message)
+
+    def send_order(self, order: Order) -> None:
+        if self._exchange is None:
+            raise RuntimeError(f"{self.name} is not attached to a LocalExchange")
+        self._exchange.submit(order)
+
+    def execute_periodically(self, func: Callable[[], None], sleep_time: float) -> None:
+        self._exchange.schedule_periodic(func, sleep_time, None)
+
+    def execute_periodically_conditionally(self, func: Callable[[], None], sleep_time: float, condition: Callable[[], bool]) -> None:
+        self._exchange.schedule_periodic(func, sleep_time, condition)
+
+    def run(self) -> None:
+        if self._exchange is None:
+            raise RuntimeError(f"{self.name} is not attached to a LocalExchange")
+        self._exchange.run()
+
+    def initialised(self) -> None:
+        pass
+
+    def pre_start_tasks(self) -> None:
+        pass
+
+    def received_session_info(self, session: Session) -> None:
+        pass
+
+    def received_holdings(self, holdings: Holding) -> None:
+        pass
+
+    def received_orders(self, orders: list[Order]) -> None:
+        pass
+
+    def order_accepted(self, order: Order) -> None:
+        pass
+
+    def order_rejected(self, info: dict[str, str], order: Order) -> None:
+        pass
+
+
+def install() -> None:
+    """
+    Register this module as fmclient, call before importing a robot script to run it offline
+    """
+    sys.modules["fmclient"] = sys.modules[__name__]
+
+
+# The matching engine
+
+class _Trader:
+    def __init__(self, trader_id: str, cash: int, units: dict[int, int], unlimited: bool):
+        self.trader_id = trader_id
+        self.cash = cash
+        self.units = units
+        self.unlimited = unlimited
+        self.cash_reserved = 0
+        self.units_reserved: dict[int, int] = {}
+        self.standing: set[int] = set()
+
+
+class LocalExchange:
+    """
+    In-process Flex-E-Markets marketplace with price-time priority matching
+
+    One robot is attached and receives the Agent callbacks; flow from other traders is injected with
+    inject() / inject_cancel(). Orders sent by the robot reach the exchange after `latency` simulated
+    seconds, so callbacks are never re-entered. The wall time of every robot callback is recorded.
+
+    Usage:
+        install()
+        exchange = LocalExchange([Market(2681, "Public"), Market(2682, "Private", private_market=True)])
+        exchange.attach(bot, cash=100000, units={2681: 10, 2682: 10})
+        exchange.inject("T900", 2681, OrderSide.SELL, 500)
+        exchange.run()
+
+    Attributes:
+        timings (dict): callback name -> wall seconds for each call
+        events (int): number of exchange events processed
+    """
+
+    def __init__(self, markets: list[Market], latency: float = 0.0, marketplace_id: int = 0, name: str = "Local marketplace"):
+        self.markets = {market.fm_id: market for market in markets}
+        self.latency = latency
+        self.marketplace_id = marketplace_id
+        self.name = name
+        self.description = "In-process marketplace"
+        self.fm_id = marketplace_id
+
+        self.timings: dict[str, list[float]] = {}
+        self.events = 0
+
+        self._clock = 0.0
+        self._queue: list[tuple[float, int, Callable, tuple, bool]] = []
+        self._one_off = 0  # queued events that are not periodic tasks
+        self._seq = itertools.count()
+        self._fm_ids = itertools.count(1)
+        self._session = Session(1, SessionState.OPEN)
+        self._started = False
+
+        self._traders: dict[str, _Trader] = {}
+        self._resting: dict[int, Order] = {}
+        self._books: dict[int, dict[OrderSide, list[tuple[int, int]]]] = {
+            fm_id: {OrderSide.BUY: [], OrderSide.SELL: []} for fm_id in self.markets
+        }
+
+        self._agent: Agent | None = None
+        self._agent_id: str | None = None
+        self._delta: dict[int, Order] = {}
+        self._holdings_changed = False
+
+        Order._current = {}
+
+    # ----- setup -----
+
+    def add_trader(self, trader_id: str, cash: int = 0, units: dict[int, int] | None = None, unlimited: bool = False) -> None:
+        self._traders[trader_id] = _Trader(trader_id, cash, dict(units or {}), unlimited)
+
+    def attach(self, agent: Agent, trader_id: str = "T001", cash: int = 0, units: dict[int, int] | None = None) -> None:
+        self.add_trader(trader_id, cash, units)
+        self._agent = agent
+        self._agent_id = trader_id
+        agent._exchange = self
+        agent.marketplace = self
+        agent.markets = dict(self.markets)
+
+    def start(self) -> None:
+        """
+        Connect the attached robot: initialised, pre_start_tasks, then session, holdings and current orders
+        """
+        if self._started:
+            return
+        self._started = True
+        self._call("initialised")
+        self._call("pre_start_tasks")
+        self._call("received_session_info", self._session)
+        self._call("received_holdings", self._holdings())
+        self._call("received_orders", [copy.copy(order) for order in Order._current.values()])
+
+    def set_session(self, state: SessionState) -> None:
+        self._session = Session(self._session.fm_id + (1 if state is SessionState.OPEN else 0), state)
+        if self._started:
+            self._call("received_session_info", self._session)
+
+    # ----- clock and event loop -----
+
+    @property
+    def now(self) -> float:
+        return self._clock
+
+    def _schedule(self, delay: float, fn: Callable, args: tuple = (), one_off: bool = True) -> None:
+        if one_off:
+            self._one_off += 1
+        heapq.heappush(self._queue, (self._clock + delay, next(self._seq), fn, args, one_off))
+
+    def schedule_periodic(self, func: Callable[[], None], sleep_time: float, condition: Callable[[], bool] | None) -> None:
+        def tick():
+            if condition is None or condition():
+                self._timed(getattr(func, "__name__", "periodic"), func)
+            self._schedule(sleep_time, tick, one_off=False)
+
+        self._schedule(sleep_time, tick, one_off=False)
+
+    def run(self, until: float | None = None) -> None:
+        """
+        Process events up to simulated time `until`, or until only periodic tasks remain
+        """
+        self.start()
+        while self._queue:
+            if until is None and self._one_off == 0:
+                break
+            if until is not None and self._queue[0][0] > until:
+                break
+            when, _, fn, args, one_off = heapq.heappop(self._queue)
+            if one_off:
+                self._one_off -= 1
+            self._clock = max(self._clock, when)
+            fn(*args)
+        if until is not None:
+            self._clock = max(self._clock, until)
+
+    # ----- robot callbacks -----
+
+    def _timed(self, name: str, fn: Callable, *args) -> None:
+        start = time.perf_counter()
+        fn(*args)
+        self.timings.setdefault(name, []).append(time.perf_counter() - start)
+
+    def _call(self, name: str, *args) -> None:
+        if self._agent is not None:
+            self._timed(name, getattr(self._agent, name), *args)
+
+    def _visible(self, order: Order) -> bool:
+        if not order.market.private_market:
+            return True
+        return self._agent_id in (order.owner, order.owner_or_target)
+
+    def _touch(self, order: Order) -> None:
+        # record an order change for the next received_orders delta
+        if self._agent is None or not self._visible(order):
+            return
+        if order.fm_id in self._resting:
+            Order._current[order.fm_id] = order
+        else:
+            Order._current.pop(order.fm_id, None)
+        self._delta[order.fm_id] = copy.copy(order)
+
+    def _flush(self) -> None:
+        if not self._started:
+            # the robot gets everything so far from Order.current() when it starts
+            self._delta = {}
+            self._holdings_changed = False
+            return
+        if self._delta:
+            delta = list(self._delta.values())
+            self._delta = {}
+            self._call("received_orders", delta)
+        if self._holdings_changed:
+            self._holdings_changed = False
+            self._call("received_holdings", self._holdings())
+
+    def _holdings(self) -> Holding:
+        trader = self._traders.get(self._agent_id)
+        if trader is None:
+            return Holding(0, 0, {})
+        assets = {
+            market: Asset(trader.units.get(fm_id, 0), trader.units.get(fm_id, 0) - trader.units_reserved.get(fm_id, 0))
+            for fm_id, market in self.markets.items()
+        }
+        return Holding(trader.cash, trader.cash - trader.cash_reserved, assets)
+
+    # ----- order entry -----
+
+    def submit(self, order: Order) -> None:
+        """
+        Order sent by the attached robot, processed after `latency` seconds
+        """
+        self._schedule(self.latency, self._process, (copy.copy(order), self._agent_id))
+
+    def inject(self, trader_id: str, market_id: int, side: OrderSide, price: int, units: int = 1, owner_or_target: str | None = None, ref: str | None = None) -> int | None:
+        """
+        Order from another trader, processed immediately. Returns the fm_id if it was accepted.
+        """
+        order = Order(self.markets[market_id])
+        order.order_side = side
+        order.price = price
+        order.units = units
+        order.owner_or_target = owner_or_target
+        order.ref = ref
+        return self._process(order, trader_id)
+
+    def inject_cancel(self, fm_id: int) -> None:
+        resting = self._resting.get(fm_id)
+        if resting is not None:
+            cancel_order = copy.copy(resting)
+            cancel_order.order_type = OrderType.CANCEL
+            self._process(cancel_order, resting.owner)
+
+    def _process(self, order: Order, trader_id: str) -> int | None:
+        self.events += 1
+        from_agent = trader_id == self._agent_id
+
+        reason = self._validate(order, trader_id)
+        if reason is not None:
+            if from_agent:
+                self._call("order_rejected", {"error": reason}, order)
+                self._flush()
+            return None
+
+        if order.order_type is OrderType.CANCEL:
+            self._cancel(order)
+        else:
+            self._match(order, trader_id)
+
+        if from_agent:
+            self._call("order_accepted", order)
+        self._flush()
+        return order.fm_id
+
+    def _validate(self, order: Order, trader_id: str) -> str | None:
+        if not self._session.is_open:
+            return "Marketplace is not open"
+        trader = self._traders.get(trader_id)
+        if trader is None:
+            return f"Unknown trader {trader_id}"
+
+        if order.order_type is OrderType.CANCEL:
+            resting = self._resting.get(order.fm_id)
+            if resting is None or resting.owner != trader_id:
+                return f"No standing order {order.fm_id} to cancel"
+            return None
+
+        market = self.markets.get(order.market.fm_id if order.market is not None else None)
+        if market is None:
+            return "Unknown market"
+        if order.units < 1:
+            return "Units must be positive"
+        if not market.min_price <= order.price <= market.max_price or order.price % market.price_tick:
+            return f"Invalid price {order.price}"
+        if market.private_market and order.owner_or_target is None:
+            return "Private market order needs owner_or_target"
+        for fm_id in trader.standing:
+            resting = self._resting[fm_id]
+            if resting.market is market and resting.order_side is not order.order_side:
+                if (resting.price <= order.price) if order.order_side is OrderSide.BUY else (resting.price >= order.price):
+                    return "Order would cross my own standing order"
+        if trader.unlimited:
+            return None
+        if order.order_side is OrderSide.BUY and trader.cash - trader.cash_reserved < order.price * order.units:
+            return "Insufficient cash"
+        if order.order_side is OrderSide.SELL and trader.units.get(market.fm_id, 0) - trader.units_reserved.get(market.fm_id, 0) < order.units:
+            return "Insufficient units"
+        return None
+
+    def _cancel(self, order: Order) -> None:
+        resting = self._resting.pop(order.fm_id)
+        self._traders[resting.owner].standing.discard(resting.fm_id)
+        resting.is_cancelled = True
+        self._release(resting, resting.units)
+        order.is_cancelled = True
+        self._touch(resting)
+
+    def _reserve(self, order: Order, units: int) -> None:
+        trader = self._traders[order.owner]
+        if order.order_side is OrderSide.BUY:
+            trader.cash_reserved += order.price * units
+        else:
+            trader.units_reserved[order.market.fm_id] = trader.units_reserved.get(order.market.fm_id, 0) + units
+        if order.owner == self._agent_id:
+            self._holdings_changed = True
+
+    def _release(self, order: Order, units: int) -> None:
+        trader = self._traders[order.owner]
+        if order.order_side is OrderSide.BUY:
+            trader.cash_reserved -= order.price * units
+        else:
+            trader.units_reserved[order.market.fm_id] -= units
+        if order.owner == self._agent_id:
+            self._holdings_changed = True
+
+    def _settle(self, buyer_id: str, seller_id: str, market_id: int, price: int, units: int) -> None:
+        buyer = self._traders[buyer_id]
+        seller = self._traders[seller_id]
+        buyer.cash -= price * units
+        buyer.units[market_id] = buyer.units.get(market_id, 0) + units
+        seller.cash += price * units
+        seller.units[market_id] = seller.units.get(market_id, 0) - units
+        if self._agent_id in (buyer_id, seller_id):
+            self._holdings_changed = True
+
+    def _can_trade(self, incoming: Order, trader_id: str, resting: Order) -> bool:
+        if incoming.market.private_market:
+            # private orders only trade between the owner and its target
+            return resting.owner == incoming.owner_or_target and resting.owner_or_target == trader_id
+        return True
+
+    def _match(self, order: Order, trader_id: str) -> None:
+        market_id = order.market.fm_id
+        order.fm_id = next(self._fm_ids)
+        order.owner = trader_id
+        order.mine = trader_id == self._agent_id
+
+        book = self._books[market_id]
+        opposite = book[OrderSide.SELL if order.order_side is OrderSide.BUY else OrderSide.BUY]
+        skipped = []
+        remaining = order.units
+
+        while remaining and opposite:
+            key, fm_id = opposite[0]
+            resting = self._resting.get(fm_id)
+            if resting is None or resting.units == 0:
+                heapq.heappop(opposite)
+                continue
+            crosses = resting.price <= order.price if order.order_side is OrderSide.BUY else resting.price >= order.price
+            if not crosses:
+                break
+            if not self._can_trade(order, trader_id, resting):
+                skipped.append(heapq.heappop(opposite))
+                continue
+
+            units = min(remaining, resting.units)
+            remaining -= units
+            self._release(resting, units)
+            if order.order_side is OrderSide.BUY:
+                self._settle(trader_id, resting.owner, market_id, resting.price, units)
+            else:
+                self._settle(resting.owner, trader_id, market_id, resting.price, units)
+
+            resting.units -= units
+            if resting.units == 0:
+                heapq.heappop(opposite)
+                del self._resting[fm_id]
+                self._traders[resting.owner].standing.discard(fm_id)
+                resting.units = units
+                resting.has_traded = True
+            self._touch(resting)
+
+        for entry in skipped:
+            heapq.heappush(opposite, entry)
+
+        filled = order.units - remaining
+        if filled:
+            order.units = filled
+            order.has_traded = True
+            self._touch(order)
+
+        if remaining:
+            standing = order if not filled else copy.copy(order)
+            if filled:
+                standing.fm_id = next(self._fm_ids)
+                standing.has_traded = False
+            standing.units = remaining
+            self._resting[standing.fm_id] = standing
+            self._traders[trader_id].standing.add(standing.fm_id)
+            self._reserve(standing, remaining)
+            key = -standing.price if standing.order_side is OrderSide.BUY else standing.price
+            heapq.heappush(book[standing.order_side], (key, standing.fm_id))
+            self._touch(standing)
+
+    # ----- reporting -----
+
+    def latency_report(self) -> dict[str, dict[str, float]]:
+        """
+        Per-callback count, mean, p50 and p99 wall time in microseconds
+        """
+        report = {}
+        for name, samples in self.timings.items():
+            ordered = sorted(samples)
+            count = len(ordered)
+            report[name] = {
+                "count": count,
+                "mean_us": sum(ordered) / count * 1e6,
+                "p50_us": ordered[count // 2] * 1e6,
+                "p99_us": ordered[min(count - 1, int(count * 0.99))] * 1e6,
+            }
+        return report
+
+
+# Synthetic order flow
+
+class RandomFlow:
+    """
+    Random public market flow around a drifting mid price, plus a private signal from nature
+    that is re-posted every `signal_every` events.
+    """
+
+    def __init__(self, exchange: LocalExchange, public_market_id: int, private_market_id: int, target: str, nature_id: str = "M000", mid: int = 500, traders: int = 20, signal_units: int = 1, seed: int = 0):
+        self.exchange = exchange
+        self.public_market_id = public_market_id
+        self.private_market_id = private_market_id
+        self.target = target
+        self.nature_id = nature_id
+        self.mid = mid
+        self.signal_units = signal_units
+        self._random = random.Random(seed)
+        self._standing: list[int] = []
+        self._signal: int | None = None
+        self._traders = [f"T9{i:02d}" for i in range(traders)]
+
+        for trader_id in self._traders:
+            exchange.add_trader(trader_id, unlimited=True)
+        exchange.add_trader(nature_id, unlimited=True)
+
+    def step(self) -> None:
+        rnd = self._random
+        self.mid = max(50, self.mid + rnd.choice((-1, 0, 1)))
+        if self._standing and rnd.random() < 0.4:
+            self.exchange.inject_cancel(self._standing.pop(rnd.randrange(len(self._standing))))
+        else:
+            side = rnd.choice((OrderSide.BUY, OrderSide.SELL))
+            offset = rnd.randint(1, 30)
+            price = self.mid - offset if side is OrderSide.BUY else self.mid + offset
+            fm_id = self.exchange.inject(rnd.choice(self._traders), self.public_market_id, side, price)
+            if fm_id is not None and fm_id in self.exchange._resting:
+                self._standing.append(fm_id)
+
+    def post_signal(self) -> None:
+        rnd = self._random
+        if self._signal is not None:
+            self.exchange.inject_cancel(self._signal)
+        side = rnd.choice((OrderSide.BUY, OrderSide.SELL))
+        price = self.mid + rnd.randint(-40, 40)
+        self._signal = self.exchange.inject(self.nature_id, self.private_market_id, side, price, units=self.signal_units, owner_or_target=self.target)
+
+    def run(self, events: int, signal_every: int = 50, spacing: float = 0.001) -> None:
+        for i in range(events):
+            if i % signal_every == 0:
+                self.post_signal()
+            self.step()
+            self.exchange.run(until=self.exchange.now + spacing)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Drive IDSBot against the local exchange and report callback latency and P&L")
+    parser.add_argument("--events", type=int, default=20000)
+    parser.add_argument("--latency", type=float, default=0.0005, help="simulated exchange latency in seconds")
+    parser.add_argument("--signal-units", type=int, default=1, help="units of each private signal")
+    parser.add_argument("--bot-type", choices=("ACTIVE", "REACTIVE"), default="REACTIVE")
+    parser.add_argument("--execution-mode", choices=("SINGLE", "MULTI_LEG"), default="SINGLE")
+    parser.add_argument("--pipelined", action="store_true", help="send both legs back-to-back (MULTI_LEG only)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args()
+
+    install()
+    import Project_Task_1_Robot as robot
+
+    logging.getLogger("agent").setLevel(logging.WARNING)
+
+    exchange = LocalExchange(
+        [Market(robot.PUBLIC_MARKET_ID, "Public"), Market(robot.PRIVATE_MARKET_ID, "Private", private_market=True)],
+        latency=args.latency,
+    )
+    bot = robot.IDSBot(
+        robot.FM_ACCOUNT, robot.FM_EMAIL, robot.FM_PASSWORD, robot.FM_MARKETPLACE_ID, bot_type=robot.BotType[args.bot_type],
+        execution_mode=robot.ExecutionMode[args.execution_mode], pipelined=args.pipelined,
+    )
+    # throttle quotes and orders on simulated time, the wall clock barely moves during a run
+    bot._gateway._clock = lambda: exchange.now
+    if bot._maker is not None:
+        bot._maker._clock = lambda: exchange.now
+    start_units = {robot.PUBLIC_MARKET_ID: 100, robot.PRIVATE_MARKET_ID: 100}
+    exchange.attach(bot, cash=10_000_000, units=start_units)
+    exchange.start()
+
+    flow = RandomFlow(exchange, robot.PUBLIC_MARKET_ID, robot.PRIVATE_MARKET_ID, target="T001", nature_id=robot.NATURE_TRADER_ID,
+                      signal_units=args.signal_units, seed=args.seed)
+    started = time.perf_counter()
+    flow.run(args.events)
+    exchange.run()
+    elapsed = time.perf_counter() - started
+
+    print(f"{exchange.events} exchange events in {elapsed:.2f}s ({exchange.events / elapsed:,.0f} events/s)")
+    for name, stats in exchange.latency_report().items():
+        print(f"{name:<24} n={stats['count']:>8}  mean={stats['mean_us']:8.1f}us  p50={stats['p50_us']:8.1f}us  p99={stats['p99_us']:8.1f}us")
+
+    # inventory left over is marked at the final mid price
+    trader = exchange._traders["T001"]
+    inventory = sum(trader.units.get(fm_id, 0) - units for fm_id, units in start_units.items())
+    print(f"cash change {trader.cash - 10_000_000}, inventory change {inventory}, P&L at mid {trader.cash - 10_000_000 + inventory * flow.mid}")
@@ -0,0 +1,101 @@
+from collections import Counter, deque
+
+
+# public order answers the rates are measured over, and answers between two margin decisions
+MARGIN_WINDOW = 20
+MARGIN_COOLDOWN = 10
+
+# the margin widens when fewer public orders fill straight away than TARGET_FILL_RATE - FILL_RATE_BAND,
+# narrows when more than TARGET_FILL_RATE + FILL_RATE_BAND do; the band is the hysteresis
+TARGET_FILL_RATE = 0.8
+FILL_RATE_BAND = 0.1
+MAX_REJECT_RATE = 0.1
+
+# round trip EWMA in seconds above which the margin widens, below which it may narrow
+LATENCY_HIGH_SECONDS = 0.5
+LATENCY_LOW_SECONDS = 0.25
+LATENCY_SMOOTHING = 0.2
+
+
+class MarginController:
+    """
+    Online PROFIT_MARGIN: asks for more margin when public orders stop filling straight away, get rejected
+    or come back slowly, and less when they fill reliably and quickly
+
+    answered() takes every public order answer: whether it traded on arrival, whether it was rejected
+    and its round trip. Fills and rejects are counted per block of `cooldown` answers, the round trip
+    goes into an EWMA. The rates are only recomputed when a block completes, over the last `window`
+    answers (rounded to whole blocks), and the margin then moves one step at most within
+    [min_margin, max_margin], only when a rate leaves its band, so it does not flap around a threshold.
+    Disabled, margin stays at base.
+
+    Attributes:
+        margin (int): Margin a public order has to clear now
+        fill_rate, reject_rate (float | None): Share of the last `window` answers that traded on arrival /
+            were rejected, None until the first block completes
+        latency (float | None): EWMA of the public round trip in seconds
+        counters (Counter): "answered", "widened" and "narrowed" counts
+    """
+
+    def __init__(self, base: int, min_margin: int, max_margin: int, step: int = 1, window: int = MARGIN_WINDOW,
+                 cooldown: int = MARGIN_COOLDOWN, enabled: bool = True):
+        self.margin = base
+        self._min_margin = min_margin
+        self._max_margin = max_margin
+        self._step = step
+        self._cooldown = cooldown
+        self._enabled = enabled
+
+        # answers, fills and rejects of the block being counted, and of the last completed blocks
+        self._answers = self._fills = self._rejects = 0
+        self._blocks: deque[tuple[int, int, int]] = deque(maxlen=max(1, round(window / cooldown)))
+
+        self.fill_rate: float | None = None
+        self.reject_rate: float | None = None
+        self.latency: float | None = None
+        self.counters = Counter()
+
+    def answered(self, traded: bool, rejected: bool = False, round_trip_ns: int | None = None) -> None:
+        self._answers += 1
+        if traded:
+            self._fills += 1
+        elif rejected:
+            self._rejects += 1
+        if round_trip_ns is not None:
+            seconds = round_trip_ns / 1e9
+            self.latency = seconds if self.latency is None else self.latency + LATENCY_SMOOTHING * (seconds - self.latency)
+        if self._answers >= self._cooldown:
+            self._complete_block()
+
+    def _complete_block(self) -> None:
+        self.counters["answered"] += self._answers
+        self._blocks.append((self._answers, self._fills, self._rejects))
+        self._answers = self._fills = self._rejects = 0
+        answers = sum(block[0] for block in self._blocks)
+        self.fill_rate = sum(block[1] for block in self._blocks) / answers
+        self.reject_rate = sum(block[2] for block in self._blocks) / answers
+        if self._enabled and len(self._blocks) == self._blocks.maxlen:
+            self._adjust()
+
+    def _adjust(self) -> None:
+        slow = self.latency is not None and self.latency > LATENCY_HIGH_SECONDS
+        fast = self.latency is None or self.latency < LATENCY_LOW_SECONDS
+
+        if (self.fill_rate < TARGET_FILL_RATE - FILL_RATE_BAND or self.reject_rate > MAX_REJECT_RATE or slow) \
+                and self.margin < self._max_margin:
+            self.margin = min(self._max_margin, self.margin + self._step)
+            self.counters["widened"] += 1
+        elif self.fill_rate > TARGET_FILL_RATE + FILL_RATE_BAND and self.reject_rate <= MAX_REJECT_RATE / 2 and fast \
+                and self.margin > self._min_margin:
+            self.margin = max(self._min_margin, self.margin - self._step)
+            self.counters["narrowed"] += 1
+
+    def snapshot(self) -> dict:
+        return {
+            "margin": self.margin,
+            "fill_rate": self.fill_rate,
+            "reject_rate": self.reject_rate,
+            "latency": self.latency,
+            **self.counters,
+            "answered": self.counters["answered"] + self._answers,
+        }
@@ -0,0 +1,198 @@
+import time
+from collections import Counter
+from typing import Callable
+
+from fmclient import Order, OrderSide, OrderType
+
+
+class MarketMaker:
+    """
+    ACTIVE execution: keeps one quote resting in the public market and hedges its fills privately
+
+    update() is given the quote the strategy wants. The resting quote is kept while it stays inside
+    the band [target - band, target] on its own side (still profitable, not too far from the target);
+    only when the band moves is it replaced: the cancel and the new quote go out back to back, and
+    no other quote is sent until both are answered. If the new quote cannot be sent, the old one is
+    only cancelled. A quote at the same price that only hedges elsewhere is kept, hedging at the new price.
+    New quotes and cancels are throttled to one per min_interval seconds, hedges never are.
+    Fills, whole or partial, are hedged at the private price the quote was built from. A quote that
+    partly fills on arrival rests on under a new fm_id with the same ref; it becomes the quote once it
+    shows up in received_orders, and nothing else is quoted until then. Fills followed
+    while hedging is held back (on_orders(..., hedge=False), e.g. the session is closed) are hedged
+    by the next update().
+
+    Attributes:
+        counters (Counter): "quoted", "cancelled", "kept", "throttled", "filled" and "hedged" counts
+    """
+
+    def __init__(self, place_public: Callable[[OrderSide, int, int], str | None],
+                 place_private: Callable[[OrderSide, int, int], str | None], cancel: Callable[[Order], None],
+                 replace: Callable[[Order, OrderSide, int, int], str | None], band: int, min_interval: float,
+                 clock: Callable[[], float] = time.monotonic):
+        self._place_public = place_public
+        self._place_private = place_private
+        self._cancel = cancel
+        self._replace = replace
+        self._band = band
+        self._min_interval = min_interval
+        self._clock = clock
+        self._last_action = None
+
+        self._quote: Order | None = None  # my resting public quote
+        self._quote_units = 0  # units of it not filled yet
+        self._pending_ref: str | None = None  # quote sent, not answered yet
+        self._pending_units = 0  # and its units
+        self._remainder: Order | None = None  # quote that partly filled on arrival, until its rest is seen standing
+        self._cancelling = False
+        self._hedge_price: int | None = None  # private price the current quote hedges at
+        self._pending_hedge_price: int | None = None  # and the quote sent, once it is accepted
+        self._unhedged: list[tuple[OrderSide, int, int]] = []  # hedges held back: side, private price, units
+        self.counters = Counter()
+
+    @property
+    def busy(self) -> bool:
+        return self._pending_ref is not None or self._cancelling or self._remainder is not None
+
+    def _in_band(self, side: OrderSide, price: int) -> bool:
+        quoted = self._quote.price
+        if self._quote.order_side is not side:
+            return False
+        if side is OrderSide.BUY:
+            return price - self._band <= quoted <= price
+        return price <= quoted <= price + self._band
+
+    def _throttled(self) -> bool:
+        now = self._clock()
+        if self._last_action is not None and now - self._last_action < self._min_interval:
+            self.counters["throttled"] += 1
+            return True
+        self._last_action = now
+        return False
+
+    def update(self, side: OrderSide | None, price: int | None, hedge_price: int | None, units: int) -> None:
+        """
+        Move towards quoting `units` on `side` at `price` in the public market, hedged at `hedge_price`.
+        No side or no units means no quote should rest.
+        """
+        if self._unhedged:
+            self._hedge()
+        if self.busy:
+            return
+        wanted = side is not None and units > 0
+
+        if self._quote is not None:
+            if wanted and self._in_band(side, price) and hedge_price == self._hedge_price:
+                self.counters["kept"] += 1
+                return
+            if wanted and side is self._quote.order_side and price == self._quote.price:
+                # replacing it by the same order would send nothing
+                self._hedge_price = hedge_price
+                self.counters["kept"] += 1
+                return
+            if self._throttled():
+                return
+            self._cancelling = True
+            self.counters["cancelled"] += 1
+            ref = self._replace(self._quote, side, price, units) if wanted else None
+            if ref is None:
+                self._cancel(self._quote)
+            else:
+                self._quoted(ref, hedge_price, units)
+            return
+
+        if not wanted or self._throttled():
+            return
+        ref = self._place_public(side, price, units)
+        if ref is not None:
+            self._quoted(ref, hedge_price, units)
+
+    def _quoted(self, ref: str, hedge_price: int, units: int) -> None:
+        self._pending_ref = ref
+        self._pending_hedge_price = hedge_price
+        self._pending_units = units
+        self.counters["quoted"] += 1
+
+    def _filled(self, side: OrderSide, units: int, hedge: bool = True) -> None:
+        self.counters["filled"] += units
+        hedge_side = OrderSide.SELL if side is OrderSide.BUY else OrderSide.BUY
+        self._unhedged.append((hedge_side, self._hedge_price, units))
+        if hedge:
+            self._hedge()
+
+    def _hedge(self) -> None:
+        unhedged, self._unhedged = self._unhedged, []
+        for side, price, units in unhedged:
+            if self._place_private(side, price, units) is not None:
+                self.counters["hedged"] += units
+
+    def on_orders(self, orders: list[Order], hedge: bool = True) -> None:
+        """
+        Follow fills and cancels of my quote in the deltas passed to received_orders; with hedge False
+        the fills are only recorded and hedged by the next update()
+        """
+        if self._remainder is not None:
+            self._follow_remainder(orders)
+        if self._quote is None:
+            return
+        for order in orders:
+            if order.fm_id != self._quote.fm_id or order.order_type is OrderType.CANCEL:
+                continue
+            if order.has_traded:
+                self._filled(order.order_side, min(order.units, self._quote_units), hedge)
+                self._quote = None
+            elif order.is_cancelled:
+                self._quote = None
+            elif order.units < self._quote_units:
+                # partly traded, the rest keeps resting
+                self._filled(order.order_side, self._quote_units - order.units, hedge)
+                self._quote_units = order.units
+            if self._quote is None:
+                self._cancelling = False
+                return
+
+    def _follow_remainder(self, orders: list[Order]) -> None:
+        # the rest of a quote that partly filled on arrival: same ref, new fm_id
+        for order in orders:
+            if order.ref == self._remainder.ref and order.fm_id != self._remainder.fm_id and order.order_type is not OrderType.CANCEL:
+                self._quote = order
+                self._remainder = None
+                return
+
+    def accepted(self, order: Order) -> bool:
+        """
+        Handle the answer to one of my quotes or cancels; False if the order is not the engine's
+        """
+        if order.order_type is OrderType.CANCEL:
+            if self._quote is None or order.fm_id != self._quote.fm_id:
+                return False
+            self._quote = None
+            self._cancelling = False
+            return True
+
+        if order.ref is None or order.ref != self._pending_ref:
+            return False
+        self._pending_ref = None
+        self._hedge_price = self._pending_hedge_price
+        if order.has_traded:
+            # crossed straight away, hedge what traded; the rest, if any, keeps resting as the quote
+            self._filled(order.order_side, order.units)
+            if order.units < self._pending_units:
+                self._remainder = order
+                self._quote_units = self._pending_units - order.units
+        else:
+            self._quote = order
+            self._quote_units = order.units
+        return True
+
+    def rejected(self, order: Order) -> bool:
+        if order.order_type is OrderType.CANCEL:
+            if not self._cancelling or self._quote is None or order.fm_id != self._quote.fm_id:
+                return False
+            # the quote traded before the cancel arrived, the fill shows up in received_orders
+            self._cancelling = False
+            return True
+
+        if order.ref is None or order.ref != self._pending_ref:
+            return False
+        self._pending_ref = None
+        return True
@@ -0,0 +1,242 @@
+import heapq
+
+from fmclient import Order, OrderSide, OrderType
+
+
+# index of each side in the per-market (BUY, SELL) pairs; hashing an Enum member is a Python-level call
+_BUY = 0
+_SELL = 1
+
+
+class Quote:
+    """
+    Compact record of a standing order, used by strategy code instead of fmclient.Order
+
+    Attributes:
+        fm_id (int): Order id on the exchange
+        market_id (int): fm_id of the order's market
+        side (OrderSide): BUY or SELL
+        price (int): Price in cents
+        units (int): Units still standing
+        mine (bool): Whether the order is mine
+    """
+
+    __slots__ = ("fm_id", "market_id", "side", "price", "units", "mine")
+
+    def __init__(self, fm_id: int, market_id: int, side: OrderSide, price: int, units: int, mine: bool):
+        self.fm_id = fm_id
+        self.market_id = market_id
+        self.side = side
+        self.price = price
+        self.units = units
+        self.mine = mine
+
+    @classmethod
+    def from_order(cls, order: Order) -> "Quote":
+        # the one place an fmclient.Order is turned into a quote
+        return cls(order.fm_id, order.market.fm_id, order.order_side, order.price, order.units, order.mine)
+
+    def __repr__(self) -> str:
+        return f"Quote({self.side.name} {self.units}@{self.price} in {self.market_id}, fm_id={self.fm_id}{', mine' if self.mine else ''})"
+
+
+class OrderBook:
+    """
+    Incremental per-market order book built from the order deltas passed to received_orders
+
+    A robot reads best prices from here instead of scanning Order.current() on every update. It is
+    seeded once with rebuild(Order.current().values()) when the robot starts (and again when a new
+    session opens), after that only the deltas are applied.
+    Standing orders are kept as Quotes per (market fm_id, side) in a dict plus a heap of price keys.
+    Stale heap entries are dropped on every change, so the best price is always at the top and
+    best_bid / best_ask are O(1) lookups. My own orders are tracked separately and never
+    count towards the best price, matching the old Order.current() scans. Every change bumps
+    the version of its market, so periodic tasks can skip runs when nothing they read changed.
+
+    Attributes:
+        _quotes (dict): market fm_id -> ({order fm_id: Quote} of BUY, of SELL) standing orders not mine
+        _heaps (dict): market fm_id -> (BUY heap, SELL heap) of (price key, order fm_id)
+        _mine (dict): market fm_id -> {order fm_id: Quote} of my standing orders
+        _my_orders (dict): order fm_id -> fmclient.Order of my standing orders, needed to cancel them
+        _located (dict): order fm_id -> Quote of every standing order so removals need no scan
+        version (int): Number of changes to the book so far
+        _versions (dict): market fm_id -> version of the book at the last change in that market
+        _rebuilt (int): Version of the last rebuild, the version of markets unchanged since
+    """
+
+    _quotes: dict[int, tuple[dict[int, Quote], dict[int, Quote]]]
+    _heaps: dict[int, tuple[list[tuple[int, int]], list[tuple[int, int]]]]
+    _mine: dict[int, dict[int, Quote]]
+    _my_orders: dict[int, Order]
+    _located: dict[int, Quote]
+    version: int
+    _versions: dict[int, int]
+    _rebuilt: int
+
+    def __init__(self):
+        self._quotes = {}
+        self._heaps = {}
+        self._mine = {}
+        self._my_orders = {}
+        self._located = {}
+        self.version = 0
+        self._versions = {}
+        self._rebuilt = 0
+
+    @staticmethod
+    def is_standing(order: Order) -> bool:
+        # a LIMIT order that has not traded and is not cancelled is a standing order
+        return order.order_type is OrderType.LIMIT and not order.has_traded and not order.is_cancelled
+
+    def rebuild(self, orders) -> None:
+        """
+        Drop everything and load the book from a full set of orders, e.g. Order.current().values()
+        """
+        self._quotes.clear()
+        self._heaps.clear()
+        self._mine.clear()
+        self._my_orders.clear()
+        self._located.clear()
+        # every market may have changed
+        self.version += 1
+        self._rebuilt = self.version
+        self._versions.clear()
+        self.apply(orders)
+
+    def apply(self, orders: list[Order]) -> None:
+        """
+        Update the book from the delta list passed to received_orders.
+        New standing orders are added; cancels, fills and cancelled orders are removed.
+        """
+        for order in orders:
+            if order.fm_id is None:
+                continue
+            if order.order_type is OrderType.CANCEL:
+                self._remove(order.fm_id)
+            elif self.is_standing(order):
+                self._add(order)
+            else:
+                self._remove(order.fm_id)
+
+    def _add(self, order: Order) -> None:
+        if order.fm_id in self._located:
+            # replace the old version of this order (e.g. partially traded)
+            self._remove(order.fm_id)
+
+        quote = Quote.from_order(order)
+        self._located[quote.fm_id] = quote
+        self._touch(quote.market_id)
+        if quote.mine:
+            self._mine.setdefault(quote.market_id, {})[quote.fm_id] = quote
+            self._my_orders[quote.fm_id] = order
+            return
+
+        side = _BUY if quote.side is OrderSide.BUY else _SELL
+        sides = self._quotes.get(quote.market_id)
+        if sides is None:
+            sides = self._quotes[quote.market_id] = ({}, {})
+            self._heaps[quote.market_id] = ([], [])
+        sides[side][quote.fm_id] = quote
+        # ties on price go to the older (smaller) fm_id
+        heapq.heappush(self._heaps[quote.market_id][side], (self._key(quote), quote.fm_id))
+        self._clean_top(quote.market_id, side)
+
+    def _remove(self, fm_id: int) -> None:
+        quote = self._located.pop(fm_id, None)
+        if quote is None:
+            return
+        self._touch(quote.market_id)
+
+        if quote.mine:
+            self._mine[quote.market_id].pop(fm_id, None)
+            self._my_orders.pop(fm_id, None)
+            return
+
+        side = _BUY if quote.side is OrderSide.BUY else _SELL
+        self._quotes[quote.market_id][side].pop(fm_id, None)
+        self._clean_top(quote.market_id, side)
+
+    def _touch(self, market_id: int) -> None:
+        self.version += 1
+        self._versions[market_id] = self.version
+
+    def market_version(self, market_id: int) -> int:
+        """
+        Version of the book when the market last changed; equal values mean nothing changed in between
+        """
+        return self._versions.get(market_id, self._rebuilt)
+
+    @staticmethod
+    def _key(quote: Quote) -> int:
+        # buy side is a max heap on price, sell side a min heap
+        return -quote.price if quote.side is OrderSide.BUY else quote.price
+
+    def _is_live(self, quotes: dict[int, Quote], entry: tuple[int, int]) -> bool:
+        quote = quotes.get(entry[1])
+        return quote is not None and self._key(quote) == entry[0]
+
+    def _clean_top(self, market_id: int, side: int) -> None:
+        # discard stale heap entries so the top is always a live order
+        quotes = self._quotes[market_id][side]
+        heap = self._heaps[market_id][side]
+        while heap and not self._is_live(quotes, heap[0]):
+            heapq.heappop(heap)
+        # bound the garbage left deeper in the heap
+        if len(heap) > 2 * len(quotes) + 16:
+            heap[:] = [entry for entry in heap if self._is_live(quotes, entry)]
+            heapq.heapify(heap)
+
+    def best(self, market_id: int, side: OrderSide) -> Quote | None:
+        """
+        Return the best standing order not mine on the given side of a market
+        """
+        return self._best(market_id, _BUY if side is OrderSide.BUY else _SELL)
+
+    def _best(self, market_id: int, side: int) -> Quote | None:
+        heaps = self._heaps.get(market_id)
+        if heaps is None or not heaps[side]:
+            return None
+        return self._quotes[market_id][side][heaps[side][0][1]]
+
+    def best_bid(self, market_id: int) -> Quote | None:
+        return self._best(market_id, _BUY)
+
+    def best_ask(self, market_id: int) -> Quote | None:
+        return self._best(market_id, _SELL)
+
+    def depth(self, market_id: int, side: OrderSide, count: int) -> list[Quote]:
+        """
+        Return up to count standing orders not mine on one side of a market, best price first
+        """
+        heaps = self._heaps.get(market_id)
+        if heaps is None or count <= 0:
+            return []
+        index = _BUY if side is OrderSide.BUY else _SELL
+        quotes = self._quotes[market_id][index]
+        heap = heaps[index]
+
+        # the heap may hold stale entries, so widen the look until enough live orders are found
+        look = count
+        while True:
+            found = {}
+            for entry in heapq.nsmallest(look, heap):
+                if self._is_live(quotes, entry):
+                    found.setdefault(entry[1], quotes[entry[1]])
+            if len(found) >= count or look >= len(heap):
+                return list(found.values())[:count]
+            look *= 2
+
+    def my_orders(self, market_id: int) -> list[Quote]:
+        """
+        Return my standing orders in a market
+        """
+        return list(self._mine.get(market_id, {}).values())
+
+    def order_for(self, quote: Quote) -> Order | None:
+        """
+        The fmclient.Order behind one of my quotes, for sending a cancel
+        """
+        return self._my_orders.get(quote.fm_id)
+
+    def __len__(self) -> int:
+        return len(self._located)
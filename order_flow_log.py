@@ -0,0 +1,338 @@
+import json
+import struct
+import time
+
+import local_exchange
+from local_exchange import Asset, Holding, Market, Order, OrderSide, OrderType, Session, SessionState
+
+
+# Record kinds, one byte at the start of every record
+MARKETS = 0
+ORDERS = 1
+HOLDINGS = 2
+SESSION = 3
+ACCEPTED = 4
+REJECTED = 5
+
+MAGIC = b"FMFLOW1\n"
+
+# kind, seconds since recording started, number of items that follow
+_RECORD = struct.Struct("<BdI")
+# fm_id, market fm_id, order type, side, price, units, flags
+_ORDER = struct.Struct("<qiBBiiB")
+# cash, cash available
+_CASH = struct.Struct("<qq")
+# market fm_id, units, units available
+_ASSET = struct.Struct("<iii")
+# session fm_id, state
+_SESSION = struct.Struct("<iB")
+# market fm_id, private flag
+_MARKET = struct.Struct("<iB")
+_TEXT = struct.Struct("<H")
+
+_MINE = 1
+_TRADED = 2
+_CANCELLED = 4
+
+
+def _pack_text(value: str | None) -> bytes:
+    # 0xFFFF marks None, anything else is the utf-8 length
+    if value is None:
+        return _TEXT.pack(0xFFFF)
+    data = str(value).encode()
+    return _TEXT.pack(len(data)) + data
+
+
+def _pack_order(order) -> bytes:
+    flags = (_MINE if order.mine else 0) | (_TRADED if order.has_traded else 0) | (_CANCELLED if order.is_cancelled else 0)
+    return b"".join((
+        _ORDER.pack(
+            -1 if order.fm_id is None else order.fm_id,
+            order.market.fm_id,
+            order.order_type.value,
+            order.order_side.value,
+            order.price,
+            order.units,
+            flags,
+        ),
+        _pack_text(order.owner_or_target),
+        _pack_text(order.ref),
+    ))
+
+
+def _session_state(session) -> int:
+    if session.is_open:
+        return SessionState.OPEN.value
+    if session.is_paused:
+        return SessionState.PAUSED.value
+    return SessionState.CLOSED.value
+
+
+class FlowRecorder:
+    """
+    Append-only struct-packed log of everything a robot receives
+
+    attach() wraps the robot's callbacks on the instance, so any Agent subclass can be recorded without
+    changing its code. Records are buffered and written in blocks of `flush_every`.
+
+    Attributes:
+        records (int): Number of records written so far
+    """
+
+    def __init__(self, path: str, flush_every: int = 256):
+        self._file = open(path, "ab")
+        if self._file.tell() == 0:
+            self._file.write(MAGIC)
+        self._buffer: list[bytes] = []
+        self._flush_every = flush_every
+        self._started = time.monotonic()
+        self.records = 0
+
+    def _write(self, kind: int, count: int, payload: bytes) -> None:
+        self._buffer.append(_RECORD.pack(kind, time.monotonic() - self._started, count))
+        self._buffer.append(payload)
+        self.records += 1
+        if len(self._buffer) >= 2 * self._flush_every:
+            self.flush()
+
+    def record_markets(self, markets: dict) -> None:
+        payload = b"".join(_MARKET.pack(market.fm_id, 1 if market.private_market else 0) + _pack_text(market.name) for market in markets.values())
+        self._write(MARKETS, len(markets), payload)
+
+    def record_orders(self, orders: list) -> None:
+        self._write(ORDERS, len(orders), b"".join(_pack_order(order) for order in orders))
+
+    def record_holdings(self, holdings) -> None:
+        payload = _CASH.pack(holdings.cash, holdings.cash_available) + b"".join(
+            _ASSET.pack(market.fm_id, asset.units, asset.units_available) for market, asset in holdings.assets.items()
+        )
+        self._write(HOLDINGS, len(holdings.assets), payload)
+
+    def record_session(self, session) -> None:
+        self._write(SESSION, 1, _SESSION.pack(session.fm_id, _session_state(session)))
+
+    def record_accepted(self, order) -> None:
+        self._write(ACCEPTED, 1, _pack_order(order))
+
+    def record_rejected(self, info: dict, order) -> None:
+        self._write(REJECTED, 1, _pack_order(order) + _pack_text(json.dumps(info)))
+
+    def attach(self, agent) -> None:
+        """
+        Record every callback payload the agent receives before passing it on
+        """
+        initialised = agent.initialised
+        received_orders = agent.received_orders
+        received_holdings = agent.received_holdings
+        received_session_info = agent.received_session_info
+        order_accepted = agent.order_accepted
+        order_rejected = agent.order_rejected
+
+        def recorded_initialised():
+            self.record_markets(agent.markets)
+            initialised()
+
+        def recorded_orders(orders):
+            self.record_orders(orders)
+            received_orders(orders)
+
+        # the StrategyRuntime may pass the standing orders along, see snapshot_orders
+        def recorded_holdings(holdings, *args):
+            self.record_holdings(holdings)
+            received_holdings(holdings, *args)
+
+        def recorded_session_info(session, *args):
+            self.record_session(session)
+            received_session_info(session, *args)
+
+        def recorded_accepted(order):
+            self.record_accepted(order)
+            order_accepted(order)
+
+        def recorded_rejected(info, order):
+            self.record_rejected(info, order)
+            order_rejected(info, order)
+
+        agent.initialised = recorded_initialised
+        agent.received_orders = recorded_orders
+        agent.received_holdings = recorded_holdings
+        agent.received_session_info = recorded_session_info
+        agent.order_accepted = recorded_accepted
+        agent.order_rejected = recorded_rejected
+
+    def flush(self) -> None:
+        self._file.write(b"".join(self._buffer))
+        self._file.flush()
+        self._buffer = []
+
+    def close(self) -> None:
+        self.flush()
+        self._file.close()
+
+
+class _ReplaySink:
+    # stands in for the exchange while replaying: orders are collected, periodic tasks are not run
+    def __init__(self, sent: list):
+        self._sent = sent
+
+    def submit(self, order) -> None:
+        self._sent.append(order)
+
+    def schedule_periodic(self, func, sleep_time, condition) -> None:
+        pass
+
+
+class FlowReplayer:
+    """
+    Replays a FlowRecorder log into an Agent subclass built on the local_exchange stand-in
+
+    Replay runs as fast as possible by default, or at `speed` times wall-clock. Orders the robot sends
+    during replay are not executed, they are collected in `sent_orders` so a run can be compared with
+    what happened live.
+
+    Attributes:
+        sent_orders (list): Orders the robot sent during the last replay
+    """
+
+    def __init__(self, path: str):
+        with open(path, "rb") as log_file:
+            self._data = log_file.read()
+        if not self._data.startswith(MAGIC):
+            raise ValueError(f"{path} is not a flow log")
+        self._markets: dict[int, Market] = {}
+        self.sent_orders: list = []
+
+    def _text(self, offset: int) -> tuple[str | None, int]:
+        (length,) = _TEXT.unpack_from(self._data, offset)
+        offset += _TEXT.size
+        if length == 0xFFFF:
+            return None, offset
+        return self._data[offset:offset + length].decode(), offset + length
+
+    def _market(self, fm_id: int) -> Market:
+        market = self._markets.get(fm_id)
+        if market is None:
+            market = Market.get_by_id(fm_id) or Market(fm_id, str(fm_id))
+            self._markets[fm_id] = market
+        return market
+
+    def _order(self, offset: int) -> tuple[Order, int]:
+        fm_id, market_id, order_type, side, price, units, flags = _ORDER.unpack_from(self._data, offset)
+        order = Order(self._market(market_id))
+        order.fm_id = None if fm_id == -1 else fm_id
+        order.order_type = OrderType(order_type)
+        order.order_side = OrderSide(side)
+        order.price = price
+        order.units = units
+        order.mine = bool(flags & _MINE)
+        order.has_traded = bool(flags & _TRADED)
+        order.is_cancelled = bool(flags & _CANCELLED)
+        order.owner_or_target, offset = self._text(offset + _ORDER.size)
+        order.ref, offset = self._text(offset)
+        return order, offset
+
+    def records(self):
+        """
+        Yield (kind, timestamp, payload) for every record in the log
+        """
+        data = self._data
+        offset = len(MAGIC)
+        while offset < len(data):
+            kind, timestamp, count = _RECORD.unpack_from(data, offset)
+            offset += _RECORD.size
+
+            if kind == MARKETS:
+                for _ in range(count):
+                    fm_id, private = _MARKET.unpack_from(data, offset)
+                    name, offset = self._text(offset + _MARKET.size)
+                    self._markets[fm_id] = Market.get_by_id(fm_id) or Market(fm_id, name, private_market=bool(private))
+                payload = dict(self._markets)
+            elif kind == ORDERS:
+                payload = []
+                for _ in range(count):
+                    order, offset = self._order(offset)
+                    payload.append(order)
+            elif kind == HOLDINGS:
+                cash, cash_available = _CASH.unpack_from(data, offset)
+                offset += _CASH.size
+                assets = {}
+                for _ in range(count):
+                    market_id, units, units_available = _ASSET.unpack_from(data, offset)
+                    offset += _ASSET.size
+                    assets[self._market(market_id)] = Asset(units, units_available)
+                payload = Holding(cash, cash_available, assets)
+            elif kind == SESSION:
+                fm_id, state = _SESSION.unpack_from(data, offset)
+                offset += _SESSION.size
+                payload = Session(fm_id, SessionState(state))
+            elif kind == ACCEPTED:
+                payload, offset = self._order(offset)
+            elif kind == REJECTED:
+                order, offset = self._order(offset)
+                info, offset = self._text(offset)
+                payload = (json.loads(info), order)
+            else:
+                raise ValueError(f"Unknown record kind {kind} at offset {offset}")
+
+            yield kind, timestamp, payload
+
+    def replay(self, agent, speed: float | None = None) -> int:
+        """
+        Feed the log into the agent's callbacks. Returns the number of records replayed.
+        """
+        self.sent_orders = []
+        agent._exchange = _ReplaySink(self.sent_orders)
+        Order._current = {}
+
+        started = time.monotonic()
+        count = 0
+        for kind, timestamp, payload in self.records():
+            if speed is not None:
+                delay = timestamp / speed - (time.monotonic() - started)
+                if delay > 0:
+                    time.sleep(delay)
+
+            if kind == MARKETS:
+                agent.markets = payload
+                agent.initialised()
+                agent.pre_start_tasks()
+            elif kind == ORDERS:
+                # keep Order.current() in step with the log for robots that still read it
+                for order in payload:
+                    if order.order_type is OrderType.LIMIT and not order.has_traded and not order.is_cancelled:
+                        Order._current[order.fm_id] = order
+                    else:
+                        Order._current.pop(order.fm_id, None)
+                agent.received_orders(payload)
+            elif kind == HOLDINGS:
+                agent.received_holdings(payload)
+            elif kind == SESSION:
+                agent.received_session_info(payload)
+            elif kind == ACCEPTED:
+                agent.order_accepted(payload)
+            elif kind == REJECTED:
+                agent.order_rejected(*payload)
+            count += 1
+        return count
+
+
+if __name__ == "__main__":
+    import argparse
+    import logging
+
+    parser = argparse.ArgumentParser(description="Replay a flow log into IDSBot")
+    parser.add_argument("path")
+    parser.add_argument("--speed", type=float, default=None, help="replay at this multiple of wall-clock, default is as fast as possible")
+    args = parser.parse_args()
+
+    local_exchange.install()
+    import Project_Task_1_Robot as robot
+
+    logging.getLogger("agent").setLevel(logging.WARNING)
+
+    bot = robot.IDSBot(robot.FM_ACCOUNT, robot.FM_EMAIL, robot.FM_PASSWORD, robot.FM_MARKETPLACE_ID, bot_type=robot.MARKET_PERFORMANCE_BOT_TYPE)
+    replayer = FlowReplayer(args.path)
+    started = time.perf_counter()
+    count = replayer.replay(bot, speed=args.speed)
+    elapsed = time.perf_counter() - started
+    print(f"Replayed {count} records in {elapsed:.2f}s, robot sent {len(replayer.sent_orders)} orders")
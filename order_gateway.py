@@ -0,0 +1,151 @@
+import copy
+import time
+from collections import Counter, deque
+from enum import Enum
+from typing import Callable
+
+from fmclient import Order, OrderType
+
+
+# Enum for the send priority of an order, lower goes first
+class Priority(Enum):
+    HEDGE = 0  # closes risk already taken, e.g. the private leg after a public trade
+    CANCEL = 1
+    NORMAL = 2
+
+
+# token bucket defaults: sustained orders per second and the burst allowed on top
+ORDER_RATE_PER_SECOND = 100.0
+ORDER_BURST = 50
+
+
+class OrderGateway:
+    """
+    The one way out for a robot's orders: de-duplicates cancels, merges cancel+new into replaces and rate limits
+
+    Every order goes through submit(), cancel() or replace(). Orders are sent at once while the token bucket
+    has tokens, otherwise they queue by priority (hedges first, then cancels, then new orders) until
+    flush() finds tokens again; the owner calls flush() periodically.
+        - a cancel for an fm_id that is already queued or waiting for its answer is dropped
+        - replace() sends a cancel and its new order back to back; replacing with an identical
+          order sends nothing, and a burst of replaces of one order sends only the last one. The order
+          left unsent is returned, so the owner can undo what it did for it (see same_order())
+        - purge() drops the new orders still queued, e.g. when the session closes, so they do not
+          go out into the next session
+
+    Attributes:
+        counters (Counter): "submitted", "sent", "duplicate_cancel", "netted" and "purged" counts
+    """
+
+    def __init__(self, send: Callable[[Order], None], rate: float = ORDER_RATE_PER_SECOND, burst: int = ORDER_BURST,
+                 clock: Callable[[], float] = time.monotonic):
+        self._send = send
+        self._rate = rate
+        self._burst = burst
+        self._clock = clock
+        self._tokens = float(burst)
+        self._refilled = clock()
+
+        self._queues: dict[Priority, deque[Order]] = {priority: deque() for priority in Priority}
+        self._queued_cancels: dict[int, Order] = {}  # fm_id -> queued cancel
+        self._cancels_in_flight: set[int] = set()  # fm_ids of cancels sent and not answered
+        self._replacements: dict[int, Order] = {}  # fm_id -> new order to send once its cancel is sent
+        self.counters = Counter()
+
+    def pending(self) -> int:
+        return sum(len(queue) for queue in self._queues.values())
+
+    def submit(self, order: Order, priority: Priority = Priority.NORMAL) -> None:
+        self._queues[priority].append(order)
+        self.counters["submitted"] += 1
+        self.flush()
+
+    def cancel(self, order: Order) -> None:
+        """
+        Cancel one of my standing orders, ignoring repeats while a cancel for it is outstanding
+        """
+        if order.fm_id in self._queued_cancels or order.fm_id in self._cancels_in_flight:
+            self.counters["duplicate_cancel"] += 1
+            return
+        cancel_order = copy.copy(order)
+        cancel_order.order_type = OrderType.CANCEL
+        self._queued_cancels[order.fm_id] = cancel_order
+        self.submit(cancel_order, Priority.CANCEL)
+
+    @staticmethod
+    def same_order(order: Order, new_order: Order) -> bool:
+        """
+        Whether replacing order by new_order would change nothing; check it before reserving anything for new_order
+        """
+        return (new_order.market is order.market and new_order.order_side is order.order_side
+                and new_order.price == order.price and new_order.units == order.units)
+
+    def replace(self, order: Order, new_order: Order) -> Order | None:
+        """
+        Cancel a standing order and send new_order straight after the cancel.
+        A replace by an identical order sends nothing; replacing again before the cancel went out
+        only swaps the queued new order. Returns the order that will never be sent, new_order or
+        the one it swapped out, or None; the owner should treat it as rejected.
+        """
+        if self.same_order(order, new_order):
+            self.counters["netted"] += 1
+            return new_order
+        if order.fm_id in self._replacements:
+            self.counters["netted"] += 1
+            swapped = self._replacements[order.fm_id]
+            self._replacements[order.fm_id] = new_order
+            return swapped
+        if order.fm_id in self._cancels_in_flight:
+            # already being cancelled, the new order does not have to wait for anything
+            self.submit(new_order)
+            return None
+        self._replacements[order.fm_id] = new_order
+        self.cancel(order)
+        return None
+
+    def purge(self) -> list[Order]:
+        """
+        Drop the new orders (and replacements) not sent yet and return them, so the owner can treat them
+        as rejected. Queued cancels stay, a stale order is still better cancelled.
+        """
+        purged = list(self._replacements.values())
+        self._replacements.clear()
+        for priority in (Priority.HEDGE, Priority.NORMAL):
+            purged.extend(self._queues[priority])
+            self._queues[priority].clear()
+        self.counters["purged"] += len(purged)
+        return purged
+
+    def answered(self, order: Order) -> None:
+        """
+        Pass every order_accepted / order_rejected order here so cancels can be sent again for that fm_id
+        """
+        if order.order_type is OrderType.CANCEL:
+            self._cancels_in_flight.discard(order.fm_id)
+
+    def _refill(self) -> None:
+        now = self._clock()
+        self._tokens = min(self._burst, self._tokens + max(0.0, now - self._refilled) * self._rate)
+        self._refilled = now
+
+    def flush(self) -> None:
+        """
+        Send queued orders, highest priority first, while tokens last
+        """
+        self._refill()
+        for priority in Priority:
+            queue = self._queues[priority]
+            while queue and self._tokens >= 1:
+                order = queue.popleft()
+                self._tokens -= 1
+                if order.order_type is OrderType.CANCEL:
+                    self._queued_cancels.pop(order.fm_id, None)
+                    self._cancels_in_flight.add(order.fm_id)
+                    replacement = self._replacements.pop(order.fm_id, None)
+                    if replacement is not None:
+                        # goes out right after the cancel if a token is left, else first of the new orders
+                        self._queues[Priority.NORMAL].appendleft(replacement)
+                self.counters["sent"] += 1
+                self._send(order)
+            if queue:
+                return
@@ -0,0 +1,105 @@
+from collections import Counter
+
+from fmclient import Holding, Order, OrderSide, OrderType, Session
+
+from holdings_ledger import HoldingsLedger
+from order_book import OrderBook
+
+
+# Reasons an order would be rejected by the exchange
+SESSION_CLOSED = "session_closed"
+UNKNOWN_MARKET = "unknown_market"
+INVALID_UNITS = "invalid_units"
+PRICE_OUT_OF_RANGE = "price_out_of_range"
+PRICE_OFF_TICK = "price_off_tick"
+MISSING_TARGET = "missing_owner_or_target"
+SELF_CROSS = "self_cross"
+INSUFFICIENT_CASH = "insufficient_cash"
+INSUFFICIENT_UNITS = "insufficient_units"
+
+
+class OrderValidator:
+    """
+    Checks an order locally before send_order, so orders the exchange would reject are never sent
+
+    Checks, cheapest first: session open, units, price range and tick from the Market, owner_or_target
+    in private markets, crossing one of my standing orders, then cash or units. Holdings come from
+    the HoldingsLedger when one is given, else from the last holdings passed to holdings().
+    Each check is a few attribute reads, so it can run on every order.
+
+    Attributes:
+        counters (Counter): "checked", "passed" and "avoided.<reason>" counts
+    """
+
+    def __init__(self, book: OrderBook | None = None, ledger: HoldingsLedger | None = None):
+        self._book = book
+        self._ledger = ledger
+        self._holdings: Holding | None = None
+        self._session: Session | None = None
+        self.counters = Counter()
+
+    def session(self, session: Session) -> None:
+        self._session = session
+
+    def holdings(self, holdings: Holding) -> None:
+        self._holdings = holdings
+
+    def check(self, order: Order) -> str | None:
+        """
+        Return the reason the order would be rejected, or None if it looks valid
+        """
+        self.counters["checked"] += 1
+        reason = self._reason(order)
+        self.counters["passed" if reason is None else f"avoided.{reason}"] += 1
+        return reason
+
+    def _reason(self, order: Order) -> str | None:
+        # until the first session update arrives the state is unknown, leave it to the exchange
+        if self._session is not None and not self._session.is_open:
+            return SESSION_CLOSED
+        market = order.market
+        if market is None:
+            return UNKNOWN_MARKET
+        if order.order_type is OrderType.CANCEL:
+            return None
+
+        if order.units is None or order.units < 1:
+            return INVALID_UNITS
+        # the stand-in and fmclient both describe valid prices on the Market
+        if order.price is None or not getattr(market, "min_price", order.price) <= order.price <= getattr(market, "max_price", order.price):
+            return PRICE_OUT_OF_RANGE
+        tick = getattr(market, "price_tick", 1) or 1
+        if order.price % tick:
+            return PRICE_OFF_TICK
+        if market.private_market and order.owner_or_target is None:
+            return MISSING_TARGET
+
+        if self._book is not None:
+            for mine in self._book.my_orders(market.fm_id):
+                if mine.side is not order.order_side and (
+                    mine.price <= order.price if order.order_side is OrderSide.BUY else mine.price >= order.price
+                ):
+                    return SELF_CROSS
+
+        if order.order_side is OrderSide.BUY:
+            cash = self._cash_available()
+            if cash is not None and cash < order.price * order.units:
+                return INSUFFICIENT_CASH
+        else:
+            units = self._units_available(market)
+            if units is not None and units < order.units:
+                return INSUFFICIENT_UNITS
+        return None
+
+    def _cash_available(self) -> int | None:
+        if self._ledger is not None and self._ledger.counters["reconciled"]:
+            return self._ledger.cash_available
+        return None if self._holdings is None else self._holdings.cash_available
+
+    def _units_available(self, market) -> int | None:
+        if self._ledger is not None and self._ledger.counters["reconciled"]:
+            return self._ledger.units_available(market.fm_id)
+        if self._holdings is None:
+            return None
+        asset = self._holdings.assets.get(market)
+        return 0 if asset is None else asset.units_available
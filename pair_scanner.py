@@ -0,0 +1,156 @@
+import re
+
+import numpy as np
+from fmclient import Market, Order, OrderSide
+
+from order_book import OrderBook
+
+
+# rows of the pair table, one column per pair; prices are float so a missing quote can be NaN
+SIGN, SIGNAL_PRICE, SIGNAL_UNITS, PUBLIC_PRICE, PUBLIC_UNITS = 0, 1, 2, 3, 4
+
+_PRIVATE_WORD = re.compile(r"\bprivate\b", re.IGNORECASE)
+
+
+def _base_name(name: str) -> str:
+    # "Widget (Private)" and "Widget" name the same item
+    return " ".join(re.sub(r"[^a-z0-9 ]", " ", _PRIVATE_WORD.sub("", name).lower()).split())
+
+
+def discover_pairs(markets: dict[int, Market]) -> list[tuple[int, int]]:
+    """
+    Pair every private market with a public market, as (public fm_id, private fm_id).
+    A public market whose name matches the private market's without "private" wins,
+    otherwise the public market with the nearest fm_id (marketplaces create them side by side).
+    """
+    public = [market for market in markets.values() if not market.private_market]
+    if not public:
+        return []
+    by_name = {_base_name(market.name): market for market in public}
+
+    pairs = []
+    for private in sorted((market for market in markets.values() if market.private_market), key=lambda market: market.fm_id):
+        match = by_name.get(_base_name(private.name))
+        if match is None:
+            match = min(public, key=lambda market: (abs(market.fm_id - private.fm_id), market.fm_id))
+        pairs.append((match.fm_id, private.fm_id))
+    return pairs
+
+
+class Opportunity:
+    """
+    One profitable public/private round trip found by a scan
+
+    Attributes:
+        public_market_id, private_market_id (int): The pair
+        public_side (OrderSide): Side of the public order to send, BUY under a private BUY signal
+        public_price (int): Price of the public quote to take
+        private_price (int): Price of the private signal
+        units (int): Units both sides can trade
+        margin (int): Profit per unit
+        profit (int): margin * units
+    """
+
+    __slots__ = ("public_market_id", "private_market_id", "public_side", "public_price", "private_price", "units",
+                 "margin", "profit")
+
+    def __init__(self, public_market_id: int, private_market_id: int, public_side: OrderSide, public_price: int,
+                 private_price: int, units: int, margin: int):
+        self.public_market_id = public_market_id
+        self.private_market_id = private_market_id
+        self.public_side = public_side
+        self.public_price = public_price
+        self.private_price = private_price
+        self.units = units
+        self.margin = margin
+        self.profit = margin * units
+
+    def __repr__(self) -> str:
+        return (f"Opportunity({self.public_market_id}/{self.private_market_id}: {self.public_side.name} "
+                f"{self.units}@{self.public_price} vs {self.private_price}, profit {self.profit})")
+
+
+class PairScanner:
+    """
+    Best quotes of every public/private market pair, scanned for arbitrage margins in one numpy pass
+
+    apply() takes the same order deltas as the OrderBook and refreshes only the pairs whose markets
+    changed, reading their best quotes from the book. scan() then works on whole rows of the table,
+    so the cost per event grows with the number of changed markets, not with the number of pairs.
+    The signal of a pair follows IDSBot: the best private BUY if there is one, else the best private SELL.
+
+    Attributes:
+        pairs (list[tuple[int, int]]): (public fm_id, private fm_id) of every pair, the column order of the table
+    """
+
+    def __init__(self, book: OrderBook, pairs: list[tuple[int, int]]):
+        self._book = book
+        self.pairs = list(pairs)
+        self._table = np.full((5, len(self.pairs)), np.nan)
+        # market fm_id -> columns of every pair the market is part of
+        self._columns: dict[int, list[int]] = {}
+        for column, (public_id, private_id) in enumerate(self.pairs):
+            self._columns.setdefault(public_id, []).append(column)
+            self._columns.setdefault(private_id, []).append(column)
+        self.refresh()
+
+    @classmethod
+    def for_markets(cls, book: OrderBook, markets: dict[int, Market]) -> "PairScanner":
+        return cls(book, discover_pairs(markets))
+
+    def refresh(self) -> None:
+        """
+        Re-read every pair from the book, e.g. after OrderBook.rebuild
+        """
+        self._update(self._columns)
+
+    def apply(self, orders: list[Order]) -> None:
+        """
+        Refresh the pairs touched by a received_orders delta; call after OrderBook.apply
+        """
+        self._update({order.market.fm_id for order in orders if order.market is not None})
+
+    def _update(self, market_ids) -> None:
+        # each column holds the signal and the public quote it would take, so scan() needs no selects
+        table = self._table
+        book = self._book
+        for market_id in market_ids:
+            for column in self._columns.get(market_id, ()):
+                public_id, private_id = self.pairs[column]
+                signal = book.best_bid(private_id)
+                if signal is not None:
+                    sign, quote = 1.0, book.best_ask(public_id)
+                else:
+                    signal = book.best_ask(private_id)
+                    sign, quote = -1.0, book.best_bid(public_id)
+                table[SIGN, column] = sign
+                table[SIGNAL_PRICE, column] = np.nan if signal is None else signal.price
+                table[SIGNAL_UNITS, column] = 0 if signal is None else signal.units
+                table[PUBLIC_PRICE, column] = np.nan if quote is None else quote.price
+                table[PUBLIC_UNITS, column] = 0 if quote is None else quote.units
+
+    def scan(self, min_margin: int) -> list[Opportunity]:
+        """
+        Every pair whose margin is at least min_margin, highest expected profit first
+        """
+        table = self._table
+        # a BUYER (sign +1) buys the public ask below the signal, a SELLER sells the public bid above it
+        margin = (table[SIGNAL_PRICE] - table[PUBLIC_PRICE]) * table[SIGN]
+        units = np.minimum(table[SIGNAL_UNITS], table[PUBLIC_UNITS])
+        # NaN margins (a missing quote) compare False
+        found = np.flatnonzero((margin >= min_margin) & (units > 0))
+        if not found.size:
+            return []
+        if found.size > 1:
+            found = found[np.argsort(-(margin[found] * units[found]), kind="stable")]
+
+        return [
+            Opportunity(self.pairs[column][0], self.pairs[column][1],
+                        OrderSide.BUY if table[SIGN, column] > 0 else OrderSide.SELL, int(table[PUBLIC_PRICE, column]),
+                        int(table[SIGNAL_PRICE, column]), int(units[column]), int(margin[column]))
+            for column in found.tolist()
+        ]
+
+    def best(self, min_margin: int) -> Opportunity | None:
+        opportunities = self.scan(min_margin)
+        return opportunities[0] if opportunities else None
@@ -1,10 +1,14 @@
 # The Imports
 
-import copy
 import logging
 
 from fmclient import Agent, Market, Holding, Session, Order, OrderType, OrderSide
 
+from order_book import OrderBook, Quote
+from order_gateway import OrderGateway
+from order_validation import OrderValidator
+from session_scheduler import SessionScheduler
+
 
 # Flex-E-Market credential
 
@@ -15,6 +19,9 @@ ROBOT_NAME = "My Periodic Robot"
 FM_MARKETPLACE_ID = 1516
 MARKET_ID_ASSET_A = 2686
 
+# run callbacks and periodic tasks on one strategy thread, with queued bursts coalesced
+USE_STRATEGY_RUNTIME = False
+
 
 # The Base Robot Class definition
 
@@ -25,10 +32,20 @@ class FMRobot(Agent):
     Attributes:
         _my_standing_order (Order | None): Used to track my standing order in a given market.
         _my_order_count (int): Track the number of orders I have placed to give my robot unique order IDs
+        _book (OrderBook): Incremental order book updated from the orders passed to received_orders
+        _validator (OrderValidator): Checks my orders before they are sent
+        _gateway (OrderGateway): Sends my orders under a rate limit, dropping repeated cancels
+        _seen_book_version (int | None): Market version of the book when _get_best_standing_sell_order last ran
+        _scheduler (SessionScheduler): Holds my periodic jobs while the market is paused or closed
     """
 
     _my_standing_order: Order | None
     _my_order_count: int
+    _book: OrderBook
+    _validator: OrderValidator
+    _gateway: OrderGateway
+    _seen_book_version: int | None
+    _scheduler: SessionScheduler
 
 
     def __init__(self, account: str, email: str, password: str, marketplace_id: int, name: str = 'FMRobot'):
@@ -45,36 +62,72 @@ class FMRobot(Agent):
         self._my_standing_order = None
         self._my_order_count = 0
 
+        self._book = OrderBook()
+
+        # orders the exchange would reject are caught here instead of costing a round trip
+        self._validator = OrderValidator(self._book)
+        self._seen_book_version = None
+        self._gateway = OrderGateway(self.send_order)
+
+        # periodic jobs only run while the session is open, and the book is rebuilt when it opens
+        self._scheduler = SessionScheduler(self)
+        self._scheduler.on_open(self._warm_up)
+        self._scheduler.on_close(self._purge_orders)
+        self._session_orders = None  # standing orders the StrategyRuntime copied with the last session update
+
     def initialised(self) -> None:
-        pass
+        self._book.rebuild(Order.current().values())
+
+    def _purge_orders(self) -> None:
+        # an order still waiting for the rate limit would go out into the next session
+        for order in self._gateway.purge():
+            self.order_rejected({"error": "Session closed before the order was sent"}, order)
+
+    def _warm_up(self) -> None:
+        # a new session may start from a different book, read it once before the first order
+        self._book.rebuild(Order.current().values() if self._session_orders is None else self._session_orders)
+        self._seen_book_version = None
     
     def pre_start_tasks(self) -> None:
-        # I use periodic methods here
+        # I use periodic methods here, through the scheduler so they pause with the market
 
-        # Get and print the best standing sell order every second 
-        self.execute_periodically(self._get_best_standing_sell_order, sleep_time=1)
+        # Get and print the best standing sell order every second, but only if the market has changed since the last time
+        self._scheduler.every(self._get_best_standing_sell_order, sleep_time=1, condition=self._book_changed)
 
         # Every 5 seconds, if I dont have standing order, place one
         # to create a condition, it must be something callable (a function), so we create a lambda function because the check is simple
-        self.execute_periodically_conditionally(self._place_standing_order, sleep_time=5, condition=lambda: self._my_standing_order is None)
+        self._scheduler.every(self._place_standing_order, sleep_time=5, condition=lambda: self._my_standing_order is None)
         
         # Every 6 seconds, if I do have standing order, cancel it
         # I use 6 seconds to stagger placement and cancellation slightly
-        self.execute_periodically_conditionally(self._cancel_standing_order, sleep_time=6, condition=lambda: self._my_standing_order is not None)
+        self._scheduler.every(self._cancel_standing_order, sleep_time=6, condition=lambda: self._my_standing_order is not None)
 
+        # orders held back by the rate limit go out as soon as it allows
+        self._scheduler.every(self._gateway.flush, sleep_time=1, condition=self._gateway.pending)
 
-    def received_session_info(self, session: Session) -> None:
-        pass
 
-    def received_holdings(self, holdings: Holding) -> None:
-        pass
+    def received_session_info(self, session: Session, orders: list[Order] | None = None) -> None:
+        # without the StrategyRuntime this runs on the fmclient thread and Order.current() is read directly
+        self._session_orders = orders
+        self._validator.session(session)
+        if self._scheduler.update(session):
+            self.inform(f"Session {session.fm_id} is now {self._scheduler.state.name}")
+
+    def received_holdings(self, holdings: Holding, orders: list[Order] | None = None) -> None:
+        # the standing orders the StrategyRuntime passes along are not needed, the book follows the deltas
+        self._validator.holdings(holdings)
 
     def received_orders(self, orders: list[Order]) -> None:
+        # apply only the changed orders to my book
+        self._book.apply(orders)
+
         # I do this to get any standing orders that belong to me on launch
-        self._get_best_standing_sell_order()           
+        if self._book_changed():
+            self._get_best_standing_sell_order()
 
     def order_accepted(self, order: Order) -> None:
         self.inform(f"My order ({order}) was accepted. It received fm_id {order.fm_id} from Flex-E-Markets.")
+        self._gateway.answered(order)
         # if I have a LIMIT order accepted, update my standing order tracking to include it's fm_id
         if order.order_type is OrderType.LIMIT and order.market.fm_id == MARKET_ID_ASSET_A:
             self._my_standing_order = order
@@ -85,35 +138,32 @@ class FMRobot(Agent):
 
     def order_rejected(self, info: dict[str, str], order: Order) -> None:
         self.warning(f"My order ({order}) was rejected. Info: {info}")
+        self._gateway.answered(order)
         # if I have a LIMIT order rejected, well it was never actually standing, so remove my standing order tracking
         if order.order_type == OrderType.LIMIT and order.market.fm_id == MARKET_ID_ASSET_A:
             self._my_standing_order = None
 
+    def _book_changed(self) -> bool:
+        # an idle market costs one comparison instead of a rerun
+        return self._book.market_version(MARKET_ID_ASSET_A) != self._seen_book_version
+
     def _get_best_standing_sell_order(self) -> None:
         # track the best standing sell order which is not mine
         # and track if I have any standing order
         # all in the market for Asset A
-        best_standing_sell_order: Order | None = None
-
-        for order in Order.current().values():
-            if order.order_type is OrderType.LIMIT:
-                if order.market.fm_id == MARKET_ID_ASSET_A:
-                    if order.mine:
-                        self._my_standing_order = order
-                    else:
-                        if order.order_side is OrderSide.SELL:
-                            if best_standing_sell_order is None or order.price < best_standing_sell_order.price:
-                                best_standing_sell_order = order
+        for quote in self._book.my_orders(MARKET_ID_ASSET_A):
+            self._my_standing_order = self._book.order_for(quote)
+
+        best_standing_sell_order: Quote | None = self._book.best_ask(MARKET_ID_ASSET_A)
 
         self.inform(f"The best standing sell order in market {MARKET_ID_ASSET_A} is {best_standing_sell_order}!")
+        self._seen_book_version = self._book.market_version(MARKET_ID_ASSET_A)
     
     def _place_standing_order(self) -> None:
         if self._my_standing_order is not None:
             self.inform("There is already a standing order.")
             return
         
-        # TODO need to check here that my order is a valid order and that it will be accepted by the exchange
-        
         market = Market.get_by_id(MARKET_ID_ASSET_A)
         if market is None:
             self.warning(f"Could not find market id: {MARKET_ID_ASSET_A}. Cannot place order.")
@@ -129,8 +179,14 @@ class FMRobot(Agent):
         self._my_order_count += 1
         new_order.ref = f"My order number: {self._my_order_count}"
 
+        # check here that my order is a valid order and that it will be accepted by the exchange
+        reason = self._validator.check(new_order)
+        if reason is not None:
+            self.warning(f"My order ({new_order}) would be rejected ({reason}), not sending it. Checks so far: {dict(self._validator.counters)}")
+            return
+
         self._my_standing_order = new_order
-        self.send_order(new_order)
+        self._gateway.submit(new_order)
         self.inform(f"I have sent off a new {new_order.order_type.name} order: {new_order}")
 
     def _cancel_standing_order(self) -> None:
@@ -147,11 +203,8 @@ class FMRobot(Agent):
             self.warning("My standing order has no fm_id yet, it cannot be cancelled.")
             return
         
-        cancel_order = copy.copy(self._my_standing_order)
-        cancel_order.order_type = OrderType.CANCEL
-
-        self.send_order(cancel_order)
-        self.inform(f"I have send a cancel for order: {cancel_order.fm_id}")
+        self._gateway.cancel(self._my_standing_order)
+        self.inform(f"I have send a cancel for order: {self._my_standing_order.fm_id}")
 
 
 # The dunder name equals dunder main
@@ -159,4 +212,9 @@ class FMRobot(Agent):
 if __name__ == "__main__":
     # Spawn your robot
     bot = FMRobot(account=FM_ACCOUNT, email=FM_EMAIL, password=FM_PASSWORD, marketplace_id=FM_MARKETPLACE_ID, name=ROBOT_NAME)    
+
+    if USE_STRATEGY_RUNTIME:
+        from strategy_runtime import StrategyRuntime
+        StrategyRuntime(bot, snapshot_orders=True).attach()
+
     bot.run()
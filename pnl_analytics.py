@@ -0,0 +1,346 @@
+import csv
+import time
+from collections import deque
+from typing import Callable
+
+from fmclient import Order, OrderSide, OrderType
+
+
+# round trips / public orders counted in the rolling figures
+PNL_WINDOW = 100
+
+ROUND_TRIP_FIELDS = ("public_ref", "private_ref", "opened_at", "closed_at", "public_side", "units", "public_price",
+                     "private_price", "expected_margin", "realised_margin", "slippage", "pnl")
+
+
+class RollingWindow:
+    """
+    Sum and mean of the last `size` values, O(1) per push
+    """
+
+    def __init__(self, size: int):
+        self._values: deque[float] = deque(maxlen=size)
+        self.total = 0.0
+
+    def push(self, value: float) -> None:
+        if len(self._values) == self._values.maxlen:
+            self.total -= self._values[0]
+        self._values.append(value)
+        self.total += value
+
+    def __len__(self) -> int:
+        return len(self._values)
+
+    @property
+    def mean(self) -> float | None:
+        return self.total / len(self._values) if self._values else None
+
+
+class _Trip:
+    # one arbitrage round trip while its fills come in
+    __slots__ = ("public_ref", "private_ref", "refs", "public_side", "units", "expected_margin", "opened_at", "hedged",
+                 "finished", "open_orders", "public_units", "public_cost", "private_units", "private_cost",
+                 "bought", "bought_cost", "sold", "sold_cost", "cash", "nets")
+
+    def __init__(self, public_ref: str, public_side: OrderSide, units: int, expected_margin: float, opened_at: float,
+                 hedged: bool):
+        self.public_ref = public_ref
+        self.private_ref: str | None = None
+        self.refs = [public_ref]  # of all its orders
+        self.public_side = public_side
+        self.units = units
+        self.expected_margin = expected_margin
+        self.opened_at = opened_at
+        self.hedged = hedged  # closed by finished(), hedges may still follow its orders
+        self.finished = False
+        self.open_orders = 0  # orders that can still trade
+        self.public_units = 0
+        self.public_cost = 0
+        self.private_units = 0
+        self.private_cost = 0
+        self.bought = 0
+        self.bought_cost = 0
+        self.sold = 0
+        self.sold_cost = 0
+        self.cash = 0  # cash flow of its fills
+        self.nets: dict[int, int] = {}  # market fm_id -> units bought minus sold
+
+
+class _Tracked:
+    # one order of a round trip: units not traded or cancelled yet, fm_id once accepted
+    __slots__ = ("ref", "trip", "units", "fm_id")
+
+    def __init__(self, ref: str, trip: _Trip, units: int):
+        self.ref = ref
+        self.trip = trip
+        self.units = units
+        self.fm_id: int | None = None
+
+
+class PnLAnalytics:
+    """
+    Streaming P&L of arbitrage round trips: pairs each public fill with its private fill
+
+    The robot reports the margin it expected when it sends a public order (opened), the private order
+    it sends against it (private_sent) and any order trading back what the two left unhedged (hedge_sent),
+    and passes every order answer and received_orders delta in. Fills add up per order, whole or partial,
+    on arrival or while resting; the rest of an order that partly traded on arrival is followed by ref
+    under its new fm_id. A round trip closes once none of its orders can trade any more: a SINGLE one when
+    its private order is done, a hedged (MULTI_LEG) one when the robot calls finished(). Units bought and
+    sold within it are paired at their average prices, giving the realised margin, which is compared with
+    the expected one (slippage). A public order that never trades is a miss. Every update is O(1): totals,
+    net units and cash flow are running sums, and the rolling figures use fixed-size windows.
+    Unrealised P&L marks the fills not paired into a round trip at the given prices (last fill price
+    if none). Fills are booked at the order's own price, the only price an answer carries, so a better
+    price on arrival is not seen.
+
+    Attributes:
+        round_trips (list[tuple]): Closed round trips, one ROUND_TRIP_FIELDS row each, for export
+        realised (int): P&L of closed round trips in cents
+        hits, misses (int): Public orders that traded / did not trade
+        pnl_window, slippage_window, hit_window (RollingWindow): Rolling figures over the last PNL_WINDOW
+    """
+
+    def __init__(self, window: int = PNL_WINDOW, clock: Callable[[], float] = time.time):
+        self._clock = clock
+        self._trips: dict[str, _Trip] = {}  # ref of any of its orders -> open trip
+        self._orders: dict[str, _Tracked] = {}  # ref -> order of an open trip that can still trade
+        self._standing: dict[int, _Tracked] = {}  # fm_id -> tracked order resting in a market
+        self._remainders: dict[str, _Tracked] = {}  # ref -> rest of a partly traded order not yet seen standing
+        self._cash_flow = 0
+        self._net_units: dict[int, int] = {}  # market fm_id -> units bought minus sold
+        self._last_price: dict[int, int] = {}
+
+        self.round_trips: list[tuple] = []
+        self.realised = 0
+        self.hits = 0
+        self.misses = 0
+        self.pnl_window = RollingWindow(window)
+        self.slippage_window = RollingWindow(window)
+        self.hit_window = RollingWindow(window)
+
+    # ----- from the strategy -----
+
+    def opened(self, public_ref: str, public_side: OrderSide, expected_margin: float, units: int, hedged: bool = False) -> None:
+        trip = _Trip(public_ref, public_side, units, expected_margin, self._clock(), hedged)
+        self._trips[public_ref] = trip
+        self._track(trip, public_ref, units)
+
+    def private_sent(self, public_ref: str, private_ref: str, units: int = 1) -> None:
+        trip = self._trips.get(public_ref)
+        if trip is not None:
+            trip.private_ref = private_ref
+            self._track(trip, private_ref, units)
+
+    def hedge_sent(self, public_ref: str, hedge_ref: str, units: int) -> None:
+        trip = self._trips.get(public_ref)
+        if trip is not None:
+            self._track(trip, hedge_ref, units)
+
+    def finished(self, public_ref: str) -> None:
+        """
+        No more orders will be sent for a round trip (e.g. its private order could not be sent); it closes once its orders are done
+        """
+        trip = self._trips.get(public_ref)
+        if trip is not None:
+            trip.finished = True
+            self._settle(trip)
+
+    def _track(self, trip: _Trip, ref: str, units: int) -> None:
+        self._trips[ref] = trip
+        if ref not in trip.refs:
+            trip.refs.append(ref)
+        self._orders[ref] = _Tracked(ref, trip, units)
+        trip.open_orders += 1
+
+    # ----- from the order callbacks -----
+
+    def accepted(self, order: Order) -> None:
+        if order.order_type is not OrderType.LIMIT:
+            return
+        tracked = self._orders.get(order.ref)
+        if tracked is None:
+            return
+        tracked.fm_id = order.fm_id
+        if not order.has_traded:
+            self._standing[order.fm_id] = tracked
+            return
+        self._filled(tracked, order.market.fm_id, order.order_side, order.price, min(order.units, tracked.units))
+        if tracked.units:
+            # the rest stands under a new fm_id with the same ref
+            self._remainders[order.ref] = tracked
+        else:
+            self._done(tracked)
+
+    def rejected(self, order: Order) -> None:
+        if order.order_type is not OrderType.LIMIT:
+            return
+        tracked = self._orders.get(order.ref)
+        if tracked is not None:
+            self._done(tracked)
+
+    def apply(self, orders: list[Order]) -> None:
+        """
+        Follow fills and cancels of my standing tracked orders in a received_orders delta
+        """
+        if not self._standing and not self._remainders:
+            return
+        for order in orders:
+            if not order.mine or order.order_type is OrderType.CANCEL:
+                continue
+            tracked = self._standing.get(order.fm_id)
+            if tracked is None:
+                # the rest of a partly traded order stands under a new fm_id
+                tracked = self._remainders.get(order.ref) if self._remainders else None
+                if tracked is None or order.fm_id == tracked.fm_id:
+                    continue
+                del self._remainders[order.ref]
+                tracked.fm_id = order.fm_id
+                self._standing[order.fm_id] = tracked
+
+            if order.has_traded:
+                # traded completely: whatever was still open
+                del self._standing[order.fm_id]
+                self._filled(tracked, order.market.fm_id, order.order_side, order.price, tracked.units)
+                self._done(tracked)
+                continue
+            if order.units < tracked.units:
+                # traded partly, the rest stands or was cancelled
+                self._filled(tracked, order.market.fm_id, order.order_side, order.price, tracked.units - order.units)
+            if order.is_cancelled:
+                del self._standing[order.fm_id]
+                self._done(tracked)
+
+    # ----- aggregation -----
+
+    def _filled(self, tracked: _Tracked, market_id: int, side: OrderSide, price: int, units: int) -> None:
+        if units <= 0:
+            return
+        tracked.units -= units
+        trip = tracked.trip
+        amount = price * units
+        if side is OrderSide.BUY:
+            signed = units
+            trip.bought += units
+            trip.bought_cost += amount
+        else:
+            signed = -units
+            trip.sold += units
+            trip.sold_cost += amount
+        self._net_units[market_id] = self._net_units.get(market_id, 0) + signed
+        self._cash_flow -= signed * price
+        self._last_price[market_id] = price
+        trip.nets[market_id] = trip.nets.get(market_id, 0) + signed
+        trip.cash -= signed * price
+
+        if tracked.ref == trip.public_ref:
+            trip.public_units += units
+            trip.public_cost += amount
+        elif tracked.ref == trip.private_ref:
+            trip.private_units += units
+            trip.private_cost += amount
+
+    def _done(self, tracked: _Tracked) -> None:
+        # the order can no longer trade
+        del self._orders[tracked.ref]
+        self._remainders.pop(tracked.ref, None)
+        trip = tracked.trip
+        trip.open_orders -= 1
+        if tracked.ref == trip.public_ref:
+            if trip.public_units:
+                self.hits += 1
+                self.hit_window.push(1)
+            else:
+                self.misses += 1
+                self.hit_window.push(0)
+        self._settle(trip)
+
+    def _settle(self, trip: _Trip) -> None:
+        if trip.open_orders:
+            return
+        if trip.hedged:
+            if not trip.finished:
+                return
+        elif trip.public_units and trip.private_ref is None and not trip.finished:
+            # a SINGLE trip sends its private order once the public one traded
+            return
+        self._close(trip)
+
+    def _close(self, trip: _Trip) -> None:
+        self._forget(trip)
+        units = min(trip.bought, trip.sold)
+        if not units:
+            # nothing to pair, the fills stay in the net position as unrealised P&L
+            return
+
+        # units bought but not sold (or the reverse) stay open, carried at their average price
+        excess = trip.bought - trip.sold
+        if excess > 0:
+            carried = round(excess * trip.bought_cost / trip.bought)
+        elif excess < 0:
+            carried = -round(-excess * trip.sold_cost / trip.sold)
+        else:
+            carried = 0
+        pnl = trip.cash + carried
+        margin = pnl / units
+        slippage = trip.expected_margin - margin
+
+        self.realised += pnl
+        # the paired units leave the open position, only the excess is marked, in the market that holds it
+        for market_id, net in trip.nets.items():
+            self._net_units[market_id] -= net
+        if excess:
+            market_id = max(trip.nets, key=lambda market: trip.nets[market] * excess)
+            self._net_units[market_id] += excess
+        self._cash_flow -= pnl
+        self.pnl_window.push(pnl)
+        self.slippage_window.push(slippage)
+        public_price = trip.public_cost / trip.public_units if trip.public_units else None
+        private_price = trip.private_cost / trip.private_units if trip.private_units else None
+        self.round_trips.append((trip.public_ref, trip.private_ref, trip.opened_at, self._clock(), trip.public_side.name,
+                                 units, public_price, private_price, trip.expected_margin, margin, slippage, pnl))
+
+    def _forget(self, trip: _Trip) -> None:
+        for ref in trip.refs:
+            self._trips.pop(ref, None)
+
+    # ----- reporting -----
+
+    def unrealised(self, marks: dict[int, float] | None = None) -> float:
+        marks = marks or {}
+        value = self._cash_flow
+        for market_id, units in self._net_units.items():
+            value += units * marks.get(market_id, self._last_price.get(market_id, 0))
+        return value
+
+    def summary(self, marks: dict[int, float] | None = None) -> dict:
+        answered = self.hits + self.misses
+        return {
+            "round_trips": len(self.round_trips),
+            "realised": self.realised,
+            "unrealised": self.unrealised(marks),
+            "hit_rate": self.hits / answered if answered else None,
+            "rolling_pnl": self.pnl_window.total,
+            "rolling_slippage": self.slippage_window.mean,
+            "rolling_hit_rate": self.hit_window.mean,
+            "open": len({id(trip) for trip in self._trips.values()}),
+        }
+
+    def export(self, path: str) -> None:
+        """
+        Write the closed round trips to CSV, or to Parquet if the path ends in .parquet (needs pyarrow)
+        """
+        if path.endswith(".parquet"):
+            try:
+                import pyarrow as pa
+                import pyarrow.parquet as pq
+            except ImportError as error:
+                raise ImportError("Parquet export needs pyarrow, export to .csv instead") from error
+            columns = list(zip(*self.round_trips)) if self.round_trips else [()] * len(ROUND_TRIP_FIELDS)
+            pq.write_table(pa.table({name: list(column) for name, column in zip(ROUND_TRIP_FIELDS, columns)}), path)
+            return
+
+        with open(path, "w", newline="") as csv_file:
+            writer = csv.writer(csv_file)
+            writer.writerow(ROUND_TRIP_FIELDS)
+            writer.writerows(self.round_trips)
@@ -5,6 +5,8 @@ import logging
 
 from fmclient import Agent, Market, Holding, Session, Order, OrderType, OrderSide
 
+from order_validation import OrderValidator
+
 
 # Flex-E-Market credential
 
@@ -23,10 +25,16 @@ NATURE_TRADER_ID = "M000"  # This is the trader ID of the private signal
 class FMRobot(Agent):
     """
     A simple robot to demonstrate placing an order in the private market.
+
+    Attributes:
+        _validator (OrderValidator): Checks my orders before they are sent
     """
 
+    _validator: OrderValidator
+
     def __init__(self, account: str, email: str, password: str, marketplace_id: int, name: str = 'FMRobot'):
         super().__init__(account, email, password, marketplace_id, name=name)
+        self._validator = OrderValidator()
     
     def initialised(self) -> None:
         pass
@@ -45,13 +53,18 @@ class FMRobot(Agent):
             # Key part with private market
             order.owner_or_target = NATURE_TRADER_ID
 
-            # This just creates the order, you will also need to validate and submit it
+            # Validate the order locally, then submit it
+            reason = self._validator.check(order)
+            if reason is not None:
+                self.warning(f"Private order ({order}) would be rejected ({reason}), not sending it.")
+                return
+            self.send_order(order)
 
     def received_session_info(self, session: Session) -> None:
-        pass
+        self._validator.session(session)
 
     def received_holdings(self, holdings: Holding) -> None:
-        pass
+        self._validator.holdings(holdings)
 
     def received_orders(self, new_orders: list[Order]) -> None:
         pass
@@ -0,0 +1,80 @@
+from collections import Counter
+from enum import Enum
+from typing import Callable
+
+from fmclient import Agent, Session
+
+
+# Enum for whether the marketplace takes orders
+class TradingState(Enum):
+    UNKNOWN = 0  # no session update yet, orders are left to the exchange
+    OPEN = 1
+    PAUSED = 2
+    CLOSED = 3
+
+
+class SessionScheduler:
+    """
+    Session state machine that suspends a robot's periodic jobs and orders while the marketplace cannot trade
+
+    Jobs registered with every() only run while can_trade; their own condition is checked after that,
+    so a closed market costs one attribute read per tick. update() follows received_session_info and,
+    on every move to OPEN, runs the on_open() callbacks in registration order so books and ledgers are
+    rebuilt before the robot's first order of the session. On every move to PAUSED or CLOSED it runs
+    the on_close() callbacks, e.g. to drop orders still queued so they do not go out in the next session.
+
+    Attributes:
+        state (TradingState): State of the current session
+        session_id (int | None): fm_id of the current session
+        counters (Counter): "suspended" job runs skipped, "open" / "paused" / "closed" transitions
+    """
+
+    def __init__(self, agent: Agent):
+        self._agent = agent
+        self._on_open: list[Callable[[], None]] = []
+        self._on_close: list[Callable[[], None]] = []
+        self.state = TradingState.UNKNOWN
+        self.session_id: int | None = None
+        self.counters = Counter()
+
+    @property
+    def can_trade(self) -> bool:
+        return self.state is TradingState.OPEN or self.state is TradingState.UNKNOWN
+
+    def on_open(self, callback: Callable[[], None]) -> None:
+        self._on_open.append(callback)
+
+    def on_close(self, callback: Callable[[], None]) -> None:
+        self._on_close.append(callback)
+
+    def every(self, func: Callable[[], None], sleep_time: float, condition: Callable[[], bool] | None = None) -> None:
+        """
+        execute_periodically_conditionally, suspended while the session is not open
+        """
+        def runnable() -> bool:
+            if not self.can_trade:
+                self.counters["suspended"] += 1
+                return False
+            return condition is None or condition()
+
+        self._agent.execute_periodically_conditionally(func, sleep_time=sleep_time, condition=runnable)
+
+    def update(self, session: Session) -> bool:
+        """
+        Follow a session update; True if the state or the session changed
+        """
+        if session.is_open:
+            state = TradingState.OPEN
+        elif session.is_paused:
+            state = TradingState.PAUSED
+        else:
+            state = TradingState.CLOSED
+        if state is self.state and session.fm_id == self.session_id:
+            return False
+
+        self.state = state
+        self.session_id = session.fm_id
+        self.counters[state.name.lower()] += 1
+        for callback in self._on_open if state is TradingState.OPEN else self._on_close:
+            callback()
+        return True
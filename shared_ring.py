@@ -0,0 +1,82 @@
+import struct
+from multiprocessing import shared_memory
+
+
+_HEADER = struct.Struct("<QQ")  # write position, read position; both only ever grow
+_LENGTH = struct.Struct("<I")
+
+
+class SharedRing:
+    """
+    Single-producer, single-consumer ring of byte messages in shared memory
+
+    One process push()es, one other process pop()s; positions are monotonic counters in the header,
+    written only after the payload, so no lock is needed. A full ring makes push() return False and
+    the producer decides whether to drop or retry.
+
+    Usage:
+        ring = SharedRing.create(1 << 20)  # owner, pass ring.name to the other process
+        other = SharedRing.attach(name)
+
+    Attributes:
+        name (str): Shared memory block name
+        capacity (int): Bytes available for messages and their 4-byte length prefixes
+    """
+
+    def __init__(self, memory: shared_memory.SharedMemory, owner: bool):
+        self._memory = memory
+        self._buffer = memory.buf
+        self._owner = owner
+        self.name = memory.name
+        self.capacity = memory.size - _HEADER.size
+
+    @classmethod
+    def create(cls, capacity: int) -> "SharedRing":
+        ring = cls(shared_memory.SharedMemory(create=True, size=_HEADER.size + capacity), owner=True)
+        _HEADER.pack_into(ring._buffer, 0, 0, 0)
+        return ring
+
+    @classmethod
+    def attach(cls, name: str) -> "SharedRing":
+        return cls(shared_memory.SharedMemory(name=name), owner=False)
+
+    def _copy_in(self, position: int, data: bytes) -> None:
+        start = position % self.capacity
+        first = min(len(data), self.capacity - start)
+        self._buffer[_HEADER.size + start:_HEADER.size + start + first] = data[:first]
+        if first < len(data):
+            self._buffer[_HEADER.size:_HEADER.size + len(data) - first] = data[first:]
+
+    def _copy_out(self, position: int, size: int) -> bytes:
+        start = position % self.capacity
+        first = min(size, self.capacity - start)
+        data = bytes(self._buffer[_HEADER.size + start:_HEADER.size + start + first])
+        if first < size:
+            data += bytes(self._buffer[_HEADER.size:_HEADER.size + size - first])
+        return data
+
+    def push(self, message: bytes) -> bool:
+        write, read = _HEADER.unpack_from(self._buffer, 0)
+        needed = _LENGTH.size + len(message)
+        if needed > self.capacity - (write - read):
+            return False
+        self._copy_in(write, _LENGTH.pack(len(message)))
+        self._copy_in(write + _LENGTH.size, message)
+        # publish the message by moving the write position last
+        struct.pack_into("<Q", self._buffer, 0, write + needed)
+        return True
+
+    def pop(self) -> bytes | None:
+        write, read = _HEADER.unpack_from(self._buffer, 0)
+        if read == write:
+            return None
+        size = _LENGTH.unpack(self._copy_out(read, _LENGTH.size))[0]
+        message = self._copy_out(read + _LENGTH.size, size)
+        struct.pack_into("<Q", self._buffer, 8, read + _LENGTH.size + size)
+        return message
+
+    def close(self) -> None:
+        self._buffer.release()
+        self._memory.close()
+        if self._owner:
+            self._memory.unlink()
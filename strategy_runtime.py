@@ -0,0 +1,235 @@
+import threading
+import time
+from collections import Counter, deque
+from typing import Callable
+
+from fmclient import Order
+
+# Event kinds in the runtime queue
+ORDERS = "received_orders"
+HOLDINGS = "received_holdings"
+SESSION = "received_session_info"
+ACCEPTED = "order_accepted"
+REJECTED = "order_rejected"
+TASK = "periodic_task"
+
+
+class StrategyRuntime:
+    """
+    Moves a robot's decision logic off the fmclient callback thread
+
+    attach() replaces the agent's callbacks with constant-time enqueue functions; one strategy
+    thread runs the original callbacks in arrival order. Bursts are coalesced while they wait:
+        received_orders: deltas are merged per order fm_id, latest version wins, so the book
+                         update is delivered once with the newest state of every order
+        received_holdings, received_session_info: only the latest is kept
+        order_accepted, order_rejected: always delivered, one by one
+        periodic tasks: at most one queued run per task, runs older than max_task_age are dropped
+    An accept or reject is a barrier: orders, holdings and session info arriving after it start a
+    new queued event instead of merging into one queued before it, so no callback sees a state
+    that came after an answer it has not been given yet.
+
+    fmclient keeps Order.current() up to date on its own thread, so the strategy thread must not
+    iterate it. With snapshot_orders the standing orders are copied on the fmclient thread with
+    every received_holdings and received_session_info and passed to the callback as a second
+    argument, e.g. received_holdings(holdings, orders).
+
+    Usage:
+        runtime = StrategyRuntime(bot)
+        runtime.attach()  # before bot.run(), so pre_start_tasks timers are routed too
+        bot.run()
+
+    Attributes:
+        counters (Counter): "<kind>.received", ".coalesced", ".delivered" and ".dropped_stale" counts
+    """
+
+    def __init__(self, agent, max_task_age: float = 1.0, snapshot_orders: bool = False):
+        self._agent = agent
+        self._max_task_age = max_task_age
+        self._snapshot_orders = snapshot_orders
+        self.counters = Counter()
+
+        self._lock = threading.Lock()
+        self._ready = threading.Condition(self._lock)
+        self._events: deque = deque()
+
+        # payloads of the coalescing events still queued after the last accept or reject, None if there
+        # is none; a delta for orders, the callback arguments for holdings and session info
+        self._orders: dict | None = None
+        self._holdings: list | None = None
+        self._session: list | None = None
+        self._tasks: set[Callable] = set()
+
+        self._callbacks: dict[str, Callable] = {}
+        self._busy = False
+        self._stopping = False
+        self._thread: threading.Thread | None = None
+
+    def attach(self) -> None:
+        agent = self._agent
+        self._callbacks = {
+            ORDERS: agent.received_orders,
+            HOLDINGS: agent.received_holdings,
+            SESSION: agent.received_session_info,
+            ACCEPTED: agent.order_accepted,
+            REJECTED: agent.order_rejected,
+        }
+        agent.received_orders = self._on_orders
+        agent.received_holdings = self._on_holdings
+        agent.received_session_info = self._on_session
+        agent.order_accepted = lambda order: self._push(ACCEPTED, (order,))
+        agent.order_rejected = lambda info, order: self._push(REJECTED, (info, order))
+
+        # timers only queue a run, the task itself and its condition run on the strategy thread
+        execute_periodically = agent.execute_periodically
+        agent.execute_periodically = lambda func, sleep_time: execute_periodically(self._task_trigger(func, None), sleep_time)
+        agent.execute_periodically_conditionally = (
+            lambda func, sleep_time, condition: execute_periodically(self._task_trigger(func, condition), sleep_time)
+        )
+
+        self._thread = threading.Thread(target=self._run, name=f"{getattr(agent, 'name', 'robot')}-strategy", daemon=True)
+        self._thread.start()
+
+    # ----- producer side, called on the fmclient thread -----
+
+    def _push(self, kind: str, payload) -> None:
+        with self._lock:
+            self.counters[f"{kind}.received"] += 1
+            # what arrives after an answer is delivered after it
+            self._orders = self._holdings = self._session = None
+            self._events.append((kind, payload, time.monotonic()))
+            self._ready.notify()
+
+    def _on_orders(self, orders: list) -> None:
+        with self._lock:
+            self.counters[f"{ORDERS}.received"] += 1
+            if self._orders is None:
+                self._orders = {}
+                self._events.append((ORDERS, self._orders, time.monotonic()))
+                self._ready.notify()
+            else:
+                self.counters[f"{ORDERS}.coalesced"] += 1
+            for order in orders:
+                self._orders.pop(order.fm_id, None)
+                self._orders[order.fm_id] = order
+
+    def _on_holdings(self, holdings) -> None:
+        args = self._args(holdings)
+        with self._lock:
+            self.counters[f"{HOLDINGS}.received"] += 1
+            if self._holdings is None:
+                self._holdings = args
+                self._events.append((HOLDINGS, args, time.monotonic()))
+                self._ready.notify()
+            else:
+                self.counters[f"{HOLDINGS}.coalesced"] += 1
+                self._holdings[:] = args
+
+    def _on_session(self, session) -> None:
+        args = self._args(session)
+        with self._lock:
+            self.counters[f"{SESSION}.received"] += 1
+            if self._session is None:
+                self._session = args
+                self._events.append((SESSION, args, time.monotonic()))
+                self._ready.notify()
+            else:
+                self.counters[f"{SESSION}.coalesced"] += 1
+                self._session[:] = args
+
+    def _args(self, value) -> list:
+        # callback arguments for holdings and session info, with the standing orders copied on this thread
+        return [value, list(Order.current().values())] if self._snapshot_orders else [value]
+
+    def _task_trigger(self, func: Callable[[], None], condition: Callable[[], bool] | None) -> Callable[[], None]:
+        task = func if condition is None else _ConditionalTask(func, condition)
+
+        def trigger():
+            with self._lock:
+                self.counters[f"{TASK}.received"] += 1
+                if task in self._tasks:
+                    self.counters[f"{TASK}.coalesced"] += 1
+                    return
+                self._tasks.add(task)
+                self._events.append((TASK, task, time.monotonic()))
+                self._ready.notify()
+
+        return trigger
+
+    # ----- consumer side, the strategy thread -----
+
+    def _take(self):
+        with self._ready:
+            while not self._events and not self._stopping:
+                self._busy = False
+                self._ready.notify_all()
+                self._ready.wait()
+            if not self._events:
+                return None
+            self._busy = True
+            kind, payload, queued = self._events.popleft()
+            # a coalescing event being handed over takes no more updates
+            if kind == ORDERS:
+                if payload is self._orders:
+                    self._orders = None
+                payload = (list(payload.values()),)
+            elif kind == HOLDINGS:
+                if payload is self._holdings:
+                    self._holdings = None
+            elif kind == SESSION:
+                if payload is self._session:
+                    self._session = None
+            elif kind == TASK:
+                self._tasks.discard(payload)
+            return kind, payload, queued
+
+    def _run(self) -> None:
+        while True:
+            event = self._take()
+            if event is None:
+                return
+            kind, payload, queued = event
+
+            if kind == TASK:
+                if time.monotonic() - queued > self._max_task_age:
+                    self.counters[f"{TASK}.dropped_stale"] += 1
+                    continue
+                callback, payload = payload, ()
+            else:
+                callback = self._callbacks[kind]
+
+            self.counters[f"{kind}.delivered"] += 1
+            try:
+                callback(*payload)
+            except Exception as exc:
+                self._agent.error(f"Strategy callback failed: {exc!r}")
+
+    def wait_idle(self, timeout: float | None = None) -> bool:
+        """
+        Block until every queued event has been handled
+        """
+        with self._ready:
+            return self._ready.wait_for(lambda: not self._events and not self._busy, timeout)
+
+    def stop(self) -> None:
+        """
+        Handle what is queued, then stop the strategy thread
+        """
+        with self._ready:
+            self._stopping = True
+            self._ready.notify_all()
+        if self._thread is not None:
+            self._thread.join()
+
+
+class _ConditionalTask:
+    # a periodic task whose condition is checked when it runs, not when the timer fires
+    __slots__ = ("_func", "_condition")
+
+    def __init__(self, func: Callable[[], None], condition: Callable[[], bool]):
+        self._func = func
+        self._condition = condition
+
+    def __call__(self) -> None:
+        if self._condition():
+            self._func()
@@ -0,0 +1,337 @@
+import argparse
+import json
+import logging
+import multiprocessing
+import os
+import threading
+import time
+from collections import Counter
+from typing import Callable
+
+from fmclient import Agent
+
+from shared_ring import SharedRing
+
+
+# restart back-off after a robot stops or crashes, doubled on every restart in a row up to the maximum
+RESTART_DELAY_SECONDS = 5
+MAX_RESTART_DELAY_SECONDS = 300
+# a robot that ran this long before stopping is considered healthy again, so its back-off starts over
+HEALTHY_RUN_SECONDS = 600
+
+# sharded mode: how often each worker process sends its robots' holdings and metrics, and the ring size per worker
+SHARD_REPORT_SECONDS = 5
+SHARD_RING_BYTES = 1 << 20
+
+
+def _ids_bot(entry: "BotConfig") -> Agent:
+    from Project_Task_1_Robot import BotType, ExecutionMode, IDSBot
+
+    options = dict(entry.options)
+    if "bot_type" in options:
+        options["bot_type"] = BotType[options["bot_type"]]
+    if "execution_mode" in options:
+        options["execution_mode"] = ExecutionMode[options["execution_mode"]]
+    options.setdefault("bot_type", BotType.REACTIVE)
+    return IDSBot(entry.account, entry.email, entry.password, entry.marketplace_id, bot_name=entry.name,
+                  public_market_id=entry.public_market_id, private_market_id=entry.private_market_id, **options)
+
+
+# strategy name in the config -> function building the robot from its entry
+STRATEGIES: dict[str, Callable[["BotConfig"], Agent]] = {
+    "ids": _ids_bot,
+}
+
+
+class BotConfig:
+    """
+    One robot of the supervisor config
+
+    Attributes:
+        name (str): Robot name, also the name of its logger and thread
+        account, email, password (str): Flex-E-Markets login
+        marketplace_id (int): Marketplace to connect to
+        public_market_id, private_market_id (int): Markets the robot trades
+        strategy (str): Key into STRATEGIES
+        options (dict): Extra keyword arguments for the strategy, e.g. {"execution_mode": "MULTI_LEG"}
+    """
+
+    def __init__(self, name: str, account: str, email: str, password: str, marketplace_id: int,
+                 public_market_id: int, private_market_id: int, strategy: str = "ids", options: dict | None = None):
+        self.name = name
+        self.account = account
+        self.email = email
+        self.password = password
+        self.marketplace_id = marketplace_id
+        self.public_market_id = public_market_id
+        self.private_market_id = private_market_id
+        self.strategy = strategy
+        self.options = options or {}
+
+    @classmethod
+    def from_dict(cls, entry: dict) -> "BotConfig":
+        entry = dict(entry)
+        # keep passwords out of the config file with "password_env": "NAME_OF_VARIABLE"
+        if "password_env" in entry:
+            entry["password"] = os.environ[entry.pop("password_env")]
+        return cls(**entry)
+
+
+def load_config(path: str) -> list[BotConfig]:
+    """
+    Read a JSON config of the form {"bots": [{"name": ..., "account": ..., ...}, ...]}
+    """
+    with open(path) as config_file:
+        entries = [BotConfig.from_dict(entry) for entry in json.load(config_file)["bots"]]
+
+    names = set()
+    markets = set()
+    for entry in entries:
+        if entry.strategy not in STRATEGIES:
+            raise ValueError(f"Unknown strategy {entry.strategy!r} for {entry.name}, expected one of {sorted(STRATEGIES)}")
+        if entry.name in names:
+            raise ValueError(f"Duplicate robot name {entry.name!r}")
+        names.add(entry.name)
+        # fmclient keeps the known orders per process, two robots trading one market would see each other's orders as theirs
+        for market_id in (entry.public_market_id, entry.private_market_id):
+            if (entry.marketplace_id, market_id) in markets:
+                raise ValueError(f"Market {market_id} of marketplace {entry.marketplace_id} is traded by more than one robot")
+            markets.add((entry.marketplace_id, market_id))
+    return entries
+
+
+class _Slot:
+    # one supervised robot and its restart state
+    def __init__(self, entry: BotConfig):
+        self.entry = entry
+        self.bot: Agent | None = None
+        self.thread: threading.Thread | None = None
+        self.restarts = 0
+        self.last_error: str | None = None
+
+
+class Supervisor:
+    """
+    Runs many robots in one process, each on its own thread, restarting any that stop or crash
+
+    A robot that raises only takes its own thread down: it is rebuilt from its config entry and
+    started again after a back-off, the other robots keep trading. The robots share the interpreter,
+    imports and logging, so a few dozen cost far less memory than a process each.
+
+    Attributes:
+        slots (dict): robot name -> _Slot with the running robot, its restart count and last error
+    """
+
+    def __init__(self, entries: list[BotConfig], restart_delay: float = RESTART_DELAY_SECONDS,
+                 max_restart_delay: float = MAX_RESTART_DELAY_SECONDS, max_restarts: int | None = None):
+        self.slots = {entry.name: _Slot(entry) for entry in entries}
+        self._restart_delay = restart_delay
+        self._max_restart_delay = max_restart_delay
+        self._max_restarts = max_restarts
+        self._stopping = threading.Event()
+        self._logger = logging.getLogger("agent.supervisor")
+
+    def start(self) -> None:
+        for slot in self.slots.values():
+            slot.thread = threading.Thread(target=self._supervise, args=(slot,), name=slot.entry.name, daemon=True)
+            slot.thread.start()
+
+    def _supervise(self, slot: _Slot) -> None:
+        delay = self._restart_delay
+        while not self._stopping.is_set():
+            started = time.monotonic()
+            try:
+                slot.bot = STRATEGIES[slot.entry.strategy](slot.entry)
+                slot.bot.run()
+                slot.last_error = None
+                self._logger.warning("Robot %s stopped", slot.entry.name)
+            except Exception as exc:
+                slot.last_error = repr(exc)
+                self._logger.exception("Robot %s crashed", slot.entry.name)
+
+            if self._stopping.is_set():
+                return
+            if self._max_restarts is not None and slot.restarts >= self._max_restarts:
+                self._logger.error("Robot %s reached %s restarts, giving up", slot.entry.name, slot.restarts)
+                return
+
+            if time.monotonic() - started >= HEALTHY_RUN_SECONDS:
+                delay = self._restart_delay
+            slot.restarts += 1
+            self._logger.info("Restarting robot %s in %ss", slot.entry.name, delay)
+            if self._stopping.wait(delay):
+                return
+            delay = min(delay * 2, self._max_restart_delay)
+
+    def reports(self) -> dict[str, dict]:
+        """
+        report() of every running robot that has one
+        """
+        reports = {}
+        for name, slot in self.slots.items():
+            report = getattr(slot.bot, "report", None)
+            if not callable(report):
+                continue
+            try:
+                reports[name] = report()
+            except Exception as exc:
+                # the robot keeps running on its own thread, a report can race with it
+                self._logger.debug("No report from %s: %r", name, exc)
+        return reports
+
+    def status(self) -> dict[str, dict]:
+        return {
+            name: {"running": slot.thread is not None and slot.thread.is_alive(), "restarts": slot.restarts, "last_error": slot.last_error}
+            for name, slot in self.slots.items()
+        }
+
+    def wait(self) -> None:
+        """
+        Block until every robot has given up or stop() is called
+        """
+        for slot in self.slots.values():
+            while slot.thread is not None and slot.thread.is_alive() and not self._stopping.is_set():
+                slot.thread.join(timeout=1)
+
+    def stop(self, timeout: float = 5) -> None:
+        """
+        Stop restarting robots and ask the running ones to stop, where the Agent supports it
+        """
+        self._stopping.set()
+        for slot in self.slots.values():
+            stop = getattr(slot.bot, "stop", None)
+            if callable(stop):
+                stop()
+        for slot in self.slots.values():
+            if slot.thread is not None:
+                slot.thread.join(timeout)
+
+
+def shard(entries: list[BotConfig], workers: int) -> list[list[BotConfig]]:
+    """
+    Split robots into at most `workers` shards, keeping every marketplace in one shard
+    and balancing the number of robots per shard
+    """
+    groups: dict[int, list[BotConfig]] = {}
+    for entry in entries:
+        groups.setdefault(entry.marketplace_id, []).append(entry)
+
+    shards: list[list[BotConfig]] = [[] for _ in range(min(workers, len(groups)))]
+    for group in sorted(groups.values(), key=len, reverse=True):
+        min(shards, key=len).extend(group)
+    return shards
+
+
+def _run_shard(index: int, entries: list[BotConfig], ring_name: str, stopping, report_seconds: float, supervisor_options: dict) -> None:
+    # worker process: supervise this shard's robots on threads and stream their reports to the coordinator
+    ring = SharedRing.attach(ring_name)
+    supervisor = Supervisor(entries, **supervisor_options)
+    supervisor.start()
+    try:
+        while not stopping.wait(report_seconds):
+            message = {"shard": index, "time": time.time(), "status": supervisor.status(), "bots": supervisor.reports()}
+            if not ring.push(json.dumps(message, default=str).encode()):
+                supervisor._logger.warning("Shard %s report ring is full, report dropped", index)
+    finally:
+        supervisor.stop()
+        ring.close()
+
+
+class ShardedSupervisor:
+    """
+    Spreads robots over worker processes so their decision logic is not serialised by one GIL
+
+    Robots are sharded by marketplace; each worker runs a Supervisor for its shard and its robots
+    keep their own fmclient connections, so market events arrive directly in the owning process.
+    Workers send holdings and metrics back over a SharedRing each, which poll() drains.
+
+    Attributes:
+        shards (list): The robots of each worker
+        reports (dict): shard index -> latest report from that worker
+    """
+
+    def __init__(self, entries: list[BotConfig], workers: int, report_seconds: float = SHARD_REPORT_SECONDS, **supervisor_options):
+        self.shards = shard(entries, workers)
+        self.reports: dict[int, dict] = {}
+        self._report_seconds = report_seconds
+        self._supervisor_options = supervisor_options
+        self._context = multiprocessing.get_context()
+        self._stopping = self._context.Event()
+        self._rings: list[SharedRing] = []
+        self._processes: list = []
+        self._logger = logging.getLogger("agent.supervisor")
+
+    def start(self) -> None:
+        for index, entries in enumerate(self.shards):
+            ring = SharedRing.create(SHARD_RING_BYTES)
+            process = self._context.Process(
+                target=_run_shard, name=f"shard-{index}", daemon=True,
+                args=(index, entries, ring.name, self._stopping, self._report_seconds, self._supervisor_options),
+            )
+            process.start()
+            self._rings.append(ring)
+            self._processes.append(process)
+
+    def poll(self) -> int:
+        """
+        Read every waiting report, keeping the latest per shard; returns how many were read
+        """
+        count = 0
+        for ring in self._rings:
+            while (message := ring.pop()) is not None:
+                report = json.loads(message)
+                self.reports[report["shard"]] = report
+                count += 1
+        return count
+
+    def aggregate(self) -> dict:
+        """
+        Robot status, cash and callback counts summed over all shards from the latest reports
+        """
+        status = {}
+        cash = cash_available = 0
+        counters = Counter()
+        for report in self.reports.values():
+            status.update(report["status"])
+            for bot in report["bots"].values():
+                if bot.get("holdings") is not None:
+                    cash += bot["holdings"]["cash"]
+                    cash_available += bot["holdings"]["cash_available"]
+                counters.update(bot.get("counters", {}))
+        return {"status": status, "cash": cash, "cash_available": cash_available, "counters": dict(counters)}
+
+    def wait(self) -> None:
+        """
+        Collect reports and log the aggregate until every worker has exited or stop() is called
+        """
+        while not self._stopping.is_set() and any(process.is_alive() for process in self._processes):
+            time.sleep(self._report_seconds)
+            if self.poll():
+                self._logger.info("Shards: %s", self.aggregate())
+
+    def stop(self, timeout: float = 10) -> None:
+        self._stopping.set()
+        for process in self._processes:
+            process.join(timeout)
+            if process.is_alive():
+                process.terminate()
+        self.poll()
+        for ring in self._rings:
+            ring.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run every robot of a JSON config, in this process or sharded over worker processes")
+    parser.add_argument("config")
+    parser.add_argument("--workers", type=int, default=0, help="spread robots over this many processes, 0 runs them all here")
+    args = parser.parse_args()
+
+    entries = load_config(args.config)
+    supervisor = ShardedSupervisor(entries, args.workers) if args.workers > 0 else Supervisor(entries)
+    supervisor.start()
+    try:
+        supervisor.wait()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        supervisor.stop()
@@ -0,0 +1,9 @@
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import local_exchange
+
+# the modules under test import fmclient, so the stand-in has to be in place first
+local_exchange.install()
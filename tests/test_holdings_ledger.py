@@ -0,0 +1,171 @@
+import copy
+
+from fmclient import Asset, Holding, Market, Order, OrderSide, OrderType
+
+from holdings_ledger import HoldingsLedger
+
+
+MARKET = Market(11, "Widget")
+CASH = 10_000
+UNITS = 10
+
+
+def _ledger() -> HoldingsLedger:
+    ledger = HoldingsLedger()
+    ledger.reconcile(Holding(CASH, CASH, {MARKET: Asset(UNITS, UNITS)}))
+    return ledger
+
+
+def _order(ref: str, side: OrderSide, price: int, units: int) -> Order:
+    order = Order.create_new(MARKET)
+    order.ref = ref
+    order.order_side = side
+    order.price = price
+    order.units = units
+    order.mine = True
+    return order
+
+
+def _answer(order: Order, fm_id: int, traded_units: int | None = None) -> Order:
+    # the accepted copy; an order that traded on arrival comes back flagged traded with the units that traded
+    accepted = copy.copy(order)
+    accepted.fm_id = fm_id
+    if traded_units is not None:
+        accepted.has_traded = True
+        accepted.units = traded_units
+    return accepted
+
+
+def _update(order: Order, fm_id: int | None = None, units: int | None = None, traded: bool = False, cancelled: bool = False) -> Order:
+    # my order as it shows up in a received_orders delta
+    update = copy.copy(order)
+    if fm_id is not None:
+        update.fm_id = fm_id
+    if units is not None:
+        update.units = units
+    update.has_traded = traded
+    update.is_cancelled = cancelled
+    return update
+
+
+def _cancel(order: Order) -> Order:
+    cancel = copy.copy(order)
+    cancel.order_type = OrderType.CANCEL
+    return cancel
+
+
+def test_reserve_holds_cash_until_rejected():
+    ledger = _ledger()
+    order = _order("b1", OrderSide.BUY, 100, 5)
+    ledger.reserve(order)
+
+    assert (ledger.cash, ledger.cash_available) == (CASH, CASH - 500)
+
+    ledger.rejected(order)
+
+    assert (ledger.cash, ledger.cash_available) == (CASH, CASH)
+
+
+def test_standing_order_stays_reserved_until_cancelled():
+    ledger = _ledger()
+    order = _order("s1", OrderSide.SELL, 100, 4)
+    ledger.reserve(order)
+    standing = _answer(order, 1)
+    ledger.accepted(standing)
+    ledger.apply([standing])
+
+    assert (ledger.units(MARKET.fm_id), ledger.units_available(MARKET.fm_id)) == (UNITS, UNITS - 4)
+
+    ledger.apply([_update(standing, cancelled=True)])
+
+    assert (ledger.units(MARKET.fm_id), ledger.units_available(MARKET.fm_id)) == (UNITS, UNITS)
+    assert ledger.cash_available == CASH
+
+
+def test_accepted_cancel_releases_without_a_delta():
+    ledger = _ledger()
+    order = _order("b1", OrderSide.BUY, 100, 2)
+    ledger.reserve(order)
+    standing = _answer(order, 1)
+    ledger.accepted(standing)
+    ledger.accepted(_cancel(standing))
+
+    assert ledger.cash_available == CASH
+    # a cancelled delta arriving afterwards releases nothing twice
+    ledger.apply([_update(standing, cancelled=True)])
+    assert ledger.cash_available == CASH
+
+
+def test_rejected_cancel_drops_the_standing_order():
+    ledger = _ledger()
+    order = _order("b1", OrderSide.BUY, 100, 2)
+    ledger.reserve(order)
+    standing = _answer(order, 1)
+    ledger.accepted(standing)
+    ledger.rejected(_cancel(standing))
+
+    # the order had already traded or gone, the holdings update will say which
+    assert ledger.counters["dropped"] == 1
+    assert ledger.cash_available == CASH - 200
+    ledger.apply([_update(standing, traded=True)])
+    assert ledger.cash == CASH
+
+
+def test_full_fill_on_arrival_books_the_trade():
+    ledger = _ledger()
+    order = _order("b1", OrderSide.BUY, 100, 3)
+    ledger.reserve(order)
+    ledger.accepted(_answer(order, 1, traded_units=3))
+
+    assert (ledger.cash, ledger.cash_available) == (CASH - 300, CASH - 300)
+    assert (ledger.units(MARKET.fm_id), ledger.units_available(MARKET.fm_id)) == (UNITS + 3, UNITS + 3)
+
+
+def test_partial_fill_on_arrival_keeps_the_remainder_reserved():
+    ledger = _ledger()
+    order = _order("b1", OrderSide.BUY, 100, 5)
+    ledger.reserve(order)
+    ledger.accepted(_answer(order, 1, traded_units=2))
+
+    # 2 units bought, 3 still reserved
+    assert (ledger.cash, ledger.cash_available) == (CASH - 200, CASH - 500)
+    assert ledger.units(MARKET.fm_id) == UNITS + 2
+
+    # the remainder stands under a new fm_id with the same ref, then trades one unit and is cancelled
+    remainder = _update(order, fm_id=2, units=3)
+    ledger.apply([remainder])
+    assert ledger.cash_available == CASH - 500
+    ledger.apply([_update(remainder, units=2)])
+    assert (ledger.cash, ledger.cash_available) == (CASH - 300, CASH - 500)
+    ledger.apply([_update(remainder, units=2, cancelled=True)])
+
+    assert (ledger.cash, ledger.cash_available) == (CASH - 300, CASH - 300)
+    assert (ledger.units(MARKET.fm_id), ledger.units_available(MARKET.fm_id)) == (UNITS + 3, UNITS + 3)
+
+
+def test_partial_fills_of_a_resting_sell():
+    ledger = _ledger()
+    order = _order("s1", OrderSide.SELL, 120, 4)
+    ledger.reserve(order)
+    standing = _answer(order, 1)
+    ledger.accepted(standing)
+
+    ledger.apply([_update(standing, units=3)])
+    assert (ledger.units(MARKET.fm_id), ledger.units_available(MARKET.fm_id)) == (UNITS - 1, UNITS - 4)
+    assert (ledger.cash, ledger.cash_available) == (CASH + 120, CASH + 120)
+
+    ledger.apply([_update(standing, units=3, traded=True)])
+    assert (ledger.units(MARKET.fm_id), ledger.units_available(MARKET.fm_id)) == (UNITS - 4, UNITS - 4)
+    assert (ledger.cash, ledger.cash_available) == (CASH + 480, CASH + 480)
+
+
+def test_reconcile_keeps_orders_in_flight_reserved():
+    ledger = _ledger()
+    ledger.reserve(_order("b1", OrderSide.BUY, 100, 2))
+    ledger.reserve(_order("s1", OrderSide.SELL, 100, 3))
+
+    drift = ledger.reconcile(Holding(CASH, CASH, {MARKET: Asset(UNITS, UNITS)}))
+
+    assert drift == {}
+    assert ledger.cash_available == CASH - 200
+    assert ledger.units_available(MARKET.fm_id) == UNITS - 3
@@ -0,0 +1,133 @@
+import os
+
+import pytest
+
+from leg_journal import LegJournal
+
+
+SIZE = 4096
+
+
+def _open_leg(journal: LegJournal, public_ref: str, units: int = 3) -> None:
+    journal.opened(public_ref, 1, "BUY", 400, 2, "SELL", 450, units, 10, 20)
+
+
+def _refs(journal: LegJournal) -> list[str]:
+    return [entry.public_ref for entry in journal.open_legs()]
+
+
+def test_reopening_replays_open_legs(tmp_path):
+    path = str(tmp_path / "legs.journal")
+    journal = LegJournal(path, SIZE)
+    _open_leg(journal, "a")
+    _open_leg(journal, "b", units=5)
+    journal.private_sent("a", "a_private")
+    journal.closed("b")
+    _open_leg(journal, "c")
+    journal.close()
+
+    entries = LegJournal(path, SIZE).open_legs()
+
+    assert [entry.public_ref for entry in entries] == ["a", "c"]
+    leg = entries[0]
+    assert (leg.public_side, leg.public_price, leg.private_side, leg.private_price, leg.units) == ("BUY", 400, "SELL", 450, 3)
+    assert (leg.public_units_before, leg.private_units_before, leg.pipelined) == (10, 20, False)
+    assert leg.private_ref == "a_private"
+    assert entries[1].private_ref is None
+
+
+def test_records_after_a_crash_without_close_are_replayed(tmp_path):
+    path = str(tmp_path / "legs.journal")
+    journal = LegJournal(path, SIZE)
+    _open_leg(journal, "a")
+    journal.flush()
+    # no close(): the mapping is all a crashed process leaves behind
+
+    assert _refs(LegJournal(path, SIZE)) == ["a"]
+
+
+def test_truncated_record_is_dropped(tmp_path):
+    path = str(tmp_path / "legs.journal")
+    journal = LegJournal(path, SIZE)
+    _open_leg(journal, "a")
+    end_of_a = journal._position
+    _open_leg(journal, "b")
+    journal.closed("a")
+    journal.close()
+
+    # cut the file inside the record that opened b
+    with open(path, "r+b") as file:
+        file.truncate(end_of_a + 12)
+    replayed = LegJournal(path, SIZE)
+
+    assert _refs(replayed) == ["a"]
+    assert replayed.open_legs()[0].units == 3
+
+
+def test_record_without_its_length_is_not_read(tmp_path):
+    path = str(tmp_path / "legs.journal")
+    journal = LegJournal(path, SIZE)
+    _open_leg(journal, "a")
+    journal.close()
+
+    # a crash between writing the payload of the next record and its length leaves a zero length
+    with open(path, "r+b") as file:
+        data = file.read()
+        file.seek(data.index(b"\x00" * 16) + 5)
+        file.write(b"a")
+
+    assert _refs(LegJournal(path, SIZE)) == ["a"]
+
+
+def test_compaction_keeps_only_open_legs(tmp_path):
+    path = str(tmp_path / "legs.journal")
+    journal = LegJournal(path, 512)
+    _open_leg(journal, "kept")
+    journal.private_sent("kept", "kept_private")
+    # far more records than fit, so the journal has to compact several times
+    for number in range(200):
+        _open_leg(journal, f"leg{number}")
+        journal.closed(f"leg{number}")
+    _open_leg(journal, "last")
+    journal.close()
+
+    replayed = LegJournal(path, 512)
+
+    assert _refs(replayed) == ["kept", "last"]
+    assert replayed.open_legs()[0].private_ref == "kept_private"
+    assert not os.path.exists(path + ".tmp")
+
+
+def test_reopening_compacts(tmp_path):
+    path = str(tmp_path / "legs.journal")
+    journal = LegJournal(path, SIZE)
+    for number in range(20):
+        _open_leg(journal, f"leg{number}")
+        journal.closed(f"leg{number}")
+    _open_leg(journal, "open")
+    journal.close()
+
+    replayed = LegJournal(path, SIZE)
+
+    assert _refs(replayed) == ["open"]
+    assert replayed._position < 100
+
+
+def test_leftover_compaction_file_does_not_replace_the_journal(tmp_path):
+    path = str(tmp_path / "legs.journal")
+    journal = LegJournal(path, SIZE)
+    _open_leg(journal, "a")
+    journal.close()
+    # a crash during compaction leaves a partly written new file next to the whole old one
+    with open(path + ".tmp", "wb") as file:
+        file.write(b"\x07\x00")
+
+    assert _refs(LegJournal(path, SIZE)) == ["a"]
+
+
+def test_journal_too_small_for_the_open_legs(tmp_path):
+    journal = LegJournal(str(tmp_path / "legs.journal"), 128)
+
+    with pytest.raises(RuntimeError):
+        for number in range(10):
+            _open_leg(journal, f"leg{number}")
@@ -0,0 +1,179 @@
+import copy
+
+from fmclient import Market, Order, OrderSide, OrderType
+
+from order_book import OrderBook
+
+
+MARKET = Market(1, "Widget")
+OTHER_MARKET = Market(2, "Gadget")
+
+
+def _order(fm_id: int, side: OrderSide, price: int, units: int = 1, mine: bool = False, market: Market = MARKET) -> Order:
+    order = Order.create_new(market)
+    order.fm_id = fm_id
+    order.order_side = side
+    order.price = price
+    order.units = units
+    order.mine = mine
+    return order
+
+
+def _cancelled(order: Order) -> Order:
+    # fmclient reports a cancel as a copy of the order flagged cancelled
+    update = copy.copy(order)
+    update.is_cancelled = True
+    return update
+
+
+def _traded(order: Order, units_left: int | None = None) -> Order:
+    # a partial fill arrives as the same order with fewer units, a full fill as the order flagged traded
+    update = copy.copy(order)
+    if units_left is None:
+        update.has_traded = True
+    else:
+        update.units = units_left
+    return update
+
+
+def test_add_sets_best_per_side():
+    book = OrderBook()
+    book.apply([
+        _order(1, OrderSide.BUY, 100),
+        _order(2, OrderSide.BUY, 120),
+        _order(3, OrderSide.SELL, 150),
+        _order(4, OrderSide.SELL, 140),
+    ])
+
+    assert book.best_bid(MARKET.fm_id).fm_id == 2
+    assert book.best_ask(MARKET.fm_id).fm_id == 4
+    assert len(book) == 4
+
+
+def test_equal_prices_prefer_the_older_order():
+    book = OrderBook()
+    book.apply([_order(7, OrderSide.SELL, 140), _order(5, OrderSide.SELL, 140)])
+
+    assert book.best_ask(MARKET.fm_id).fm_id == 5
+
+
+def test_my_orders_never_count_as_best():
+    book = OrderBook()
+    mine = _order(1, OrderSide.BUY, 130, mine=True)
+    book.apply([mine, _order(2, OrderSide.BUY, 100)])
+
+    assert book.best_bid(MARKET.fm_id).fm_id == 2
+    assert [quote.fm_id for quote in book.my_orders(MARKET.fm_id)] == [1]
+    assert book.order_for(book.my_orders(MARKET.fm_id)[0]) is mine
+
+
+def test_cancel_removes_the_order():
+    book = OrderBook()
+    best = _order(1, OrderSide.SELL, 140)
+    book.apply([best, _order(2, OrderSide.SELL, 150)])
+    book.apply([_cancelled(best)])
+
+    assert book.best_ask(MARKET.fm_id).fm_id == 2
+    assert len(book) == 1
+
+
+def test_cancel_order_type_removes_the_target():
+    book = OrderBook()
+    best = _order(1, OrderSide.BUY, 120)
+    book.apply([best])
+    cancel = copy.copy(best)
+    cancel.order_type = OrderType.CANCEL
+    book.apply([cancel])
+
+    assert book.best_bid(MARKET.fm_id) is None
+    assert len(book) == 0
+
+
+def test_partial_fill_keeps_the_order_with_fewer_units():
+    book = OrderBook()
+    best = _order(1, OrderSide.SELL, 140, units=5)
+    book.apply([best, _order(2, OrderSide.SELL, 150)])
+    book.apply([_traded(best, units_left=2)])
+
+    quote = book.best_ask(MARKET.fm_id)
+    assert (quote.fm_id, quote.units) == (1, 2)
+    assert len(book) == 2
+
+
+def test_traded_order_is_removed():
+    book = OrderBook()
+    best = _order(1, OrderSide.BUY, 120)
+    book.apply([best, _order(2, OrderSide.BUY, 110)])
+    book.apply([_traded(best)])
+
+    assert book.best_bid(MARKET.fm_id).fm_id == 2
+    assert len(book) == 1
+
+
+def test_removing_my_order():
+    book = OrderBook()
+    mine = _order(1, OrderSide.SELL, 140, mine=True)
+    book.apply([mine])
+    book.apply([_traded(mine)])
+
+    assert book.my_orders(MARKET.fm_id) == []
+    assert len(book) == 0
+
+
+def test_best_of_an_unknown_or_empty_market_is_none():
+    book = OrderBook()
+    book.apply([_order(1, OrderSide.BUY, 100)])
+
+    assert book.best_ask(MARKET.fm_id) is None
+    assert book.best_bid(OTHER_MARKET.fm_id) is None
+
+
+def test_depth_is_best_price_first_and_skips_removed_orders():
+    book = OrderBook()
+    orders = [_order(fm_id, OrderSide.BUY, price) for fm_id, price in ((1, 100), (2, 130), (3, 110), (4, 120), (5, 90))]
+    book.apply(orders)
+    book.apply([_cancelled(orders[1]), _traded(orders[3])])
+
+    assert [quote.price for quote in book.depth(MARKET.fm_id, OrderSide.BUY, 2)] == [110, 100]
+    assert [quote.price for quote in book.depth(MARKET.fm_id, OrderSide.BUY, 10)] == [110, 100, 90]
+    assert book.depth(MARKET.fm_id, OrderSide.BUY, 0) == []
+    assert book.depth(OTHER_MARKET.fm_id, OrderSide.BUY, 3) == []
+
+
+def test_reprice_moves_the_order_in_the_heap():
+    book = OrderBook()
+    moved = _order(1, OrderSide.SELL, 140)
+    book.apply([moved, _order(2, OrderSide.SELL, 150)])
+    update = copy.copy(moved)
+    update.price = 160
+    book.apply([update])
+
+    assert [quote.fm_id for quote in book.depth(MARKET.fm_id, OrderSide.SELL, 5)] == [2, 1]
+
+
+def test_markets_are_kept_apart():
+    book = OrderBook()
+    book.apply([_order(1, OrderSide.BUY, 100), _order(2, OrderSide.BUY, 200, market=OTHER_MARKET)])
+
+    assert book.best_bid(MARKET.fm_id).price == 100
+    assert book.best_bid(OTHER_MARKET.fm_id).price == 200
+
+
+def test_market_version_changes_only_for_the_changed_market():
+    book = OrderBook()
+    book.apply([_order(1, OrderSide.BUY, 100), _order(2, OrderSide.BUY, 200, market=OTHER_MARKET)])
+    before = book.market_version(OTHER_MARKET.fm_id)
+    book.apply([_order(3, OrderSide.SELL, 150)])
+
+    assert book.market_version(OTHER_MARKET.fm_id) == before
+    assert book.market_version(MARKET.fm_id) > before
+
+
+def test_rebuild_replaces_the_book():
+    book = OrderBook()
+    book.apply([_order(1, OrderSide.BUY, 100)])
+    book.rebuild([_order(2, OrderSide.SELL, 150), _traded(_order(3, OrderSide.SELL, 140))])
+
+    assert book.best_bid(MARKET.fm_id) is None
+    assert book.best_ask(MARKET.fm_id).fm_id == 2
+    assert len(book) == 1
@@ -0,0 +1,117 @@
+import copy
+
+from fmclient import Market, Order, OrderSide
+
+from pnl_analytics import PnLAnalytics
+
+
+PUBLIC = Market(21, "Widget")
+PRIVATE = Market(22, "Widget (private)", private_market=True)
+
+
+def _order(ref: str, market: Market, side: OrderSide, price: int, units: int, fm_id: int) -> Order:
+    order = Order.create_new(market)
+    order.ref = ref
+    order.order_side = side
+    order.price = price
+    order.units = units
+    order.mine = True
+    order.fm_id = fm_id
+    return order
+
+
+def _traded(order: Order, units: int) -> Order:
+    # an order that traded, on arrival with the units that traded or as the last delta of a resting order
+    update = copy.copy(order)
+    update.has_traded = True
+    update.units = units
+    return update
+
+
+def _update(order: Order, fm_id: int | None = None, units: int | None = None, cancelled: bool = False) -> Order:
+    update = copy.copy(order)
+    if fm_id is not None:
+        update.fm_id = fm_id
+    if units is not None:
+        update.units = units
+    update.is_cancelled = cancelled
+    return update
+
+
+def test_single_round_trip():
+    pnl = PnLAnalytics(clock=lambda: 0.0)
+    pnl.opened("pub", OrderSide.BUY, 40, 1)
+    pnl.accepted(_traded(_order("pub", PUBLIC, OrderSide.BUY, 400, 1, 1), 1))
+    pnl.private_sent("pub", "prv")
+    pnl.accepted(_traded(_order("prv", PRIVATE, OrderSide.SELL, 450, 1, 2), 1))
+
+    assert pnl.realised == 50
+    assert pnl.round_trips[0][5:] == (1, 400, 450, 40, 50, -10, 50)
+    assert pnl.summary({PUBLIC.fm_id: 0, PRIVATE.fm_id: 0})["open"] == 0
+
+
+def test_missed_public_order():
+    pnl = PnLAnalytics()
+    pnl.opened("pub", OrderSide.BUY, 40, 1)
+    standing = _order("pub", PUBLIC, OrderSide.BUY, 400, 1, 1)
+    pnl.accepted(standing)
+    pnl.apply([_update(standing, cancelled=True)])
+
+    assert (pnl.hits, pnl.misses, pnl.round_trips) == (0, 1, [])
+
+
+def test_partial_fills_add_up_and_the_remainder_is_followed():
+    pnl = PnLAnalytics()
+    pnl.opened("pub", OrderSide.BUY, 40, 5, hedged=True)
+    public = _order("pub", PUBLIC, OrderSide.BUY, 400, 5, 1)
+    # 2 units trade on arrival, the other 3 rest under a new fm_id, trade 1 and are cancelled
+    pnl.accepted(_traded(public, 2))
+    remainder = _update(public, fm_id=2, units=3)
+    pnl.apply([remainder])
+    pnl.apply([_update(remainder, units=2)])
+    pnl.apply([_update(remainder, units=2, cancelled=True)])
+
+    pnl.private_sent("pub", "prv", 3)
+    private = _order("prv", PRIVATE, OrderSide.SELL, 450, 3, 3)
+    pnl.accepted(private)
+    pnl.apply([_update(private, units=1)])
+    pnl.apply([_traded(private, 1)])
+    assert pnl.round_trips == []
+
+    pnl.finished("pub")
+
+    assert pnl.realised == 3 * 50
+    assert pnl.round_trips[0][5] == 3
+    assert (pnl.hits, pnl.misses) == (1, 0)
+    assert pnl.unrealised() == 0
+
+
+def test_hedge_pairs_what_the_private_order_left():
+    pnl = PnLAnalytics()
+    pnl.opened("pub", OrderSide.BUY, 40, 3, hedged=True)
+    pnl.accepted(_traded(_order("pub", PUBLIC, OrderSide.BUY, 400, 3, 1), 3))
+    pnl.private_sent("pub", "prv", 3)
+    pnl.accepted(_traded(_order("prv", PRIVATE, OrderSide.SELL, 450, 3, 2), 1))
+    pnl.apply([_update(_order("prv", PRIVATE, OrderSide.SELL, 450, 2, 3), cancelled=True)])
+    # the 2 public units the private order did not take are sold back at a loss
+    pnl.hedge_sent("pub", "hedge", 2)
+    pnl.accepted(_traded(_order("hedge", PUBLIC, OrderSide.SELL, 390, 2, 4), 2))
+    pnl.finished("pub")
+
+    assert pnl.realised == 50 - 2 * 10
+    assert pnl.round_trips[0][5] == 3
+    assert pnl.unrealised() == 0
+
+
+def test_unhedged_units_stay_unrealised():
+    pnl = PnLAnalytics()
+    pnl.opened("pub", OrderSide.BUY, 40, 3, hedged=True)
+    pnl.accepted(_traded(_order("pub", PUBLIC, OrderSide.BUY, 400, 3, 1), 3))
+    pnl.private_sent("pub", "prv", 3)
+    pnl.accepted(_traded(_order("prv", PRIVATE, OrderSide.SELL, 450, 3, 2), 1))
+    pnl.apply([_update(_order("prv", PRIVATE, OrderSide.SELL, 450, 2, 3), cancelled=True)])
+    pnl.finished("pub")
+
+    assert pnl.realised == 50
+    # 2 units bought at 400 are still held, marked at 410
+    assert pnl.unrealised({PUBLIC.fm_id: 410}) == 2 * 10
@@ -1,10 +1,13 @@
 # The Imports
 
-import copy
 import logging
 
 from fmclient import Agent, Market, Holding, Session, Order, OrderType, OrderSide
 
+from order_book import OrderBook, Quote
+from order_gateway import OrderGateway
+from session_scheduler import SessionScheduler
+
 
 # Flex-E-Market credential
 
@@ -24,9 +27,15 @@ class FMRobot(Agent):
 
     Attributes:
         _my_standing_order (Order | None): Used to track my standing order in a given market. 
+        _book (OrderBook): Incremental order book updated from the orders passed to received_orders
+        _gateway (OrderGateway): Sends my orders, dropping repeated cancels of the same order
+        _scheduler (SessionScheduler): Tracks whether the market is open, rebuilding the book when it opens
     """
 
     _my_standing_order: Order | None
+    _book: OrderBook
+    _gateway: OrderGateway
+    _scheduler: SessionScheduler
 
 
     def __init__(self, account: str, email: str, password: str, marketplace_id: int, name: str = 'FMRobot'):
@@ -42,9 +51,20 @@ class FMRobot(Agent):
         # in this implementation, it assumes I only have one standing order and only looks at one market
         self._my_standing_order = None
 
+        self._book = OrderBook()
+
+        # a burst of book updates would otherwise send a burst of cancels for the same order
+        self._gateway = OrderGateway(self.send_order)
+
+        # cancels are only sent while the session is open
+        self._scheduler = SessionScheduler(self)
+        self._scheduler.on_open(lambda: self._book.rebuild(Order.current().values()))
+
     def initialised(self) -> None:
+        self._book.rebuild(Order.current().values())
+
         self.inform(f"{self.marketplace.name} ({self.marketplace.fm_id}); {self.marketplace.description}")
-        self.inform(f"\tI can trade in {', '.join(f"{market.name} ({market_id}){" (private)" if market.private_market else ""}" for market_id, market in self.markets.items())}")
+        self.inform(f"\tI can trade in {', '.join(f'{market.name} ({market_id})' + (' (private)' if market.private_market else '') for market_id, market in self.markets.items())}")
     
     def pre_start_tasks(self) -> None:
         # Place an order
@@ -65,6 +85,7 @@ class FMRobot(Agent):
         pass
 
     def received_session_info(self, session: Session) -> None:
+        self._scheduler.update(session)
         if session.is_open:
             self.inform(f"Marketplace is now open for trading. The new session is {session.fm_id}")
         elif session.is_paused:
@@ -73,29 +94,25 @@ class FMRobot(Agent):
             self.inform("Marketplace is now closed. You can not trade.")
 
     def received_holdings(self, holdings: Holding) -> None:
-        self.inform(f"Current holdings - Cash: {holdings.cash / 100:.2f} ({holdings.cash_available / 100:.2f}), {", ".join([f"{market.name}: {asset.units} ({asset.units_available})" for market, asset in holdings.assets.items()])}")
+        self.inform(f"Current holdings - Cash: {holdings.cash / 100:.2f} ({holdings.cash_available / 100:.2f}), {', '.join([f'{market.name}: {asset.units} ({asset.units_available})' for market, asset in holdings.assets.items()])}")
 
     def received_orders(self, orders: list[Order]) -> None:
         # track the best standing sell order which is not mine
         # and track if I have any standing order
         # all in the market for Asset A
-        best_standing_sell_order: Order | None = None
-
-        for order in Order.current().values():
-            if order.order_type is OrderType.LIMIT:
-                if order.market.fm_id == MARKET_ID_ASSET_A:
-                    if order.mine:
-                        self._my_standing_order = order
-                        self.inform(f"I have a standing order: {order}")
-                    else:
-                        if order.order_side is OrderSide.SELL:
-                            if best_standing_sell_order is None or order.price < best_standing_sell_order.price:
-                                best_standing_sell_order = order
+        self._book.apply(orders)
+        self._gateway.flush()
+
+        for quote in self._book.my_orders(MARKET_ID_ASSET_A):
+            self._my_standing_order = self._book.order_for(quote)
+            self.inform(f"I have a standing order: {quote}")
+
+        best_standing_sell_order: Quote | None = self._book.best_ask(MARKET_ID_ASSET_A)
 
         self.inform(f"The best standing sell order in market {MARKET_ID_ASSET_A} is {best_standing_sell_order}!")
 
-        # this will cancel any standing order you have
-        if self._my_standing_order is not None:
+        # this will cancel any standing order you have, once the market is open again
+        if self._my_standing_order is not None and self._scheduler.can_trade:
             self._cancel_my_standing_order()
             
 
@@ -105,15 +122,13 @@ class FMRobot(Agent):
             self.inform("There is no standing order to cancel.")
             return
         
-        cancel_order = copy.copy(self._my_standing_order)
-        cancel_order.order_type = OrderType.CANCEL
-
-        self.send_order(cancel_order)
-        self.inform(f"I have send a cancel for order: {cancel_order.fm_id}")
+        self._gateway.cancel(self._my_standing_order)
+        self.inform(f"I have send a cancel for order: {self._my_standing_order.fm_id}")
 
 
     def order_accepted(self, order: Order) -> None:
         self.inform(f"My order ({order}) was accepted. It received fm_id {order.fm_id} from Flex-E-Markets.")
+        self._gateway.answered(order)
 
         # if I have a LIMIT order accepted, update my standing order tracking to include it's fm_id
         if order.order_type is OrderType.LIMIT and order.market.fm_id == MARKET_ID_ASSET_A:
@@ -125,6 +140,7 @@ class FMRobot(Agent):
 
     def order_rejected(self, info: dict[str, str], order: Order) -> None:
         self.inform(f"My order ({order}) was rejected. Info: {info}")
+        self._gateway.answered(order)
 
         # if I have a LIMIT order rejected, well it was never actually standing, so remove my standing order tracking
         if order.order_type == OrderType.LIMIT and order.market.fm_id == MARKET_ID_ASSET_A: